@@ -0,0 +1,169 @@
+# 每日活跃度汇总（热力图）
+#
+# daily_activity 表每天一行：当天创建的文章数、笔记数、已审核评论数和热力值。
+# 文章保存/删除、评论提交时只重新统计受影响的那几天（按日期范围的索引计数），
+# 热力图接口读取一段日期范围内的汇总行，不再加载文章和评论。
+# 没有数据的日期不写入，读取时补零：安装了 NumPy 时用数组按下标一次填充，否则逐日填充。
+# 日期按 UTC 划分。
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from blog.models import CommentModel, PostModel
+from core.db import get_connection, is_postgres
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+NOTE_CATEGORY = "笔记"
+
+# 热力值权重
+HEAT_WEIGHTS = {
+    "post": 4,      # 文章
+    "note": 1,      # 笔记
+    "comment": 0.5  # 评论
+}
+
+
+def heat_value(posts: int, notes: int, comments: int) -> float:
+    return posts * HEAT_WEIGHTS["post"] + notes * HEAT_WEIGHTS["note"] + comments * HEAT_WEIGHTS["comment"]
+
+
+def activity_day(dt: datetime) -> date:
+    """时间所在的日期（UTC）"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.date()
+
+
+def _day_range(day: date):
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+class ActivityStore:
+    """daily_activity 表的维护和读取"""
+
+    async def setup(self):
+        """表为空而已有文章时全量回填（表由迁移创建）"""
+        _, rows = await get_connection().execute_query("SELECT COUNT(*) FROM daily_activity")
+        if rows[0][0] == 0 and await PostModel.all().exists():
+            await self.rebuild()
+
+    async def _write(self, day: date, posts: int, notes: int, comments: int):
+        conn = get_connection()
+        values = [day.isoformat(), posts, notes, comments, heat_value(posts, notes, comments)]
+        if is_postgres():
+            await conn.execute_query(
+                "INSERT INTO daily_activity (date, posts, notes, comments, heat) VALUES ($1, $2, $3, $4, $5)"
+                " ON CONFLICT (date) DO UPDATE SET posts = EXCLUDED.posts, notes = EXCLUDED.notes,"
+                " comments = EXCLUDED.comments, heat = EXCLUDED.heat",
+                values,
+            )
+        else:
+            await conn.execute_query(
+                "INSERT INTO daily_activity (date, posts, notes, comments, heat) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (date) DO UPDATE SET posts = EXCLUDED.posts, notes = EXCLUDED.notes,"
+                " comments = EXCLUDED.comments, heat = EXCLUDED.heat",
+                values,
+            )
+
+    async def refresh_days(self, days: Iterable[date]):
+        """重新统计指定日期（文章、评论变更后调用）"""
+        for day in set(days):
+            start, end = _day_range(day)
+            total = await PostModel.filter(created_at__gte=start, created_at__lt=end).count()
+            notes = await PostModel.filter(created_at__gte=start, created_at__lt=end, category=NOTE_CATEGORY).count()
+            comments = await CommentModel.filter(created_at__gte=start, created_at__lt=end, is_approved=True).count()
+            if total or comments:
+                await self._write(day, total - notes, notes, comments)
+            else:
+                await get_connection().execute_query(
+                    "DELETE FROM daily_activity WHERE date = $1" if is_postgres()
+                    else "DELETE FROM daily_activity WHERE date = ?",
+                    [day.isoformat()],
+                )
+
+    async def post_days(self, post_id: int) -> Set[date]:
+        """文章及其评论所在的日期（删除文章前调用，评论随文章级联删除）"""
+        created = await PostModel.filter(id=post_id).values_list("created_at", flat=True)
+        comments = await CommentModel.filter(post_id=post_id).values_list("created_at", flat=True)
+        return {activity_day(dt) for dt in [*created, *comments]}
+
+    async def rebuild(self, batch_size: int = 1000):
+        """全量重建（分批读取日期和分类，不加载正文）"""
+        counts: Dict[date, List[int]] = {}
+
+        last_id = 0
+        while True:
+            rows = await PostModel.filter(id__gt=last_id).order_by("id").limit(batch_size)\
+                .values_list("id", "created_at", "category")
+            if not rows:
+                break
+            for _, created_at, category in rows:
+                counts.setdefault(activity_day(created_at), [0, 0, 0])[1 if category == NOTE_CATEGORY else 0] += 1
+            last_id = rows[-1][0]
+
+        last_id = 0
+        while True:
+            rows = await CommentModel.filter(id__gt=last_id, is_approved=True).order_by("id").limit(batch_size)\
+                .values_list("id", "created_at")
+            if not rows:
+                break
+            for _, created_at in rows:
+                counts.setdefault(activity_day(created_at), [0, 0, 0])[2] += 1
+            last_id = rows[-1][0]
+
+        await get_connection().execute_query("DELETE FROM daily_activity")
+        for day in sorted(counts):
+            await self._write(day, *counts[day])
+        return len(counts)
+
+    async def read(self, start: date, end: date) -> List[tuple]:
+        """[start, end] 范围内有数据的日期：(日期, 文章, 笔记, 评论, 热力值)"""
+        _, rows = await get_connection().execute_query(
+            "SELECT date, posts, notes, comments, heat FROM daily_activity WHERE date >= $1 AND date <= $2 ORDER BY date"
+            if is_postgres() else
+            "SELECT date, posts, notes, comments, heat FROM daily_activity WHERE date >= ? AND date <= ? ORDER BY date",
+            [start.isoformat(), end.isoformat()],
+        )
+        return [tuple(row) for row in rows]
+
+    async def series(self, start: date, end: date) -> List[dict]:
+        """[start, end] 每天的数据（从 end 倒序，没有数据的日期为 0）"""
+        rows = await self.read(start, end)
+        if np is not None:
+            return _fill_numpy(rows, start, end)
+        return _fill_python(rows, start, end)
+
+
+def _fill_numpy(rows: List[tuple], start: date, end: date) -> List[dict]:
+    days = (end - start).days + 1
+    values = np.zeros((days, 4))
+    if rows:
+        index = (np.array([row[0] for row in rows], dtype="datetime64[D]") - np.datetime64(start, "D")).astype(np.int64)
+        values[index] = np.array([row[1:] for row in rows], dtype=np.float64)
+    # 倒序：最新的日期在前
+    dates = np.arange(np.datetime64(end, "D"), np.datetime64(start, "D") - 1, -1).astype(str).tolist()
+    posts, notes, comments = values[::-1, :3].astype(np.int64).T.tolist()
+    heat = values[::-1, 3].tolist()
+    return [
+        {"date": dates[i], "note": notes[i], "post": posts[i], "comment": comments[i], "heat": heat[i]}
+        for i in range(days)
+    ]
+
+
+def _fill_python(rows: List[tuple], start: date, end: date) -> List[dict]:
+    by_date = {row[0]: row for row in rows}
+    result = []
+    day = end
+    while day >= start:
+        key = day.isoformat()
+        row = by_date.get(key, (key, 0, 0, 0, 0))
+        result.append({"date": key, "note": row[2], "post": row[1], "comment": row[3], "heat": row[4]})
+        day -= timedelta(days=1)
+    return result
+
+
+activity_store = ActivityStore()
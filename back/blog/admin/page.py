@@ -4,6 +4,7 @@ from blog.models import page_manager
 from blog.schemas import PageResponse, PageCreate, PageUpdate, PageListResponse
 from core.security import is_admin
 from blog.tools import exclude_empty,radom_icons
+from blog import hooks
 # 管理路由
 router = APIRouter(
     prefix="/admin/pages",
@@ -27,6 +28,7 @@ async def create_page(page_data: PageCreate):
         #     page_data.icon = radom_icons()
         create_data = exclude_empty(page_data.model_dump())
         new_page = await page_manager.create(**create_data)
+        await hooks.page_saved(new_page)
         return new_page
         
     except HTTPException:
@@ -102,6 +104,7 @@ async def update_page(page_data: PageUpdate):
         # 如果更新了name，检查是否重复
         await page.update_from_dict(update_data)
         await page.save()
+        await hooks.page_saved(page)
         
         return page
         
@@ -121,7 +124,9 @@ async def delete_page(title:str):
         if not page:
             raise HTTPException(status_code=404, detail="页面不存在")
         
+        page_id = page.id
         await page_manager.delete(page)
+        await hooks.page_deleted(page_id)
         
         return {"detail": "删除成功"}
         
@@ -144,6 +149,7 @@ async def toggle_page_status(title:str):
         
         page.is_active = not page.is_active
         await page.save()
+        await hooks.page_saved(page)
         
         return page
         
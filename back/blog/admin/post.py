@@ -6,6 +6,10 @@ from blog.schemas import (
     PostResponse, PostCreate, PostUpdate, PostListResponse
 )
 from blog.tools import exclude_empty
+from blog.activity import activity_store
+from blog.stats import blog_stats
+from blog import hooks
+from tortoise.transactions import in_transaction
 # 管理路由（需要管理员权限）
 router = APIRouter(
     prefix="/admin/posts",
@@ -34,6 +38,7 @@ async def create_post(
         if not post_data.category:
             post_data.category = "默认"
 
+        toped_post = []
         if post_data.is_top:
             toped_post =  await post_manager.filter(is_top=True)
             for x in toped_post:
@@ -44,9 +49,16 @@ async def create_post(
         if not post_data.title:
             post_data.title = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M")
         create_data = exclude_empty(post_data.model_dump())
-        new_post = await post_manager.create(
-            **create_data
-        )
+        # 统计计数与文章在同一个事务中写入
+        async with in_transaction():
+            new_post = await post_manager.create(
+                **create_data
+            )
+            await blog_stats.post_created(new_post)
+        # 取消置顶的文章同样要更新索引、静态文件和缓存
+        for x in toped_post:
+            await hooks.post_saved(x)
+        await hooks.post_saved(new_post)
 
         return new_post
 
@@ -113,8 +125,12 @@ async def update_post(
                     detail="文章标题已存在"
                 )
 
-        await post.update_from_dict(update_data)
-        await post.save()
+        old_category = post.category
+        async with in_transaction():
+            await post.update_from_dict(update_data)
+            await post.save()
+            await blog_stats.post_changed(old_category, post)
+        await hooks.post_saved(post)
 
         return post
 
@@ -142,7 +158,14 @@ async def delete_post(
                 detail="内容不存在"
             )
 
-        await post_manager.delete(post)
+        post_id = post.id
+        # 评论随文章级联删除，先记录文章和评论所在的日期
+        days = await activity_store.post_days(post_id)
+        async with in_transaction():
+            await blog_stats.post_deleted(post)
+            await post_manager.delete(post)
+            await blog_stats.refresh_first_post()
+        await hooks.post_deleted(post_id, days)
 
         return {
             "status_code": status.HTTP_200_OK,
@@ -177,6 +200,7 @@ async def toggle_top(
 
         post.is_top = is_top
         await post.save()
+        await hooks.post_saved(post)
 
         return post
 
@@ -199,7 +223,7 @@ async def toggle_lock(
 ):
     """锁定或解锁内容（设为私密/公开）"""
     try:
-        post = await post_manager.get_or_none(str=title)
+        post = await post_manager.get_or_none(title=title)
         if not post:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -208,6 +232,7 @@ async def toggle_lock(
 
         post.is_locked = is_locked
         await post.save()
+        await hooks.post_saved(post)
 
         return post
 
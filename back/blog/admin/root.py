@@ -2,6 +2,12 @@ from fastapi import APIRouter, HTTPException,UploadFile,File
 from fastapi.responses import JSONResponse,FileResponse
 from tortoise.transactions import in_transaction
 from blog.models import PostModel, CommentModel, PageModel
+from blog import hooks
+from blog.pageviews import view_recorder
+from blog.readers import MAX_DAYS, reader_sketches
+from core.cache import response_cache
+from core.diskcache import disk_cache
+from core.singleflight import single_flight
 from config import settings
 from datetime import datetime
 from pathlib import Path
@@ -13,6 +19,35 @@ import os
 
 router = APIRouter()
 
+@router.get("/root/metrics")
+async def worker_metrics():
+    """
+    当前 worker 的缓存、请求合并与阅读事件统计
+    """
+    return {
+        "pid": os.getpid(),
+        "response_cache": {"hits": response_cache.hits, "misses": response_cache.misses},
+        "disk_cache": {"contended": disk_cache.contended},
+        "single_flight": single_flight.stats(),
+        "views": view_recorder.stats(),
+    }
+
+@router.get("/root/readers")
+async def reader_statistics(days: int = 30):
+    """
+    全站独立访客数（HyperLogLog 估计）：全部时间、最近 days 天合计和每天
+    """
+    if days < 1 or days > MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"天数必须在1到{MAX_DAYS}之间")
+    try:
+        return {
+            "total": await reader_sketches.readers(),
+            "recent": await reader_sketches.readers(days=days),
+            "daily": await reader_sketches.daily(days),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取独立访客统计失败: {str(e)}")
+
 @router.get("/root/export/data")
 async def export_dump():
     """
@@ -209,6 +244,8 @@ async def import_dump(file: UploadFile = File(...)):
                         await CommentModel.create(id=comment_id, **comment_fields)
                     
                     comments_imported += 1
+
+        await hooks.data_imported()
         
         return {
             "message": "数据导入成功",
@@ -3,6 +3,9 @@ from typing import List, Optional
 from pydantic import BaseModel
 from blog.models import comment_manager, post_manager
 from core.meta import website_manager
+from blog import hooks
+from blog.stats import blog_stats
+from tortoise.transactions import in_transaction
 from datetime import datetime
 
 router = APIRouter(prefix="/comments", tags=["comments"])
@@ -87,18 +90,22 @@ async def create_comment(comment_data: CommentCreate, request: Request):
         author_email = comment_data.author_email.strip()
         author_website = comment_data.author_website.strip() if comment_data.author_website else None
     
-    # 创建评论
-    comment = await comment_manager.create(
-        post_id=comment_data.post_id,
-        author_name=author_name,
-        author_email=author_email,
-        author_website=author_website,
-        content=comment_data.content.strip(),
-        is_anonymous=comment_data.is_anonymous,
-        is_superuser=is_superuser,  # 设置超级用户标志
-        ip_address=request.client.host if request.client else None,
-        user_agent=request.headers.get("user-agent")
-    )
+    # 创建评论（统计计数在同一个事务中更新）
+    async with in_transaction():
+        comment = await comment_manager.create(
+            post_id=comment_data.post_id,
+            author_name=author_name,
+            author_email=author_email,
+            author_website=author_website,
+            content=comment_data.content.strip(),
+            is_anonymous=comment_data.is_anonymous,
+            is_superuser=is_superuser,  # 设置超级用户标志
+            ip_address=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent")
+        )
+        await blog_stats.apply(comments=1)
+    # 热力图和统计包含评论数
+    await hooks.comment_saved(comment)
     
     return comment
 
@@ -1,190 +1,53 @@
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, List, Optional
 from fastapi import APIRouter, HTTPException
-from blog.models import post_manager, comment_manager
-from core.meta import MetaModel
+from blog.activity import activity_store
+from blog.stats import blog_stats
+from core.bus import invalidation_bus
+from core.singleflight import shared_call
 
 router = APIRouter(prefix="/heatmap", tags=["heatmap"])
 
+# 热力图一次最多返回的天数（约 10 年）
+HEATMAP_MAX_DAYS = 3660
+
 class HeatmapService:
-    def __init__(self, post_manager, comment_manager):
-        self.post_manager = post_manager
-        self.comment_manager = comment_manager
-        # 定义分类权重映射
-        self.category_weights = {
-            "post": 4,      # 文章
-            "note": 1,      # 笔记
-            "comment": 0.5  # 评论
-        }
-        # 分类显示名称映射
-        self.category_display_names = {
-            "post": "文章",
-            "note": "笔记", 
-            "comment": "评论"
-        }
-    
     def get_current_time(self):
         """获取当前时间（带时区）"""
         return datetime.now(timezone.utc)
     
-    def generate_date_range_descending(self, days: int = 60) -> List[str]:
-        """生成从今天到过去的日期范围列表（倒序排列）"""
-        end_date = self.get_current_time()
-        start_date = end_date - timedelta(days=days-1)
-        
-        date_list = []
-        current_date = end_date
-        
-        while current_date >= start_date:
-            date_list.append(current_date.strftime("%Y-%m-%d"))
-            current_date -= timedelta(days=1)
-        
-        return date_list
-    
-    def calculate_heat_value(self, category_stats: Dict[str, int]) -> int:
-        """计算热力值"""
-        heat_value = 0
-        for category, count in category_stats.items():
-            weight = self.category_weights.get(category, 0)
-            heat_value += count * weight
-        return heat_value
-    
-    def is_note(self, post) -> bool:
-        """判断一个post是否是笔记"""
-        # 根据您的业务逻辑判断，这里假设category为"笔记"的就是笔记
-        return post.category == "笔记"
-    
-    async def get_category_heatmap_data_descending(self, days: int = 60) -> List[Dict]:
-        """获取最近N天的热力图数据"""
-        all_dates_desc = self.generate_date_range_descending(days)
-        
-        end_date = self.get_current_time()
-        start_date = end_date - timedelta(days=days-1)
-        
-        # 查询文章和笔记
-        posts = await self.post_manager.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).order_by("created_at")
-        
-        # 查询评论
-        comments = await self.comment_manager.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date,
-            is_approved=True
-        ).order_by("created_at")
-        
-        # 统计数据
-        actual_data = {}
-        
-        # 统计文章和笔记
-        for post in posts:
-            # 确保日期是 naive datetime 用于格式化
-            created_at = post.created_at
-            if created_at.tzinfo is not None:
-                created_at = created_at.replace(tzinfo=None)
-            date_str = created_at.strftime("%Y-%m-%d")
-            
-            # 根据是否为笔记来分类
-            if self.is_note(post):
-                category = "note"
-            else:
-                category = "post"
-            
-            if date_str not in actual_data:
-                actual_data[date_str] = {}
-            
-            if category not in actual_data[date_str]:
-                actual_data[date_str][category] = 0
-            actual_data[date_str][category] += 1
-        
-        # 统计评论
-        for comment in comments:
-            # 确保日期是 naive datetime 用于格式化
-            created_at = comment.created_at
-            if created_at.tzinfo is not None:
-                created_at = created_at.replace(tzinfo=None)
-            date_str = created_at.strftime("%Y-%m-%d")
-            
-            if date_str not in actual_data:
-                actual_data[date_str] = {}
-            
-            if "comment" not in actual_data[date_str]:
-                actual_data[date_str]["comment"] = 0
-            actual_data[date_str]["comment"] += 1
-        
-        # 构建结果
-        result = []
-        for date_str in all_dates_desc:
-            day_data = {
-                "date": date_str,
-                "note": 0,
-                "post": 0, 
-                "comment": 0,
-                "heat": 0
-            }
-            
-            if date_str in actual_data:
-                for category, count in actual_data[date_str].items():
-                    # 确保分类字段在允许的范围内
-                    if category in ["note", "post", "comment"] and count > 0:
-                        day_data[category] = count
-                
-                heat_value = self.calculate_heat_value(actual_data[date_str])
-                day_data["heat"] = heat_value
-            
-            result.append(day_data)
-        
-        return result
+    async def get_category_heatmap_data_descending(self, days: int = 60, end: Optional[date] = None) -> List[Dict]:
+        """
+        获取截至 end（默认今天）最近N天的热力图数据
+        读取每日活跃度汇总表（blog/activity.py）的一段日期范围，没有数据的日期补零
+        """
+        end = end or self.get_current_time().date()
+        start = end - timedelta(days=days-1)
+        return await activity_store.series(start, end)
     
     async def get_blog_statistics(self):
-        """获取博客统计：总天数、笔记总数、文章总数"""
+        """获取博客统计：总天数、笔记总数、文章总数（读取统计计数表的一行）"""
         try:
-            # 获取网站创建时间
-            website = await MetaModel.all().order_by("created_at").first()
-            
-            if not website:
-                return {
-                    "days": 0,
-                    "notes": 0,
-                    "posts": 0,
-                    "comments": 0
-                }
-            
-            # 处理时区问题
-            current_time = self.get_current_time()
-            earliest_date = website.created_at
-            
-            # 确保两个时间都有时区信息或都没有
-            if earliest_date.tzinfo is not None and current_time.tzinfo is None:
-                current_time = current_time.replace(tzinfo=timezone.utc)
-            elif earliest_date.tzinfo is None and current_time.tzinfo is not None:
-                current_time = current_time.replace(tzinfo=None)
-            
-            # 计算总天数
-            total_days = (current_time - earliest_date).days + 1
-
-            # 获取所有文章和笔记
-            all_posts = await self.post_manager.filter().all()
-            
-            # 分别统计文章和笔记
-            notes_count = 0
-            posts_count = 0
-            
-            for post in all_posts:
-                if self.is_note(post):
-                    notes_count += 1
-                else:
-                    posts_count += 1
+            stats = await blog_stats.get()
 
-            # 统计评论数量
-            comments_count = await self.comment_manager.filter().count()
+            # 建站时间（没有时用第一篇文章的时间）
+            earliest_date = stats["site_created_at"] or stats["first_post_at"]
+            if earliest_date is None:
+                total_days = 0
+            else:
+                # 处理时区问题
+                current_time = self.get_current_time()
+                if earliest_date.tzinfo is None:
+                    current_time = current_time.replace(tzinfo=None)
+                total_days = (current_time - earliest_date).days + 1
 
             return {
                 "days": total_days,
-                "notes": notes_count,
-                "posts": posts_count,
-                "comments": comments_count
+                "notes": stats["notes"],
+                "posts": stats["posts"],
+                "comments": stats["comments"],
+                "likes": stats["likes"],
+                "first_post_at": stats["first_post_at"].isoformat() if stats["first_post_at"] else None,
             }
             
         except Exception as e:
@@ -197,25 +60,42 @@ class HeatmapService:
             }
 
 # 初始化服务
-heatmap_service = HeatmapService(post_manager, comment_manager)
+heatmap_service = HeatmapService()
 
 @router.get("/type-distribution")
-async def get_category_distribution_heatmap_descending(days: Optional[int] = 60):
-    """获取热力图数据"""
+async def get_category_distribution_heatmap_descending(
+    days: Optional[int] = 60,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """
+    获取热力图数据
+    默认为截至今天的最近 days 天；传入 start（和 end）时返回该日期范围，可以跨多年
+    """
     try:
-        if days <= 0 or days > 365:
-            raise HTTPException(status_code=400, detail="天数必须在1-365之间")
-        
-        # 获取热力图数据
-        heatmap_data = await heatmap_service.get_category_heatmap_data_descending(days)
-        
-        # 获取博客统计
-        blog_stats = await heatmap_service.get_blog_statistics()
+        end = end or heatmap_service.get_current_time().date()
+        if start is not None:
+            days = (end - start).days + 1
+        if days <= 0 or days > HEATMAP_MAX_DAYS:
+            raise HTTPException(status_code=400, detail=f"天数必须在1-{HEATMAP_MAX_DAYS}之间")
         
-        # 构建返回数据
-        return {
-            "data": heatmap_data,
-            "statistics": blog_stats
-        }
+        async def build():
+            # 获取热力图数据
+            heatmap_data = await heatmap_service.get_category_heatmap_data_descending(days, end)
+
+            # 获取博客统计
+            blog_stats = await heatmap_service.get_blog_statistics()
+
+            # 构建返回数据
+            return {
+                "data": heatmap_data,
+                "statistics": blog_stats
+            }
+
+        # 缓存失效后的并发请求（包括其它 worker 的）只统计一次；结果与日期相关，按天区分
+        version = f"{invalidation_bus.token('activity')}-{heatmap_service.get_current_time():%Y-%m-%d}"
+        return await shared_call(f"heatmap:{end}:{days}", version, build, ttl=300)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取热力图数据失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"获取热力图数据失败: {str(e)}")
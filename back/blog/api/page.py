@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
-from blog.models import page_manager
-from blog.schemas import PublicPageInfoResponse, PublicPageDetailResponse, PageListResponse
+from blog.models import page_manager, PageRenderModel
+from blog.renderer import render_async
+from blog.schemas import PublicPageInfoResponse, PublicPageDetailResponse, PublicPageHtmlResponse, PageListResponse
 
 
 
@@ -40,17 +41,33 @@ async def get_all_posts():
 @router.get(
     "/{title}",
     summary="获取页面完整详情",
-    response_model=PublicPageDetailResponse,
+    response_model=PublicPageHtmlResponse,
+    # 不带 format=html 时响应中没有 html / toc 字段
+    response_model_exclude_unset=True,
 )
-async def get_public_page(title: str,):
+async def get_public_page(
+    title: str,
+    format: Optional[str] = Query(None, description="为 html 时附带渲染好的 HTML 和目录"),
+):
     """根据页面标识获取页面完整详情（包含内容）"""
     try:
         page = await page_manager.get_or_none(title=title, is_active=True)
 
         if not page:
             raise HTTPException(status_code=404, detail=f"页面未找到")
-        return page
 
+        if format != "html":
+            return PublicPageDetailResponse.model_validate(page)
+        data = PublicPageHtmlResponse.model_validate(page)
+        render = await PageRenderModel.get_or_none(page_id=page.id)
+        if render:
+            data.html, data.toc = render.html, render.toc
+        else:
+            data.html, data.toc = await render_async(page.content)
+        return data
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取页面详情失败: {str(e)}")
 
@@ -0,0 +1,63 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from blog.likes import client_fingerprint
+from blog.pageviews import top_posts, view_recorder, views_over_time
+from blog.readers import MAX_DAYS, SITE, reader_sketches
+from blog.suggest import suggest_index
+
+router = APIRouter(prefix="/views", tags=["阅读量"])
+
+
+@router.post("/{post_id}")
+async def record_view(request: Request, post_id: int):
+    """记录一次文章阅读（只写入内存缓冲区，后台批量写入数据库）"""
+    # 按内存中的公开文章投影检查，不存在或私密的文章不计数
+    if not await suggest_index.is_public(post_id):
+        raise HTTPException(status_code=404, detail="文章不存在")
+    view_recorder.record(post_id, client_fingerprint(request))
+    return {"status": 200}
+
+
+@router.get("/top")
+async def get_top_posts(
+    days: int = Query(7, ge=1, le=365, description="最近天数"),
+    limit: int = Query(10, ge=1, le=100, description="数量"),
+):
+    """最近一段时间阅读量最高的文章"""
+    try:
+        return await top_posts(days * 24, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取阅读排行失败: {str(e)}")
+
+
+@router.get("/timeline")
+async def get_views_timeline(
+    days: int = Query(30, ge=1, le=3660, description="最近天数"),
+    interval: str = Query("day", pattern="^(day|hour)$", description="按天（day）或按小时（hour）"),
+    post_id: Optional[int] = Query(None, description="文章ID，不传为全部文章"),
+):
+    """阅读量趋势"""
+    if interval == "hour" and days > 31:
+        raise HTTPException(status_code=400, detail="按小时统计时天数不能超过31")
+    try:
+        return await views_over_time(days * 24, 24 if interval == "day" else 1, post_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取阅读趋势失败: {str(e)}")
+
+
+@router.get("/readers")
+async def get_readers(
+    post_id: Optional[int] = Query(None, ge=1, description="文章ID，不传为全站"),
+    days: Optional[int] = Query(None, ge=1, le=MAX_DAYS, description="最近天数，不传为全部时间"),
+):
+    """独立访客数（HyperLogLog 估计，误差约 2%）"""
+    post_id = post_id or SITE
+    try:
+        return {
+            "post_id": post_id or None,
+            "days": days,
+            "readers": await reader_sketches.readers(post_id, days),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取独立访客数失败: {str(e)}")
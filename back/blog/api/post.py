@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
-from typing import List, Optional
-from blog.models import post_manager,PostModel
-from blog.schemas import PostResponse, PostListResponse
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from typing import List, Optional, Set
+from blog.models import post_manager,PostModel,PostRenderModel
+from blog.schemas import FacetsResponse, PostDetailResponse, PostResponse, PostListResponse, SearchHit, SearchResponse
+from blog.search import search_index
+from blog.bm25 import bm25_engine
+from blog.suggest import suggest_index
+from blog.renderer import render_async
+from blog.archive import get_catalog
+from blog.likes import client_fingerprint, like_counter
+from blog.listing import LIST_ORDERING, after_cursor, count_posts, encode_cursor, facet_rows, get_facets, list_facets
+from core.bus import invalidation_bus
 from tortoise.expressions import Q
 from config import settings
+import logging
 import re
 import math
 
+logger = logging.getLogger(__name__)
+
 # 公开路由（无需权限）
 router = APIRouter(
     prefix="/posts",
@@ -23,8 +34,13 @@ async def get_public_posts(
     size: int = Query(10, ge=1, description="每页数量"),
     category: Optional[str] = Query(None, description="分类"),
     tag: Optional[str] = Query(None, description="标签"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 next_cursor），传入时忽略 page 的偏移"),
+    facets: bool = Query(False, description="是否返回当前筛选条件下各分类、标签的数量"),
 ):
-    """获取公开内容列表（不包含私密内容）"""
+    """
+    获取公开内容列表（不包含私密内容）
+    顺序翻页时传入 cursor，按 (is_top, created_at, id) 定位，不使用 OFFSET
+    """
     try:
         # 构建查询条件 - 只查询非私密内容
         filters = {"is_locked": False}
@@ -33,28 +49,37 @@ async def get_public_posts(
         if tag:
             filters["tag"] = tag
 
-        # 获取总数
-        total = await post_manager.filter(**filters).count()
+        # 获取总数（按筛选条件缓存，文章写入后才重新统计）
+        total = await count_posts(filters)
 
         # 计算总页数
         total_page = math.ceil(total / size) if total > 0 else 1
 
         # 获取分页数据
-        posts = await post_manager.filter(**filters)\
-            .offset((page - 1) * size)\
-            .limit(size)\
-            .order_by("-is_top", "-created_at")\
-            .all()
+        query = post_manager.filter(**filters)
+        if cursor:
+            try:
+                query = query.filter(after_cursor(cursor))
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        else:
+            query = query.offset((page - 1) * size)
+        posts = await query.limit(size).order_by(*LIST_ORDERING).all()
 
         return PostListResponse(
             posts=posts,
             total=total,
             total_page=total_page,
             current_page=page,
-            size=size
+            size=size,
+            next_cursor=encode_cursor(posts[-1]) if len(posts) == size else None,
+            facets=await list_facets(filters) if facets else None,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("接口异常")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取列表失败: {str(e)}"
@@ -76,6 +101,7 @@ async def is_exists(title: str):
         return {"is_exists": True}
 
     except Exception as e:
+        logger.exception("接口异常")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"检查失败: {str(e)}"
@@ -85,33 +111,48 @@ async def is_exists(title: str):
     "/like",
     summary="点赞文章",
 )
-async def like(post_id: int = Query(..., description="文章ID")):
-    post = await post_manager.get_or_none(id=post_id)
-
-    if not post:
+async def like(request: Request, post_id: int = Query(..., description="文章ID")):
+    """
+    点赞（同一访客对同一篇文章在一段时间内只计一次）
+    点赞数先在内存中累加，后台定时批量写入数据库
+    """
+    result = await like_counter.like(post_id, client_fingerprint(request))
+    if result is None:
         raise HTTPException(status_code=404, detail="文章不存在")
 
-    post.like += 1
-    await post.save()
-
+    accepted, like_count = result
     return {
         "status": 200,
-        "message": "点赞成功",
-        "like_count": post.like
+        "message": "点赞成功" if accepted else "已经点过赞了",
+        "liked": accepted,
+        "like_count": like_count
     }
 
 @router.get(
     "/categories",
 )
 async def get_all_categories():
-    categories = await post_manager.filter().values("category")
+    # 分类取自分组统计（已缓存），不再读取每篇文章的分类
+    categories = await facet_rows()
     if not categories:
         # 如果没有分类，默认加载预设的分类
         if settings.PRESET_CATEGORIES:
             return settings.PRESET_CATEGORIES
         return []
 
-    return set([x.get("category","") for x in categories] + settings.PRESET_CATEGORIES)
+    return set([x[0] for x in categories] + settings.PRESET_CATEGORIES)
+
+@router.get(
+    "/facets",
+    summary="分类、标签统计",
+    response_model=FacetsResponse,
+)
+async def get_posts_facets():
+    """
+    各分类、标签以及文章/笔记的公开和私密数量
+    由一条分组查询统计，缓存到文章下次写入
+    """
+    return await get_facets()
 
 @router.get(
     "/all",
@@ -128,71 +169,77 @@ async def get_all_posts():
     response_model=List[dict],
 )
 async def get_posts_archive():
-    """按照年份归档文章"""
+    """按照年份归档文章（完整列表；文章较多时使用 /archive/summary 和 /archive/list）"""
     try:
-        # 获取所有公开文章，按创建时间降序排列
-        posts = await post_manager.filter(is_locked=False)\
-            .order_by("-created_at")\
-            .all().exclude(category="笔记")
-
-        # 按年份分组
-        archive_dict = {}
-        for post in posts:
-            # 提取年份
-            year = post.created_at.year
-
-            # 初始化年份分组
-            if year not in archive_dict:
-                archive_dict[year] = []
-
-            # 添加文章信息
-            archive_dict[year].append({
-                "time": post.created_at.strftime("%Y-%m-%d"),
-                "title": post.title,
-                "id": post.id
-            })
-
-        # 转换为要求的格式并按年份倒序排列
-        result = []
-        for year in sorted(archive_dict.keys(), reverse=True):
-            result.append({
-                "date": str(year),  # 年份作为字符串
-                "data": archive_dict[year]
-            })
-
-        return result
+        return (await get_catalog()).grouped()
 
     except Exception as e:
+        logger.exception("接口异常")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取归档失败: {str(e)}"
         )
 
-def highlight_keyword(text: str, keyword: str, context_length: int = 100) -> str:
+@router.get(
+    "/archive/summary",
+    summary="归档年月统计",
+)
+async def get_posts_archive_summary():
+    """每年、每月的文章数"""
+    try:
+        return (await get_catalog()).summary()
+
+    except Exception as e:
+        logger.exception("接口异常")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取归档失败: {str(e)}"
+        )
+
+@router.get(
+    "/archive/list",
+    summary="按年月分页的归档",
+)
+async def get_posts_archive_list(
+    year: Optional[int] = Query(None, description="年份"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="月份（需要同时指定年份）"),
+    page: int = Query(1, ge=1, description="页码"),
+    size: int = Query(50, ge=1, le=500, description="每页数量"),
+):
+    """某年（某月）的归档文章，按时间倒序分页"""
+    if month is not None and year is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="指定月份时需要同时指定年份")
+    try:
+        return (await get_catalog()).page(year, month, page, size)
+
+    except Exception as e:
+        logger.exception("接口异常")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取归档失败: {str(e)}"
+        )
+
+def highlight_keyword(text: str, keywords: List[str], context_length: int = 100) -> str:
     """
     高亮显示关键词，并截取前后文本
+    只在第一个命中处截取片段，替换也只作用于片段，不扫描全文
     """
-    if not text or not keyword:
+    if not text or not keywords:
         return text
 
-    # 转义正则特殊字符
-    escaped_keyword = re.escape(keyword)
-
-    # 查找所有匹配位置
-    matches = list(re.finditer(escaped_keyword, text, re.IGNORECASE))
+    pattern = re.compile(
+        "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)),
+        re.IGNORECASE
+    )
 
-    if not matches:
+    first_match = pattern.search(text)
+    if not first_match:
         # 如果没有匹配，返回前context_length个字符
         return text[:context_length] + "..." if len(text) > context_length else text
 
-    # 取第一个匹配位置
-    first_match = matches[0]
-    start_pos = first_match.start()
-    end_pos = first_match.end()
-
     # 计算截取范围
-    context_start = max(0, start_pos - context_length)
-    context_end = min(len(text), end_pos + context_length)
+    context_start = max(0, first_match.start() - context_length)
+    context_end = min(len(text), first_match.end() + context_length)
 
     # 截取文本
     excerpt = text[context_start:context_end]
@@ -202,57 +249,134 @@ def highlight_keyword(text: str, keyword: str, context_length: int = 100) -> str
     suffix = "..." if context_end < len(text) else ""
 
     # 高亮关键词
-    highlighted_excerpt = re.sub(
-        escaped_keyword,
+    highlighted_excerpt = pattern.sub(
         lambda m: f'<span style="color: #ff0000; font-weight: bold;">{m.group()}</span>',
-        excerpt,
-        flags=re.IGNORECASE
+        excerpt
     )
 
     return f"{prefix}{highlighted_excerpt}{suffix}"
 
 
 
-@router.get("/search")
-async def search_posts(q: str = Query(...)):
+# 按 id 批量查询时每批的数量（sqlite 参数个数有上限）
+_ID_BATCH = 900
+
+
+async def _public_ids(post_ids: List[int]) -> Set[int]:
+    """post_ids 中仍然存在且公开的文章"""
+    public: Set[int] = set()
+    for start in range(0, len(post_ids), _ID_BATCH):
+        public.update(await PostModel.filter(id__in=post_ids[start:start + _ID_BATCH], is_locked=False)
+                      .values_list("id", flat=True))
+    return public
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_posts(
+    q: str = Query(...),
+    page: int = Query(1, ge=1, description="页码"),
+    size: int = Query(10, ge=1, le=100, description="每页数量"),
+    engine: str = Query("db", description="检索引擎：db（数据库全文索引）/ bm25（内存映射倒排索引）"),
+):
     """
-    使用Model方法的简单搜索
+    全文检索，按相关度排序并分页
+    多个关键词用空格分隔，需同时命中；摘要取自预先生成的纯文本
+    bm25 索引尚未建立时回退到数据库全文索引
     """
-    if not q or not q.strip():
-        return []
+    keywords = q.split() if q else []
+    if not keywords:
+        return SearchResponse(posts=[], total=0, total_page=1, current_page=page, size=size)
 
-    keyword = q.strip()
+    keyword = " ".join(keywords)
+    offset = (page - 1) * size
 
     try:
-        # 使用Model的filter方法进行模糊匹配
-        posts = await PostModel.filter(
-            content__icontains=keyword
-        ).order_by("-is_top", "-created_at")
-
-        # 转换为字典列表
+        if engine == "bm25" and bm25_engine.ready:
+            hits = bm25_engine.search(keyword, limit=None)
+            # 索引建立之后锁定、删除的文章不计入总数（只查询命中的文章）
+            public = await _public_ids([post_id for post_id, _ in hits])
+            hits = [hit for hit in hits if hit[0] in public]
+            total = len(hits)
+            post_ids = [post_id for post_id, _ in hits[offset:offset + size]]
+        else:
+            total = await search_index.count(keyword)
+            post_ids = await search_index.search(keyword, limit=size, offset=offset) if total else []
+
+        # 只取需要的列：标题/分类 + 纯文本
+        rows = await PostModel.filter(id__in=post_ids, is_locked=False)\
+            .values("id", "title", "category")
+        posts_map = {row["id"]: row for row in rows}
+        plains = dict(await PostRenderModel.filter(post_id__in=post_ids).values_list("post_id", "plain"))
+
+        # 按相关度顺序转换为字典列表
         posts_data = []
-        for post in posts:
-            post_data = {
-                "id": post.id,
-                "title": post.title,
-                "content": highlight_keyword(post.content,keyword),
-                "category":post.category,
-            }
-            posts_data.append(post_data)
+        for post_id in post_ids:
+            row = posts_map.get(post_id)
+            if not row:
+                continue
+            posts_data.append(SearchHit(
+                id=post_id,
+                title=row["title"],
+                category=row["category"],
+                content=highlight_keyword(plains.get(post_id, ""), keywords),
+            ))
+
+        return SearchResponse(
+            posts=posts_data,
+            total=total,
+            total_page=math.ceil(total / size) if total > 0 else 1,
+            current_page=page,
+            size=size
+        )
 
-        return posts_data
+    except Exception:
+        # 返回 500 而不是空结果：前端能区分故障和没有结果，缓存策略中间件可以返回最近一次成功的响应
+        logger.exception("搜索失败: q=%r engine=%s", q, engine)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="搜索服务暂时不可用"
+        )
 
-    except Exception as e:
-        print(f"搜索错误: {e}")
-        return []
+async def post_detail(post: PostModel, format: Optional[str]) -> PostResponse:
+    """详情响应，format=html 时附带写入时保存的 HTML 和目录"""
+    if format != "html":
+        return PostResponse.model_validate(post)
+    data = PostDetailResponse.model_validate(post)
+    render = await PostRenderModel.get_or_none(post_id=post.id)
+    if render:
+        data.html, data.toc = render.html, render.toc
+    else:
+        data.html, data.toc = await render_async(post.content)
+    return data
+
+@router.get(
+    "/suggest",
+    summary="搜索输入提示",
+)
+async def suggest(
+    prefix: str = Query(..., description="输入前缀"),
+    limit: int = Query(10, ge=1, le=50, description="最多返回数量"),
+):
+    """按前缀匹配标题、标签和分类（内存索引，内容更新后惰性重建）"""
+    try:
+        return await suggest_index.suggest(prefix, limit=limit)
+    except Exception:
+        logger.exception("搜索提示失败: prefix=%r", prefix)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="搜索提示暂时不可用"
+        )
 
 @router.get(
     "/title/{title}",
     summary="获取公开内容详情",
-    response_model=PostResponse,
+    response_model=PostDetailResponse,
+    # 不带 format=html 时响应中没有 html / toc 字段
+    response_model_exclude_unset=True,
 )
 async def get_public_post(
     title: str,
+    format: Optional[str] = Query(None, description="为 html 时附带渲染好的 HTML 和目录"),
 ):
     """获取公开内容详情（无法查看私密内容）"""
     try:
@@ -263,11 +387,12 @@ async def get_public_post(
                 detail="内容不存在或无权访问"
             )
 
-        return post
+        return await post_detail(post, format)
 
     except HTTPException:
         raise
     except Exception as e:
+        logger.exception("接口异常")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取详情失败: {str(e)}"
@@ -276,10 +401,13 @@ async def get_public_post(
 @router.get(
     "/{id}",
     summary="获取公开内容详情",
-    response_model=PostResponse,
+    response_model=PostDetailResponse,
+    # 不带 format=html 时响应中没有 html / toc 字段
+    response_model_exclude_unset=True,
 )
 async def get_public_post(
     id: int,
+    format: Optional[str] = Query(None, description="为 html 时附带渲染好的 HTML 和目录"),
 ):
     """获取公开内容详情（无法查看私密内容）"""
     try:
@@ -290,11 +418,12 @@ async def get_public_post(
                 detail="内容不存在或无权访问"
             )
 
-        return post
+        return await post_detail(post, format)
 
     except HTTPException:
         raise
     except Exception as e:
+        logger.exception("接口异常")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取详情失败: {str(e)}"
@@ -1,13 +1,30 @@
-from fastapi import APIRouter, Response
-from tortoise.expressions import Q
-from datetime import datetime
-import markdown
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Tuple
+import json
 import re
+import zlib
+from urllib.parse import quote
 
-from blog.models import PostModel
+from blog.models import PostModel, PostRenderModel
+from core.bus import invalidation_bus
+from core.diskcache import disk_cache
+from core.singleflight import single_flight
+from core.http import not_modified, not_modified_response, validator_headers
 
 router = APIRouter()
 
+# Feed 缓存：每个 worker 按 key 保存 (feed 主题版本, 文档)，版本号变化后才重新生成
+FEED_CACHE_SIZE = 64
+_feed_cache: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+
+# 订阅文档和每个归档页的文章数
+FEED_PAGE_SIZE = 20
+# 流式输出时每次从数据库读取的文章数
+FEED_BATCH_SIZE = 20
+
 # 博客配置信息 - 请根据实际情况修改
 BLOG_CONFIG = {
     "title": "你的博客名称",
@@ -15,43 +32,9 @@ BLOG_CONFIG = {
     "description": "你的博客描述"
 }
 
-def markdown_to_html(md_text: str) -> str:
-    """
-    将 Markdown 转换为 HTML，支持完整功能
-    包括代码高亮 (hljs)、表格、目录等
-    """
-    if not md_text:
-        return ""
-
-    # 配置 Markdown 扩展
-    extensions = [
-        'markdown.extensions.extra',      # 包含表格、缩写等
-        'markdown.extensions.codehilite', # 代码高亮
-        # 'markdown.extensions.toc',        # 目录生成
-        'markdown.extensions.smarty',     # 智能标点
-        'markdown.extensions.nl2br',      # 换行转 <br>
-        'markdown.extensions.sane_lists', # 更合理的列表
-        'markdown.extensions.fenced_code', # 围栏代码块
-    ]
-
-    extension_configs = {
-        'codehilite': {
-            'css_class': 'hljs',
-            'use_pygments': False,  # 使用 hljs 而不是 pygments
-            'guess_lang': True,
-        },
-        'toc': {
-            'permalink': True,
-        }
-    }
-
-    html = markdown.markdown(
-        md_text,
-        extensions=extensions,
-        extension_configs=extension_configs
-    )
-
-    return html
+# RFC 5005 归档命名空间
+HISTORY_NS = "http://purl.org/syndication/history/1.0"
+ATOM_NS = "http://www.w3.org/2005/Atom"
 
 def escape_xml_text(text: str) -> str:
     """
@@ -61,135 +44,345 @@ def escape_xml_text(text: str) -> str:
         return ""
     return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&apos;')
 
-def generate_rss_xml(posts, title: str, link: str, description: str, category: str = None) -> str:
+def cdata(text: str) -> str:
+    """包装为 CDATA，内容中的 ]]> 需要拆开"""
+    return "<![CDATA[" + text.replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+def rfc822(dt: datetime) -> str:
+    return dt.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+def rfc3339(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.isoformat()
+
+
+class FeedSource:
     """
-    生成完整的 RSS XML - 手动构建确保格式正确
+    一个 Feed 的文章来源
+    订阅文档是最新的 FEED_PAGE_SIZE 篇；归档页按时间正序编号（第 1 页最早），
+    只有写满的页才作为归档，内容稳定，聚合器可以沿 prev-archive 回溯全部历史（RFC 5005）
     """
-    # 构建 XML 字符串
-    xml_parts = ['<?xml version="1.0" encoding="UTF-8"?>']
-    xml_parts.append('<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/">')
-    xml_parts.append('<channel>')
 
-    # 频道信息
-    channel_title = escape_xml_text(f"{title} - {category}" if category else title)
-    channel_link = escape_xml_text(f"{link}/category/{category}" if category else link)
-    channel_description = escape_xml_text(f"{description} - {category}分类" if category else description)
+    def __init__(self, category: Optional[str] = None):
+        self.category = category
+
+    @property
+    def key(self) -> str:
+        return f"category/{self.category}" if self.category else "main"
+
+    def queryset(self):
+        if self.category:
+            return PostModel.filter(is_locked=False, category=self.category)
+        return PostModel.filter(is_locked=False).exclude(category="笔记")
+
+    async def archive_pages(self) -> int:
+        """已写满的归档页数"""
+        return await self.queryset().count() // FEED_PAGE_SIZE
+
+    async def iter_posts(self, page: Optional[int]) -> AsyncIterator[Tuple[dict, str, str]]:
+        """
+        分批读取文章（只取需要的列 + 写入时保存的 HTML/纯文本），逐篇产出
+        (文章字段, html, 纯文本)；内存中最多只有一批
+        """
+        if page is None:
+            query = self.queryset().order_by("-created_at", "-id")
+            offset = 0
+        else:
+            query = self.queryset().order_by("created_at", "id")
+            offset = (page - 1) * FEED_PAGE_SIZE
+        end = offset + FEED_PAGE_SIZE
+
+        while offset < end:
+            rows = await query.offset(offset).limit(min(FEED_BATCH_SIZE, end - offset))\
+                .values("id", "title", "excerpt", "category", "created_at", "updated_at")
+            if not rows:
+                break
+            renders = {
+                post_id: (html, plain) for post_id, html, plain in
+                await PostRenderModel.filter(post_id__in=[row["id"] for row in rows])
+                .values_list("post_id", "html", "plain")
+            }
+            for row in rows:
+                html, plain = renders.get(row["id"], ("", ""))
+                yield row, html, plain
+            offset += len(rows)
+
 
-    xml_parts.append(f'<title>{channel_title}</title>')
-    xml_parts.append(f'<link>{channel_link}</link>')
-    xml_parts.append(f'<description>{channel_description}</description>')
-    xml_parts.append('<language>zh-CN</language>')
-    xml_parts.append(f'<lastBuildDate>{datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")}</lastBuildDate>')
-    xml_parts.append('<generator>FastAPI Blog RSS</generator>')
+class FeedWriter:
+    """Feed 文档写入器基类：head / item / tail 三段，逐段输出"""
 
-    # 文章项
-    for post in posts:
-        post_link = escape_xml_text(f"{link}/posts/{post.id}")
-        description_text = post.excerpt or (post.content[:200] + "..." if len(post.content) > 200 else post.content)
-        description_text = re.sub(r'[#*`\[\]]', '', description_text)
-        description_text = escape_xml_text(description_text)
-        content_html = markdown_to_html(post.content)
+    media_type = ""
+    extension = ""
 
-        post_title = escape_xml_text(post.title or "无标题")
-        post_category = escape_xml_text(post.category) if post.category else None
+    def __init__(self, source: FeedSource, page: Optional[int], archive_pages: int):
+        self.source = source
+        self.page = page
+        self.archive_pages = archive_pages
+        category = source.category
+        link = BLOG_CONFIG["link"]
+        self.title = f"{BLOG_CONFIG['title']} - {category}" if category else BLOG_CONFIG["title"]
+        self.link = f"{link}/category/{quote(category, safe='')}" if category else link
+        self.description = f"{BLOG_CONFIG['description']} - {category}分类" if category else BLOG_CONFIG["description"]
 
-        xml_parts.append('<item>')
-        xml_parts.append(f'<title>{post_title}</title>')
+    def feed_url(self, page: Optional[int] = None) -> str:
+        name = self.name
+        category = self.source.category
+        path = f"{name}/{quote(category, safe='')}{self.extension}" if category else f"{name}{self.extension}"
+        url = f"{BLOG_CONFIG['link']}/api/{path}"
+        return f"{url}?page={page}" if page else url
+
+    def archive_links(self) -> Dict[str, str]:
+        """RFC 5005 归档链接"""
+        links = {}
+        if self.page is None:
+            if self.archive_pages:
+                links["prev-archive"] = self.feed_url(self.archive_pages)
+        else:
+            links["current"] = self.feed_url()
+            if self.page > 1:
+                links["prev-archive"] = self.feed_url(self.page - 1)
+            if self.page < self.archive_pages:
+                links["next-archive"] = self.feed_url(self.page + 1)
+        return links
+
+    def item_fields(self, post: dict, plain: str) -> dict:
+        summary = post["excerpt"] or (plain[:200] + "..." if len(plain) > 200 else plain)
+        return {
+            "link": f"{BLOG_CONFIG['link']}/posts/{post['id']}",
+            "title": post["title"] or "无标题",
+            "summary": re.sub(r'[#*`\[\]]', '', summary),
+        }
+
+    def head(self) -> str:
+        raise NotImplementedError
+
+    def item(self, post: dict, html: str, plain: str, first: bool) -> str:
+        raise NotImplementedError
+
+    def tail(self) -> str:
+        raise NotImplementedError
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        yield self.head().encode("utf-8")
+        first = True
+        async for post, html, plain in self.source.iter_posts(self.page):
+            yield self.item(post, html, plain, first).encode("utf-8")
+            first = False
+        yield self.tail().encode("utf-8")
+
+
+class RSSWriter(FeedWriter):
+    name = "rss"
+    extension = ".xml"
+    media_type = "application/rss+xml; charset=utf-8"
+
+    def head(self) -> str:
+        xml_parts = ['<?xml version="1.0" encoding="UTF-8"?>']
+        xml_parts.append(f'<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:atom="{ATOM_NS}" xmlns:fh="{HISTORY_NS}">')
+        xml_parts.append('<channel>')
+        xml_parts.append(f'<title>{escape_xml_text(self.title)}</title>')
+        xml_parts.append(f'<link>{escape_xml_text(self.link)}</link>')
+        xml_parts.append(f'<description>{escape_xml_text(self.description)}</description>')
+        xml_parts.append('<language>zh-CN</language>')
+        xml_parts.append(f'<lastBuildDate>{rfc822(datetime.utcnow())}</lastBuildDate>')
+        xml_parts.append('<generator>FastAPI Blog RSS</generator>')
+        xml_parts.append(f'<atom:link rel="self" href="{escape_xml_text(self.feed_url(self.page))}" type="application/rss+xml"/>')
+        for rel, href in self.archive_links().items():
+            xml_parts.append(f'<atom:link rel="{rel}" href="{escape_xml_text(href)}"/>')
+        if self.page is not None:
+            xml_parts.append('<fh:archive/>')
+        return '\n'.join(xml_parts) + '\n'
+
+    def item(self, post: dict, html: str, plain: str, first: bool) -> str:
+        fields = self.item_fields(post, plain)
+        post_link = escape_xml_text(fields["link"])
+        xml_parts = ['<item>']
+        xml_parts.append(f'<title>{escape_xml_text(fields["title"])}</title>')
         xml_parts.append(f'<link>{post_link}</link>')
-        xml_parts.append(f'<description>{description_text}</description>')
-        xml_parts.append(f'<pubDate>{post.created_at.strftime("%a, %d %b %Y %H:%M:%S GMT")}</pubDate>')
+        xml_parts.append(f'<description>{escape_xml_text(fields["summary"])}</description>')
+        xml_parts.append(f'<pubDate>{rfc822(post["created_at"])}</pubDate>')
         xml_parts.append(f'<guid>{post_link}</guid>')
+        if post["category"]:
+            xml_parts.append(f'<category>{escape_xml_text(post["category"])}</category>')
+        if html:
+            # 直接嵌入 HTML，不进行额外转义
+            xml_parts.append(f'<content:encoded>{cdata(html)}</content:encoded>')
+        xml_parts.append('</item>')
+        return '\n'.join(xml_parts) + '\n'
 
-        if post_category:
-            xml_parts.append(f'<category>{post_category}</category>')
+    def tail(self) -> str:
+        return '</channel>\n</rss>'
 
-        if content_html:
-            # 直接嵌入 HTML，不进行额外转义
-            xml_parts.append(f'<content:encoded><![CDATA[{content_html}]]></content:encoded>')
 
-        xml_parts.append('</item>')
+class AtomWriter(FeedWriter):
+    name = "atom"
+    extension = ".xml"
+    media_type = "application/atom+xml; charset=utf-8"
+
+    def head(self) -> str:
+        xml_parts = ['<?xml version="1.0" encoding="UTF-8"?>']
+        xml_parts.append(f'<feed xmlns="{ATOM_NS}" xmlns:fh="{HISTORY_NS}" xml:lang="zh-CN">')
+        xml_parts.append(f'<title>{escape_xml_text(self.title)}</title>')
+        xml_parts.append(f'<subtitle>{escape_xml_text(self.description)}</subtitle>')
+        xml_parts.append(f'<id>{escape_xml_text(self.feed_url(self.page))}</id>')
+        xml_parts.append(f'<updated>{rfc3339(datetime.fromtimestamp(invalidation_bus.modified_at("feed"), timezone.utc))}</updated>')
+        xml_parts.append('<generator>FastAPI Blog</generator>')
+        xml_parts.append(f'<link rel="alternate" type="text/html" href="{escape_xml_text(self.link)}"/>')
+        xml_parts.append(f'<link rel="self" href="{escape_xml_text(self.feed_url(self.page))}"/>')
+        for rel, href in self.archive_links().items():
+            xml_parts.append(f'<link rel="{rel}" href="{escape_xml_text(href)}"/>')
+        if self.page is not None:
+            xml_parts.append('<fh:archive/>')
+        return '\n'.join(xml_parts) + '\n'
+
+    def item(self, post: dict, html: str, plain: str, first: bool) -> str:
+        fields = self.item_fields(post, plain)
+        post_link = escape_xml_text(fields["link"])
+        xml_parts = ['<entry>']
+        xml_parts.append(f'<title>{escape_xml_text(fields["title"])}</title>')
+        xml_parts.append(f'<link rel="alternate" type="text/html" href="{post_link}"/>')
+        xml_parts.append(f'<id>{post_link}</id>')
+        xml_parts.append(f'<published>{rfc3339(post["created_at"])}</published>')
+        xml_parts.append(f'<updated>{rfc3339(post["updated_at"])}</updated>')
+        if post["category"]:
+            xml_parts.append(f'<category term="{escape_xml_text(post["category"])}"/>')
+        xml_parts.append(f'<summary>{escape_xml_text(fields["summary"])}</summary>')
+        if html:
+            xml_parts.append(f'<content type="html">{escape_xml_text(html)}</content>')
+        xml_parts.append('</entry>')
+        return '\n'.join(xml_parts) + '\n'
+
+    def tail(self) -> str:
+        return '</feed>'
+
+
+class JSONFeedWriter(FeedWriter):
+    """JSON Feed 1.1，next_url 指向更早的归档页"""
+
+    name = "feed"
+    extension = ".json"
+    media_type = "application/feed+json; charset=utf-8"
+
+    def head(self) -> str:
+        links = self.archive_links()
+        feed = {
+            "version": "https://jsonfeed.org/version/1.1",
+            "title": self.title,
+            "home_page_url": self.link,
+            "feed_url": self.feed_url(self.page),
+            "description": self.description,
+            "language": "zh-CN",
+        }
+        if "prev-archive" in links:
+            feed["next_url"] = links["prev-archive"]
+        # 去掉结尾的 }，接着输出 items 数组
+        return json.dumps(feed, ensure_ascii=False)[:-1] + ', "items": ['
+
+    def item(self, post: dict, html: str, plain: str, first: bool) -> str:
+        fields = self.item_fields(post, plain)
+        item = {
+            "id": fields["link"],
+            "url": fields["link"],
+            "title": fields["title"],
+            "summary": fields["summary"],
+            "content_html": html,
+            "date_published": rfc3339(post["created_at"]),
+            "date_modified": rfc3339(post["updated_at"]),
+        }
+        if post["category"]:
+            item["tags"] = [post["category"]]
+        return ("" if first else ",") + json.dumps(item, ensure_ascii=False)
+
+    def tail(self) -> str:
+        return ']}'
+
+
+async def feed_response(request: Request, writer_cls, category: Optional[str], page: Optional[int]) -> Response:
+    """
+    返回 Feed
+    ETag / Last-Modified 只依赖共享的 feed 主题版本号，条件请求命中时直接 304，不访问数据库；
+    订阅文档很小，按版本号缓存整份文档；归档页逐篇流式输出，不在内存中拼接全部文章
+    """
+    source = FeedSource(category)
+    key = f"{writer_cls.name}/{source.key}/{page or 0}"
+    token = invalidation_bus.token("feed")
+    etag = f'"{zlib.crc32(key.encode()):08x}-{token}"'
+    last_modified = invalidation_bus.modified_at("feed")
+    headers = validator_headers(etag, last_modified)
+
+    if not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+
+    if page is None:
+        cached = _feed_cache.get(key)
+        if cached and cached[0] == token:
+            _feed_cache.move_to_end(key)
+            body = cached[1]
+        else:
+            async def build() -> bytes:
+                # 其它 worker（或重启前的 worker）已经生成过时直接从磁盘缓存读取
+                body = disk_cache.get(f"feed:{key}", token)
+                if body is None:
+                    writer = writer_cls(source, page, await source.archive_pages())
+                    body = b"".join([chunk async for chunk in writer.stream()])
+                    disk_cache.set(f"feed:{key}", body, token)
+                return body
 
-    xml_parts.append('</channel>')
-    xml_parts.append('</rss>')
+            # 版本号变化后的并发请求（包括其它 worker 的）只生成一次
+            body = await single_flight.do(f"feed:{key}:{token}", build, shared=True, name=f"feed:{key}")
+            _feed_cache[key] = (token, body)
+            while len(_feed_cache) > FEED_CACHE_SIZE:
+                _feed_cache.popitem(last=False)
+        return Response(content=body, media_type=writer_cls.media_type, headers=headers)
 
-    return '\n'.join(xml_parts)
+    archive_pages = await source.archive_pages()
+    if page > archive_pages:
+        raise HTTPException(status_code=404, detail="归档页不存在")
+    writer = writer_cls(source, page, archive_pages)
+    return StreamingResponse(writer.stream(), media_type=writer_cls.media_type, headers=headers)
+
+
+PAGE_QUERY = Query(None, ge=1, description="归档页（RFC 5005），第 1 页最早；不传为订阅文档")
 
 @router.get("/rss.xml")
-async def get_main_rss_feed():
+async def get_main_rss_feed(request: Request, page: Optional[int] = PAGE_QUERY):
     """
     主 RSS Feed - 所有公开文章
     """
-    # 获取所有公开文章
-    posts = await PostModel.filter(is_locked=False)\
-        .order_by('-is_top', '-created_at')\
-        .exclude(category = "笔记")\
-        .limit(20)\
-        .all()
-
-    # 生成 RSS XML
-    xml_content = generate_rss_xml(
-        posts=posts,
-        title=BLOG_CONFIG["title"],
-        link=BLOG_CONFIG["link"],
-        description=BLOG_CONFIG["description"]
-    )
-
-    return Response(
-        content=xml_content,
-        media_type="application/rss+xml; charset=utf-8",
-        headers={
-            "Cache-Control": "public, max-age=3600"  # 缓存1小时
-        }
-    )
+    return await feed_response(request, RSSWriter, None, page)
 
 @router.get("/rss/{category}.xml")
-async def get_category_rss_feed(category: str):
+async def get_category_rss_feed(category: str, request: Request, page: Optional[int] = PAGE_QUERY):
     """
     分类 RSS Feed - 指定分类的公开文章
     """
-    # 获取指定分类的公开文章
-    posts = await PostModel.filter(
-        is_locked=False,
-        category=category
-    ).order_by('-is_top', '-created_at')\
-     .limit(20)\
-     .all()
-
-    # 如果该分类没有文章，返回空 RSS
-    if not posts:
-        # 创建空的 RSS 结构
-        xml_parts = ['<?xml version="1.0" encoding="UTF-8"?>']
-        xml_parts.append('<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/">')
-        xml_parts.append('<channel>')
+    return await feed_response(request, RSSWriter, category, page)
 
-        channel_title = escape_xml_text(f"{BLOG_CONFIG['title']} - {category}")
-        channel_link = escape_xml_text(f"{BLOG_CONFIG['link']}/category/{category}")
-        channel_description = escape_xml_text(f"{BLOG_CONFIG['description']} - {category}分类")
+@router.get("/atom.xml")
+async def get_main_atom_feed(request: Request, page: Optional[int] = PAGE_QUERY):
+    """
+    主 Atom Feed - 所有公开文章
+    """
+    return await feed_response(request, AtomWriter, None, page)
 
-        xml_parts.append(f'<title>{channel_title}</title>')
-        xml_parts.append(f'<link>{channel_link}</link>')
-        xml_parts.append(f'<description>{channel_description}</description>')
-        xml_parts.append('<language>zh-CN</language>')
-        xml_parts.append(f'<lastBuildDate>{datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")}</lastBuildDate>')
-        xml_parts.append('<generator>FastAPI Blog RSS</generator>')
-        xml_parts.append('</channel>')
-        xml_parts.append('</rss>')
-
-        xml_content = '\n'.join(xml_parts)
-    else:
-        # 生成分类 RSS XML
-        xml_content = generate_rss_xml(
-            posts=posts,
-            title=BLOG_CONFIG["title"],
-            link=BLOG_CONFIG["link"],
-            description=BLOG_CONFIG["description"],
-            category=category
-        )
-
-    return Response(
-        content=xml_content,
-        media_type="application/rss+xml; charset=utf-8",
-        headers={
-            "Cache-Control": "public, max-age=3600"
-        }
-    )
+@router.get("/atom/{category}.xml")
+async def get_category_atom_feed(category: str, request: Request, page: Optional[int] = PAGE_QUERY):
+    """
+    分类 Atom Feed - 指定分类的公开文章
+    """
+    return await feed_response(request, AtomWriter, category, page)
+
+@router.get("/feed.json")
+async def get_main_json_feed(request: Request, page: Optional[int] = PAGE_QUERY):
+    """
+    主 JSON Feed - 所有公开文章
+    """
+    return await feed_response(request, JSONFeedWriter, None, page)
+
+@router.get("/feed/{category}.json")
+async def get_category_json_feed(category: str, request: Request, page: Optional[int] = PAGE_QUERY):
+    """
+    分类 JSON Feed - 指定分类的公开文章
+    """
+    return await feed_response(request, JSONFeedWriter, category, page)
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from blog.sitemap import SITEMAP_LIMIT, sitemap_store
+from core.http import not_modified, not_modified_response, validator_headers
+
+router = APIRouter(tags=["站点地图"])
+
+SITEMAP_MEDIA_TYPE = "application/xml; charset=utf-8"
+
+
+def _validators(name: str):
+    manifest = sitemap_store.manifest()
+    etag = f'"{name}-{manifest["epoch"]:x}-{manifest["version"]}"'
+    return etag, manifest["modified_at"] or None
+
+
+@router.get("/sitemap.xml")
+async def get_sitemap(request: Request):
+    """
+    站点地图
+    URL 数不超过 50000 时直接返回全部 URL，否则返回 sitemap index
+    """
+    etag, last_modified = _validators("sitemap")
+    headers = validator_headers(etag, last_modified)
+    if not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+
+    if sitemap_store.total() > SITEMAP_LIMIT:
+        return Response(content=sitemap_store.index_xml(), media_type=SITEMAP_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(
+        sitemap_store.iter_urlset(sitemap_store.chunk_names()),
+        media_type=SITEMAP_MEDIA_TYPE,
+        headers=headers,
+    )
+
+
+@router.get("/sitemap-{name}.xml")
+async def get_sitemap_chunk(name: str, request: Request):
+    """sitemap index 中的单个分片"""
+    if name not in sitemap_store.manifest()["chunks"]:
+        raise HTTPException(status_code=404, detail="站点地图不存在")
+
+    etag, last_modified = _validators(name)
+    headers = validator_headers(etag, last_modified)
+    if not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+
+    return StreamingResponse(
+        sitemap_store.iter_urlset([name]),
+        media_type=SITEMAP_MEDIA_TYPE,
+        headers=headers,
+    )
@@ -0,0 +1,98 @@
+# 文章归档
+#
+# 归档只需要公开文章（不含笔记）的日期、标题和 id：按 created_at 倒序投影成
+# [日期, 标题, id] 列表，跨 worker 按 archive 主题版本号合并计算并保存在共享磁盘缓存中；
+# 每个 worker 再在内存中保存一份，并记录每个年、月在列表中的起止下标。
+# 年/月汇总和按年、月的分页都是对这份目录的切片，不再查询数据库。
+import math
+from typing import Dict, List, Optional, Tuple
+
+from blog.models import PostModel
+from core.bus import invalidation_bus
+from core.singleflight import shared_call
+
+NOTE_CATEGORY = "笔记"
+
+
+async def _load_entries() -> List[list]:
+    rows = await PostModel.filter(is_locked=False)\
+        .exclude(category=NOTE_CATEGORY)\
+        .order_by("-created_at", "-id")\
+        .values_list("created_at", "title", "id")
+    return [[created_at.strftime("%Y-%m-%d"), title, post_id] for created_at, title, post_id in rows]
+
+
+class ArchiveCatalog:
+    """按 archive 主题版本号缓存的归档目录"""
+
+    def __init__(self, entries: List[list]):
+        self.entries = entries
+        # (年, 月) -> [起, 止)；年 -> [起, 止)。列表按时间倒序，同一年、月的文章是连续的
+        self.months: Dict[Tuple[int, int], List[int]] = {}
+        self.years: Dict[int, List[int]] = {}
+        for index, (day, _, _) in enumerate(entries):
+            year, month = int(day[:4]), int(day[5:7])
+            self.months.setdefault((year, month), [index, index])[1] = index + 1
+            self.years.setdefault(year, [index, index])[1] = index + 1
+
+    def _item(self, entry: list) -> dict:
+        return {"time": entry[0], "title": entry[1], "id": entry[2]}
+
+    def grouped(self) -> List[dict]:
+        """按年份分组的完整归档（年份倒序）"""
+        return [
+            {"date": str(year), "data": [self._item(entry) for entry in self.entries[start:end]]}
+            for year, (start, end) in self.years.items()
+        ]
+
+    def summary(self) -> List[dict]:
+        """每年、每月的文章数（倒序）"""
+        result = []
+        for year, (start, end) in self.years.items():
+            result.append({
+                "year": year,
+                "count": end - start,
+                "months": [
+                    {"month": month, "count": month_end - month_start}
+                    for (month_year, month), (month_start, month_end) in self.months.items()
+                    if month_year == year
+                ],
+            })
+        return result
+
+    def page(self, year: Optional[int], month: Optional[int], page: int, size: int) -> dict:
+        """某年（某月）的一页文章，不指定年份时为全部文章"""
+        if year is None:
+            start, end = 0, len(self.entries)
+        elif month is None:
+            start, end = self.years.get(year, (0, 0))
+        else:
+            start, end = self.months.get((year, month), (0, 0))
+
+        total = end - start
+        offset = start + (page - 1) * size
+        return {
+            "year": year,
+            "month": month,
+            "total": total,
+            "total_page": math.ceil(total / size) if total > 0 else 1,
+            "current_page": page,
+            "size": size,
+            "items": [self._item(entry) for entry in self.entries[offset:min(offset + size, end)]],
+        }
+
+
+# 每个 worker 的目录：(版本号, 目录)
+_catalog: Optional[Tuple[str, ArchiveCatalog]] = None
+
+
+async def get_catalog() -> ArchiveCatalog:
+    """当前版本的归档目录（文章写入后重新投影，并发请求只查询一次）"""
+    global _catalog
+    token = invalidation_bus.token("archive")
+    if _catalog is not None and _catalog[0] == token:
+        return _catalog[1]
+
+    catalog = ArchiveCatalog(await shared_call("archive:catalog", token, _load_entries))
+    _catalog = (token, catalog)
+    return catalog
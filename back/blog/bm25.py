@@ -0,0 +1,380 @@
+# 纯 Python 的 BM25 检索引擎
+#
+# 倒排索引写入单个文件（DATA_DIR/bm25.idx），每个 worker 通过 mmap 只读映射，
+# 操作系统页缓存在 worker 之间共享，不需要每个进程各自持有一份索引。
+#
+# 文件布局（本机字节序，各段 8 字节对齐）：
+#   header      魔数 + 文档数/词项数/倒排总数/平均文档长度 + 各段偏移
+#   doc_ids     I[n_docs]        文章 id
+#   doc_lens    f[n_docs]        加权后的文档长度
+#   doc_mtimes  d[n_docs]        文章 updated_at 时间戳（增量重建依据）
+#   term_offs   I[n_terms + 1]   词项在 term_blob 中的字节偏移（按 utf-8 字节序排序）
+#   post_offs   I[n_terms + 1]   词项倒排表在 post_docs/post_tfs 中的起始下标
+#   post_docs   I[n_postings]    倒排表：文档下标
+#   post_tfs    f[n_postings]    倒排表：加权词频
+#   term_blob   bytes            词项 utf-8 拼接
+#
+# 重建在进程池中执行，只对 updated_at 变化的文章重新切分，
+# 其余文章的词频直接从旧索引反解，避免事件循环被阻塞。
+import asyncio
+import fcntl
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from blog.models import PostModel
+from blog.search import bigram_tokens, query_terms
+from core.pool import run_in_process
+from core.utils import data_path
+
+MAGIC = b"BM25IDX1"
+# 魔数, n_docs, n_terms, n_postings, avgdl, 9 个段偏移（最后一个为文件末尾）
+HEADER = struct.Struct("<8sIIId9Q")
+
+# 字段权重（BM25F 的简化形式：加权词频后统一计算）
+FIELD_WEIGHTS = {"title": 5.0, "tag": 3.0, "category": 2.0, "content": 1.0}
+
+K1 = 1.2
+B = 0.75
+# 前缀查询最多展开的词项数
+MAX_PREFIX_EXPANSION = 64
+# 其它 worker 检查索引文件是否更新的最小间隔（秒）
+RELOAD_INTERVAL = 1.0
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class Segment:
+    """只读映射的索引文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self.stat = os.fstat(self._file.fileno())
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+
+        (magic, self.n_docs, self.n_terms, self.n_postings, self.avgdl,
+         *offsets) = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"索引文件格式错误: {path}")
+
+        def section(i, fmt):
+            return view[offsets[i]:offsets[i + 1]].cast(fmt)
+
+        self.doc_ids = section(0, "I")
+        self.doc_lens = section(1, "f")
+        self.doc_mtimes = section(2, "d")
+        self.term_offs = section(3, "I")
+        self.post_offs = section(4, "I")
+        self.post_docs = section(5, "I")
+        self.post_tfs = section(6, "f")
+        self.term_blob = view[offsets[7]:offsets[8]]
+        self._views = [view, self.doc_ids, self.doc_lens, self.doc_mtimes, self.term_offs,
+                       self.post_offs, self.post_docs, self.post_tfs, self.term_blob]
+
+    def close(self):
+        try:
+            for view in getattr(self, "_views", []):
+                view.release()
+            self._mm.close()
+        except BufferError:
+            # 仍有切片在使用中，交给垃圾回收释放映射
+            pass
+        self._views = []
+        self._file.close()
+
+    def term(self, i: int) -> bytes:
+        return bytes(self.term_blob[self.term_offs[i]:self.term_offs[i + 1]])
+
+    def lower_bound(self, key: bytes) -> int:
+        """第一个 >= key 的词项下标"""
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, term: str, prefix: bool = False) -> List[int]:
+        """返回匹配的词项下标（前缀匹配时可能有多个）"""
+        key = term.encode("utf-8")
+        i = self.lower_bound(key)
+        if not prefix:
+            return [i] if i < self.n_terms and self.term(i) == key else []
+        matched = []
+        while i < self.n_terms and len(matched) < MAX_PREFIX_EXPANSION:
+            if not self.term(i).startswith(key):
+                break
+            matched.append(i)
+            i += 1
+        return matched
+
+    def postings(self, term_index: int) -> Tuple[memoryview, memoryview]:
+        start, end = self.post_offs[term_index], self.post_offs[term_index + 1]
+        return self.post_docs[start:end], self.post_tfs[start:end]
+
+    def documents(self) -> Dict[int, float]:
+        """{文章 id: updated_at 时间戳}"""
+        return dict(zip(self.doc_ids, self.doc_mtimes))
+
+    def forward(self, keep: Iterable[int]) -> Dict[int, Tuple[float, List[Tuple[bytes, float]]]]:
+        """
+        从倒排表反解出指定文档的 (文档长度, [(词项, 词频)])
+        用于增量重建时复用未变化文档的切分结果
+        """
+        keep_index = {}
+        for i, doc_id in enumerate(self.doc_ids):
+            if doc_id in keep:
+                keep_index[i] = doc_id
+        result = {doc_id: (self.doc_lens[i], []) for i, doc_id in keep_index.items()}
+        for t in range(self.n_terms):
+            docs, tfs = self.postings(t)
+            term = None
+            for doc_index, tf in zip(docs, tfs):
+                doc_id = keep_index.get(doc_index)
+                if doc_id is None:
+                    continue
+                if term is None:
+                    term = self.term(t)
+                result[doc_id][1].append((term, tf))
+        return result
+
+
+def analyze(title: str, tag: str, category: str, content: str) -> Tuple[float, Counter]:
+    """切分各字段并按字段权重累加词频，返回 (文档长度, 词频)"""
+    fields = {"title": title, "tag": tag, "category": category, "content": content}
+    tfs = Counter()
+    for name, text in fields.items():
+        weight = FIELD_WEIGHTS[name]
+        for token in bigram_tokens(text or ""):
+            tfs[token.encode("utf-8")] += weight
+    return float(sum(tfs.values())), tfs
+
+
+def write_segment(path: str, docs: Dict[int, Tuple[float, float, Iterable[Tuple[bytes, float]]]]):
+    """
+    写入索引文件（先写临时文件再原子替换）
+    docs: {文章 id: (updated_at 时间戳, 文档长度, [(词项, 词频)])}
+    """
+    doc_ids = array("I", sorted(docs))
+    doc_lens = array("f")
+    doc_mtimes = array("d")
+    inverted = defaultdict(list)
+    for doc_index, doc_id in enumerate(doc_ids):
+        mtime, length, terms = docs[doc_id]
+        doc_mtimes.append(mtime)
+        doc_lens.append(length)
+        for term, tf in terms:
+            inverted[term].append((doc_index, tf))
+
+    terms = sorted(inverted)
+    term_offs = array("I", [0])
+    post_offs = array("I", [0])
+    post_docs = array("I")
+    post_tfs = array("f")
+    blob = bytearray()
+    for term in terms:
+        blob += term
+        term_offs.append(len(blob))
+        for doc_index, tf in inverted[term]:
+            post_docs.append(doc_index)
+            post_tfs.append(tf)
+        post_offs.append(len(post_docs))
+
+    sections = [doc_ids.tobytes(), doc_lens.tobytes(), doc_mtimes.tobytes(), term_offs.tobytes(),
+                post_offs.tobytes(), post_docs.tobytes(), post_tfs.tobytes(), bytes(blob)]
+    offsets = []
+    position = _align(HEADER.size)
+    for data in sections:
+        offsets.append(position)
+        position = _align(position + len(data))
+    offsets.append(offsets[-1] + len(sections[-1]))
+
+    avgdl = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(doc_ids), len(terms), len(post_docs), avgdl, *offsets))
+        for offset, data in zip(offsets, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_index(path: str, current: Dict[int, float], changed: List[tuple]) -> Optional[int]:
+    """
+    增量重建索引（在子进程中执行）
+    current: 当前全部文章 {id: updated_at 时间戳}
+    changed: 需要重新切分的文章 [(id, updated_at, title, tag, category, content)]
+    其它 worker 正在重建时直接返回 None
+    """
+    with open(f"{path}.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+
+        changed_ids = {row[0] for row in changed}
+        docs = {}
+        if os.path.exists(path):
+            old = Segment(path)
+            try:
+                old_mtimes = old.documents()
+                keep = {
+                    doc_id for doc_id, mtime in current.items()
+                    if doc_id not in changed_ids and old_mtimes.get(doc_id) == mtime
+                }
+                for doc_id, (length, terms) in old.forward(keep).items():
+                    docs[doc_id] = (current[doc_id], length, terms)
+            finally:
+                old.close()
+
+        for doc_id, mtime, title, tag, category, content in changed:
+            length, tfs = analyze(title, tag, category, content)
+            docs[doc_id] = (mtime, length, tfs.items())
+
+        write_segment(path, docs)
+        return len(docs)
+
+
+class BM25Engine:
+    """BM25 检索引擎（每个 worker 一个实例，共享同一个索引文件）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._segment: Optional[Segment] = None
+        self._checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    @property
+    def path(self) -> str:
+        if self._path is None:
+            self._path = str(data_path("bm25.idx"))
+        return self._path
+
+    def _maybe_reload(self):
+        """索引文件被（其它 worker）替换后重新映射"""
+        now = time.monotonic()
+        if self._segment is not None and now - self._checked_at < RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._segment is not None:
+            old = self._segment.stat
+            if (stat.st_ino, stat.st_mtime_ns) == (old.st_ino, old.st_mtime_ns):
+                return
+            self._segment.close()
+            self._segment = None
+        self._segment = Segment(self.path)
+
+    @property
+    def ready(self) -> bool:
+        self._maybe_reload()
+        return self._segment is not None
+
+    def search(self, keyword: str, limit: Optional[int] = 50) -> List[Tuple[int, float]]:
+        """返回按分数排序的 [(文章 id, 分数)]，所有查询词都必须命中；limit 为 None 时返回全部"""
+        self._maybe_reload()
+        segment = self._segment
+        if segment is None or segment.n_docs == 0:
+            return []
+
+        terms = query_terms(keyword)
+        if not terms:
+            return []
+
+        n_docs, avgdl = segment.n_docs, segment.avgdl or 1.0
+        scores = None
+        for term, prefix in terms:
+            group = {}
+            for t in segment.lookup(term, prefix):
+                docs, tfs = segment.postings(t)
+                df = len(docs)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_index, tf in zip(docs, tfs):
+                    norm = K1 * (1 - B + B * segment.doc_lens[doc_index] / avgdl)
+                    group[doc_index] = group.get(doc_index, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+            if scores is None:
+                scores = group
+            else:
+                scores = {doc: score + group[doc] for doc, score in scores.items() if doc in group}
+            if not scores:
+                return []
+
+        if limit is None:
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        else:
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(segment.doc_ids[doc_index], score) for doc_index, score in top]
+
+    async def refresh(self) -> Optional[int]:
+        """
+        按 updated_at 检测变化的公开文章，在进程池中增量重建索引
+        返回索引中的文档数；其它 worker 正在重建时返回 None
+        """
+        rows = await PostModel.filter(is_locked=False).values_list("id", "updated_at")
+        current = {post_id: updated_at.timestamp() for post_id, updated_at in rows}
+
+        self._maybe_reload()
+        indexed = self._segment.documents() if self._segment is not None else {}
+        changed_ids = [post_id for post_id, mtime in current.items() if indexed.get(post_id) != mtime]
+        if not changed_ids and len(indexed) == len(current):
+            return len(indexed)
+
+        changed = []
+        for i in range(0, len(changed_ids), 200):
+            batch = await PostModel.filter(id__in=changed_ids[i:i + 200])\
+                .values_list("id", "updated_at", "title", "tag", "category", "content")
+            changed.extend(
+                (post_id, updated_at.timestamp(), title, tag, category, content)
+                for post_id, updated_at, title, tag, category, content in batch
+            )
+
+        result = await run_in_process(build_index, self.path, current, changed)
+        self._checked_at = 0.0
+        self._maybe_reload()
+        return result
+
+    def schedule_refresh(self):
+        """后台刷新索引，刷新过程中的多次请求合并为一次"""
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                if await self.refresh() is None:
+                    # 其它 worker 正在重建，稍后再检查一次，避免漏掉本次变更
+                    await asyncio.sleep(RELOAD_INTERVAL)
+                    self._dirty = True
+            except Exception as e:
+                print(f"重建 BM25 索引失败: {e}")
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+bm25_engine = BM25Engine()
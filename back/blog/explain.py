@@ -0,0 +1,91 @@
+# 热点查询的执行计划检查
+#
+# 对文章列表、评论列表和活跃度统计的查询执行 EXPLAIN，确认用到了迁移中建立的索引。
+# SQL 与各接口中 ORM 生成的查询条件、排序一致（参数用固定值代替）。
+# PostgreSQL 在数据量很小时总会选择顺序扫描，检查时在事务内关闭 enable_seqscan，
+# 只验证索引“可以被使用”；sqlite 没有统计信息时本身就会优先使用索引。
+from dataclasses import dataclass
+from typing import List
+
+from tortoise.transactions import in_transaction
+
+from core.db import is_postgres
+
+_LIST_ORDER = "ORDER BY is_top DESC, created_at DESC, id DESC LIMIT 20"
+_RANGE = "created_at >= '2024-01-01 00:00:00' AND created_at <= '2024-03-01 00:00:00'"
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    name: str
+    sql: str
+    index: str
+
+
+HOT_QUERIES = [
+    # blog/api/post.py get_public_posts
+    HotQuery("posts.list", f"SELECT * FROM posts WHERE is_locked = FALSE {_LIST_ORDER}", "idx_posts_list"),
+    HotQuery(
+        "posts.list.category",
+        f"SELECT * FROM posts WHERE is_locked = FALSE AND category = '笔记' {_LIST_ORDER}",
+        "idx_posts_category",
+    ),
+    HotQuery(
+        "posts.list.tag",
+        f"SELECT * FROM posts WHERE is_locked = FALSE AND tag = 'python' {_LIST_ORDER}",
+        "idx_posts_tag",
+    ),
+    HotQuery(
+        "posts.count.category",
+        "SELECT COUNT(*) FROM posts WHERE is_locked = FALSE AND category = '笔记'",
+        "idx_posts_category",
+    ),
+    # blog/archive.py 归档目录
+    HotQuery(
+        "posts.archive",
+        "SELECT created_at, title, id FROM posts WHERE is_locked = FALSE AND category <> '笔记'"
+        " ORDER BY created_at DESC, id DESC",
+        "idx_posts_archive",
+    ),
+    # blog/api/comments.py 评论列表与评论数
+    HotQuery(
+        "comments.list",
+        "SELECT * FROM comments WHERE post_id = 1 AND is_approved = TRUE ORDER BY created_at DESC LIMIT 10",
+        "idx_comments_post",
+    ),
+    HotQuery(
+        "comments.count",
+        "SELECT COUNT(*) FROM comments WHERE post_id = 1 AND is_approved = TRUE",
+        "idx_comments_post",
+    ),
+    # blog/activity.py 按天重新统计活跃度（热力图）
+    HotQuery("heatmap.posts", f"SELECT * FROM posts WHERE {_RANGE} ORDER BY created_at", "idx_posts_created"),
+    HotQuery(
+        "heatmap.comments",
+        f"SELECT * FROM comments WHERE {_RANGE} AND is_approved = TRUE ORDER BY created_at",
+        "idx_comments_approved",
+    ),
+]
+
+
+async def explain_hot_queries() -> List[dict]:
+    """返回每个热点查询的执行计划以及是否使用了预期的索引"""
+    results = []
+    postgres = is_postgres()
+    async with in_transaction() as conn:
+        if postgres:
+            await conn.execute_query("SET LOCAL enable_seqscan = off")
+        for query in HOT_QUERIES:
+            if postgres:
+                _, rows = await conn.execute_query(f"EXPLAIN {query.sql}")
+                plan = [row[0] for row in rows]
+            else:
+                _, rows = await conn.execute_query(f"EXPLAIN QUERY PLAN {query.sql}")
+                plan = [row[3] for row in rows]
+            results.append({
+                "name": query.name,
+                "index": query.index,
+                "ok": any(query.index in line for line in plan),
+                "plan": plan,
+            })
+    return results
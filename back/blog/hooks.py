@@ -0,0 +1,130 @@
+# 内容变更钩子
+#
+# admin 路由（以及数据导入）在写入文章/页面后调用这里，
+# 统一维护依赖内容的派生数据（纯文本、HTML、检索索引、BM25 索引、站点地图、静态 JSON、活跃度汇总、统计计数等），
+# 然后发布失效主题（core.bus），让各 worker 的缓存和内存数据惰性重建。
+# 静态 JSON 最后生成：生成时调用的接口函数按主题版本号缓存（文章数、分类统计、归档目录等），
+# 必须先发布主题，否则会把写入之前的数据写进静态文件。
+# 派生数据更新失败不影响已经提交的写入，只记录错误。
+from datetime import date
+from typing import Iterable
+
+from blog.activity import activity_day, activity_store
+from blog.bm25 import bm25_engine
+from blog.models import CommentModel, PageModel, PostModel
+from blog.publish import static_publisher
+from blog.readers import reader_sketches
+from blog.render import backfill_renders, update_page_render, update_post_render
+from blog.search import search_index
+from blog.sitemap import sitemap_store
+from blog.stats import blog_stats
+from core.bus import ALL_TOPICS, invalidation_bus
+
+# 文章变更影响的失效主题（另加 post:{id}）
+POST_TOPICS = ("posts", "feed", "archive", "activity")
+
+
+async def post_saved(post: PostModel):
+    """文章创建或更新之后"""
+    try:
+        await update_post_render(post)
+    except Exception as e:
+        print(f"生成文章派生内容失败: {e}")
+    try:
+        await search_index.index_post(post)
+    except Exception as e:
+        print(f"更新检索索引失败: {e}")
+    bm25_engine.schedule_refresh()
+    try:
+        await activity_store.refresh_days([activity_day(post.created_at)])
+    except Exception as e:
+        print(f"更新活跃度汇总失败: {e}")
+    try:
+        await sitemap_store.update_post(post.id)
+    except Exception as e:
+        print(f"更新站点地图失败: {e}")
+    await invalidation_bus.publish(f"post:{post.id}", *POST_TOPICS)
+    await static_publisher.publish_post(post.id)
+
+
+async def post_deleted(post_id: int, days: Iterable[date] = ()):
+    """文章删除之后，days 为删除前文章及其评论所在的日期（activity_store.post_days）"""
+    try:
+        await search_index.remove_post(post_id)
+    except Exception as e:
+        print(f"删除检索索引失败: {e}")
+    bm25_engine.schedule_refresh()
+    try:
+        await activity_store.refresh_days(days)
+    except Exception as e:
+        print(f"更新活跃度汇总失败: {e}")
+    try:
+        await reader_sketches.remove_post(post_id)
+    except Exception as e:
+        print(f"删除独立访客草图失败: {e}")
+    try:
+        await sitemap_store.update_post(post_id)
+    except Exception as e:
+        print(f"更新站点地图失败: {e}")
+    await invalidation_bus.publish(f"post:{post_id}", *POST_TOPICS)
+    await static_publisher.publish_post(post_id)
+
+
+async def data_imported():
+    """批量导入数据之后，全量重建派生数据"""
+    try:
+        await backfill_renders(refresh=True)
+    except Exception as e:
+        print(f"生成文章派生内容失败: {e}")
+    try:
+        await search_index.rebuild()
+    except Exception as e:
+        print(f"重建检索索引失败: {e}")
+    bm25_engine.schedule_refresh()
+    try:
+        await activity_store.rebuild()
+    except Exception as e:
+        print(f"重建活跃度汇总失败: {e}")
+    try:
+        await blog_stats.rebuild()
+    except Exception as e:
+        print(f"重建统计计数失败: {e}")
+    try:
+        await sitemap_store.build()
+    except Exception as e:
+        print(f"重建站点地图失败: {e}")
+    await invalidation_bus.publish(ALL_TOPICS)
+    await static_publisher.publish_all()
+
+
+async def comment_saved(comment: CommentModel):
+    """评论提交之后"""
+    try:
+        await activity_store.refresh_days([activity_day(comment.created_at)])
+    except Exception as e:
+        print(f"更新活跃度汇总失败: {e}")
+    await invalidation_bus.publish("activity")
+
+
+async def page_saved(page: PageModel):
+    """页面创建或更新之后"""
+    try:
+        await update_page_render(page)
+    except Exception as e:
+        print(f"生成页面派生内容失败: {e}")
+    try:
+        await sitemap_store.update_pages()
+    except Exception as e:
+        print(f"更新站点地图失败: {e}")
+    await invalidation_bus.publish("pages")
+    await static_publisher.publish_pages()
+
+
+async def page_deleted(page_id: int):
+    """页面删除之后（派生内容随外键级联删除）"""
+    try:
+        await sitemap_store.update_pages()
+    except Exception as e:
+        print(f"更新站点地图失败: {e}")
+    await invalidation_bus.publish("pages")
+    await static_publisher.publish_pages()
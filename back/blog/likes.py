@@ -0,0 +1,167 @@
+# 点赞计数（写后合并）
+#
+# 点赞不再逐次保存整行文章：每个 worker 在内存中记录点赞事件，
+# 后台任务每隔 LIKE_FLUSH_INTERVAL 秒在一个事务中批量执行 UPDATE posts SET "like" = "like" + n，
+# 同时更新博客统计计数，然后发布失效主题并重新生成这些文章的静态详情和列表。worker 退出时写入剩余的计数。
+#
+# 点赞接口不访问数据库：文章是否存在且公开、当前点赞数取自搜索提示索引中的公开文章投影（blog.suggest），
+# 批量写入时再按公开文章过滤一次（期间被删除或设为私密的文章不计入）。
+# 同一访客（IP + User-Agent 的 64 位哈希）对同一篇文章在 LIKE_DEDUPE_TTL 秒内只计一次：
+# 每个 worker 先按 {指纹: 过期时间} 在内存中去重；worker 之间的去重在批量写入时进行，
+# 在共享磁盘缓存中一次性原子写入本批的去重标记，只有写入成功的才计入。
+# 磁盘缓存繁忙时本批事件留到下一次写入，不会不经去重就计入。
+# 返回的点赞数 = 投影中的值 + 本 worker 尚未写入的增量。
+import asyncio
+import hashlib
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Request
+from tortoise.transactions import in_transaction
+
+from blog.models import PostModel
+from blog.stats import blog_stats
+from blog.suggest import suggest_index
+from core.bus import invalidation_bus
+from core.diskcache import disk_cache
+from core.db import is_postgres
+from config import settings
+
+
+def client_fingerprint(request: Request) -> int:
+    """访客指纹：真实 IP（nginx 转发的 X-Real-IP）+ User-Agent"""
+    ip = request.headers.get("x-real-ip") or (request.client.host if request.client else "")
+    agent = request.headers.get("user-agent", "")
+    digest = hashlib.blake2b(f"{ip}|{agent}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class LikeCounter:
+    """每个 worker 的点赞累加器"""
+
+    def __init__(self, flush_interval: float = 5, dedupe_ttl: float = 86400):
+        self.flush_interval = flush_interval
+        self.dedupe_ttl = dedupe_ttl
+        # 文章 id -> 本 worker 收到、尚未在 worker 之间去重的访客指纹
+        self._events: Dict[int, Set[int]] = {}
+        # 文章 id -> 已去重、尚未写入数据库的点赞数
+        self._pending: Dict[int, int] = {}
+        # 文章 id -> {访客指纹: 过期时间}（本 worker 的去重记录）
+        self._seen: Dict[int, Dict[int, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def _is_seen(self, post_id: int, fingerprint: int, now: float) -> bool:
+        seen = self._seen.get(post_id)
+        if seen is None:
+            return False
+        expires = seen.get(fingerprint)
+        return expires is not None and expires > now
+
+    def _mark_seen(self, post_id: int, fingerprint: int, now: float):
+        seen = self._seen.setdefault(post_id, {})
+        # 顺便清理过期的记录
+        if len(seen) >= 1024:
+            for key in [key for key, expires in seen.items() if expires <= now]:
+                del seen[key]
+        seen[fingerprint] = now + self.dedupe_ttl
+
+    def _unwritten(self, post_id: int) -> int:
+        return len(self._events.get(post_id, ())) + self._pending.get(post_id, 0)
+
+    async def like(self, post_id: int, fingerprint: int) -> Optional[Tuple[bool, int]]:
+        """
+        点赞，返回 (是否计入, 当前点赞数)；文章不存在或私密时返回 None
+        同一访客在有效期内重复点赞不计入（其它 worker 上的重复点赞在批量写入时去掉）
+        """
+        likes = await suggest_index.public_likes(post_id)
+        if likes is None:
+            return None
+
+        now = time.time()
+        accepted = not self._is_seen(post_id, fingerprint, now)
+        if accepted:
+            self._mark_seen(post_id, fingerprint, now)
+            self._events.setdefault(post_id, set()).add(fingerprint)
+            self._ensure_task()
+        return accepted, likes + self._unwritten(post_id)
+
+    async def _dedupe(self):
+        """在磁盘缓存中写入本批事件的去重标记，写入成功（其它 worker 没有计过）的计入待写入的点赞数"""
+        keys = {
+            f"like:{post_id}:{fingerprint:016x}": (post_id, fingerprint)
+            for post_id, fingerprints in self._events.items() for fingerprint in fingerprints
+        }
+        if not keys:
+            return
+        claimed = await asyncio.to_thread(disk_cache.claim, list(keys), self.dedupe_ttl)
+        if claimed is None:
+            # 留到下一次写入
+            return
+        for key, (post_id, fingerprint) in keys.items():
+            fingerprints = self._events[post_id]
+            fingerprints.discard(fingerprint)
+            if not fingerprints:
+                del self._events[post_id]
+            if key in claimed:
+                self._pending[post_id] = self._pending.get(post_id, 0) + 1
+
+    async def flush(self):
+        """把累加的点赞数批量写入数据库"""
+        async with self._lock:
+            await self._dedupe()
+            pending = self._pending
+            if not pending:
+                return
+            sql = 'UPDATE posts SET "like" = "like" + $1 WHERE id = $2' if is_postgres() \
+                else 'UPDATE posts SET "like" = "like" + ? WHERE id = ?'
+            try:
+                async with in_transaction() as conn:
+                    # 只计入仍然公开的文章
+                    public = set(await PostModel.filter(id__in=list(pending), is_locked=False)
+                                 .values_list("id", flat=True))
+                    counts = {post_id: count for post_id, count in pending.items() if post_id in public}
+                    if counts:
+                        await conn.execute_many(sql, [[count, post_id] for post_id, count in counts.items()])
+                        await blog_stats.apply(likes=sum(counts.values()))
+            except Exception as e:
+                # 写入失败时保留，下次再写
+                print(f"写入点赞数失败: {e}")
+                return
+            self._pending = {}
+
+        if not counts:
+            return
+        # 列表中也带有点赞数，同时发布 posts，缓存的列表接口和公开文章投影随之更新
+        await invalidation_bus.publish("posts", *(f"post:{post_id}" for post_id in counts))
+        # 静态详情和列表中的点赞数（blog.publish 依赖 blog.api.post，在这里导入）
+        from blog.publish import static_publisher
+        await static_publisher.publish_post_likes(counts)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # shield：worker 退出取消任务时不中断正在进行的写入，close 会等它完成
+            await asyncio.shield(self.flush())
+            # 没有新的点赞时停止，下次点赞再启动
+            if not self._events and not self._pending:
+                self._task = None
+                return
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """worker 退出时写入剩余的点赞数"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+
+
+like_counter = LikeCounter(flush_interval=settings.LIKE_FLUSH_INTERVAL, dedupe_ttl=settings.LIKE_DEDUPE_TTL)
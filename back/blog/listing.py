@@ -0,0 +1,142 @@
+# 文章列表分页
+#
+# 列表按 (is_top, created_at, id) 倒序排列。游标分页记录上一页最后一篇文章的这三个值，
+# 下一页直接用 WHERE 条件定位，不需要 OFFSET 扫描并丢弃前面的行，翻到多深都一样快。
+# 各个筛选条件（分类/标签）的总数按 posts 主题版本号缓存，只在文章写入后重新统计。
+#
+# 分面统计（各分类、标签、文章/笔记的公开和私密数量）由一条 GROUP BY (category, tag, is_locked)
+# 查询得到，分组结果同样按 posts 版本号缓存；按当前筛选条件的分面直接在分组结果上过滤求和，不再查询。
+import base64
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from tortoise.expressions import Q
+
+from blog.models import PostModel
+from core.bus import invalidation_bus
+from core.db import get_connection
+from core.diskcache import disk_cache
+from core.singleflight import shared_call
+
+# 列表排序（id 保证顺序唯一）
+LIST_ORDERING = ("-is_top", "-created_at", "-id")
+
+# 笔记所在的分类（其余为文章）
+NOTE_CATEGORY = "笔记"
+
+# 每个 worker 的总数缓存：筛选条件 -> (版本号, 总数)
+_count_cache: Dict[str, Tuple[str, int]] = {}
+# 每个 worker 的分组统计缓存：(版本号, [[分类, 标签, 是否私密, 数量], ...])
+_facet_cache: Optional[Tuple[str, List[list]]] = None
+
+
+def encode_cursor(post: PostModel) -> str:
+    """文章的排序键编码为游标"""
+    raw = json.dumps([int(post.is_top), post.created_at.isoformat(), post.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[bool, datetime, int]:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        is_top, created_at, post_id = json.loads(raw)
+        return bool(is_top), datetime.fromisoformat(created_at), int(post_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+def after_cursor(cursor: str) -> Q:
+    """排在游标之后（即 (is_top, created_at, id) 更小）的文章"""
+    is_top, created_at, post_id = decode_cursor(cursor)
+    same_top = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id)
+    if is_top:
+        return Q(is_top=False) | (Q(is_top=True) & same_top)
+    return Q(is_top=False) & same_top
+
+
+async def count_posts(filters: dict) -> int:
+    """按筛选条件统计文章数（缓存到文章下次写入）"""
+    key = json.dumps(filters, sort_keys=True, ensure_ascii=False)
+    token = invalidation_bus.token("posts")
+
+    cached = _count_cache.get(key)
+    if cached and cached[0] == token:
+        return cached[1]
+
+    # 其它 worker 已经统计过时直接读取
+    stored: Optional[bytes] = disk_cache.get(f"count:{key}", token)
+    if stored is not None:
+        total = int(stored)
+    else:
+        total = await PostModel.filter(**filters).count()
+        disk_cache.set(f"count:{key}", str(total).encode("ascii"), token)
+
+    _count_cache[key] = (token, total)
+    return total
+
+
+async def _group_counts() -> List[list]:
+    _, rows = await get_connection().execute_query(
+        "SELECT category, tag, is_locked, COUNT(*) FROM posts GROUP BY category, tag, is_locked"
+    )
+    return [[row[0] or "", row[1] or "", bool(row[2]), row[3]] for row in rows]
+
+
+async def facet_rows() -> List[list]:
+    """按 (分类, 标签, 是否私密) 分组的文章数（缓存到文章下次写入）"""
+    global _facet_cache
+    token = invalidation_bus.token("posts")
+    if _facet_cache is not None and _facet_cache[0] == token:
+        return _facet_cache[1]
+
+    rows = await shared_call("facets", token, _group_counts)
+    _facet_cache = (token, rows)
+    return rows
+
+
+def _sorted_counts(counts: Dict[str, Dict[str, int]]) -> List[dict]:
+    return [
+        {"name": name, **count}
+        for name, count in sorted(counts.items(), key=lambda item: (-item[1]["public"], item[0]))
+    ]
+
+
+async def get_facets() -> dict:
+    """分类、标签、文章/笔记的公开和私密数量"""
+    kinds = {"post": {"public": 0, "locked": 0}, "note": {"public": 0, "locked": 0}}
+    categories: Dict[str, Dict[str, int]] = {}
+    tags: Dict[str, Dict[str, int]] = {}
+
+    for category, tag, is_locked, count in await facet_rows():
+        field = "locked" if is_locked else "public"
+        kinds["note" if category == NOTE_CATEGORY else "post"][field] += count
+        categories.setdefault(category, {"public": 0, "locked": 0})[field] += count
+        if tag:
+            tags.setdefault(tag, {"public": 0, "locked": 0})[field] += count
+
+    return {
+        "kinds": [{"name": name, **count} for name, count in kinds.items()],
+        "categories": _sorted_counts(categories),
+        "tags": _sorted_counts(tags),
+    }
+
+
+async def list_facets(filters: dict) -> Dict[str, Dict[str, int]]:
+    """当前筛选条件下（只统计公开文章）各分类、标签的数量"""
+    categories: Dict[str, int] = {}
+    tags: Dict[str, int] = {}
+
+    for category, tag, is_locked, count in await facet_rows():
+        if is_locked:
+            continue
+        if filters.get("category") and category != filters["category"]:
+            continue
+        if filters.get("tag") and tag != filters["tag"]:
+            continue
+        categories[category] = categories.get(category, 0) + count
+        if tag:
+            tags[tag] = tags.get(tag, 0) + count
+
+    return {"categories": categories, "tags": tags}
@@ -30,6 +30,22 @@ class PostModel(models.Model):
         table = "posts"
         ordering = ["-created_at"]
 
+class PostRenderModel(models.Model):
+    """文章派生内容，写入文章时生成，读取时不再重复处理 markdown"""
+    id = fields.IntField(pk=True)
+    post = fields.OneToOneField('models.PostModel', related_name='render', on_delete=fields.CASCADE)
+
+    # 去除 markdown 标记后的纯文本（用于检索摘要）
+    plain = fields.TextField(default="", description="纯文本")
+    # 渲染后的 HTML（代码块由前端 highlight.js 高亮）和标题目录
+    html = fields.TextField(default="", description="HTML")
+    toc = fields.JSONField(default=list, description="目录")
+
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "post_renders"
+
 class CommentModel(models.Model):
     id = fields.IntField(pk=True)
     
@@ -83,6 +99,19 @@ class PageModel(models.Model):
         table = "pages"
         ordering = ["-order"]
 
+class PageRenderModel(models.Model):
+    """页面派生内容，写入页面时生成"""
+    id = fields.IntField(pk=True)
+    page = fields.OneToOneField('models.PageModel', related_name='render', on_delete=fields.CASCADE)
+
+    html = fields.TextField(default="", description="HTML")
+    toc = fields.JSONField(default=list, description="目录")
+
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "page_renders"
+
 class PageModelManager(BaseModelManager[PageModel]):
     def __init__(self):
         super().__init__(PageModel)
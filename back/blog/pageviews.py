@@ -0,0 +1,175 @@
+# 文章阅读量
+#
+# 阅读事件先进入每个 worker 内存中的环形缓冲区（满了丢弃最旧的事件，不阻塞请求），
+# 后台任务每隔 VIEW_FLUSH_INTERVAL 秒取出全部事件，按 (文章, 小时) 合并后
+# 在一个事务中批量 upsert 到 post_views_hourly：views = views + n。
+# 排行和趋势查询只读取按小时汇总的行，不会随阅读次数增长。
+# 同一批事件的访客指纹随后合并进独立访客的 HyperLogLog 草图（blog/readers.py）。
+#
+# 小时用整数表示：UTC 时间戳 // 3600。
+import asyncio
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional, Tuple
+
+from tortoise.transactions import in_transaction
+
+from blog.models import PostModel
+from blog.readers import reader_sketches
+from core.bus import invalidation_bus
+from core.db import get_connection, is_postgres
+from config import settings
+
+HOUR = 3600
+
+
+def current_hour() -> int:
+    return int(time.time() // HOUR)
+
+
+def hour_to_datetime(hour: int) -> datetime:
+    return datetime.fromtimestamp(hour * HOUR, tz=timezone.utc)
+
+
+class ViewRecorder:
+    """每个 worker 的阅读事件缓冲区和后台写入"""
+
+    def __init__(self, buffer_size: int = 10000, flush_interval: float = 10):
+        self.flush_interval = flush_interval
+        # (文章 id, 小时, 访客指纹)
+        self._buffer: Deque[Tuple[int, int, int]] = deque(maxlen=buffer_size)
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+
+    def record(self, post_id: int, fingerprint: int):
+        """记录一次阅读（只写内存），fingerprint 为 likes.client_fingerprint"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((post_id, current_hour(), fingerprint))
+        self.recorded += 1
+        self._ensure_task()
+
+    def _drain(self) -> List[Tuple[int, int, int]]:
+        events = list(self._buffer)
+        self._buffer.clear()
+        return events
+
+    async def flush(self):
+        """把缓冲区中的事件合并后写入数据库"""
+        async with self._lock:
+            events = self._drain()
+            if not events:
+                return
+
+            # 去掉期间被删除或设为私密的文章（接口只检查内存中的公开文章投影，在这里一次过滤）
+            post_ids = set(await PostModel.filter(id__in={event[0] for event in events}, is_locked=False)
+                           .values_list("id", flat=True))
+            events = [event for event in events if event[0] in post_ids]
+            if not events:
+                return
+            counts = Counter((post_id, hour) for post_id, hour, _ in events)
+            rows = [[post_id, hour, views] for (post_id, hour), views in counts.items()]
+
+            if is_postgres():
+                sql = ("INSERT INTO post_views_hourly (post_id, hour, views) VALUES ($1, $2, $3)"
+                       " ON CONFLICT (post_id, hour) DO UPDATE SET views = post_views_hourly.views + EXCLUDED.views")
+            else:
+                sql = ("INSERT INTO post_views_hourly (post_id, hour, views) VALUES (?, ?, ?)"
+                       " ON CONFLICT (post_id, hour) DO UPDATE SET views = post_views_hourly.views + EXCLUDED.views")
+            try:
+                async with in_transaction() as conn:
+                    await conn.execute_many(sql, rows)
+            except Exception as e:
+                # 写入失败时放回缓冲区（超出容量的部分丢弃），下次再写
+                self._buffer.extend(events)
+                print(f"写入阅读量失败: {e}")
+                return
+            self.flushed += len(events)
+
+            # 阅读量已经写入，草图写入失败时不再重试（否则阅读量会重复计数），只少算这一批访客
+            try:
+                await reader_sketches.merge(events)
+            except Exception as e:
+                print(f"写入独立访客草图失败: {e}")
+
+        await invalidation_bus.publish("views")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # shield：worker 退出取消任务时不中断正在进行的写入，close 会等它完成
+            await asyncio.shield(self.flush())
+            if not self._buffer:
+                self._task = None
+                return
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """worker 退出时写入缓冲区中剩余的事件"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "buffered": len(self._buffer),
+        }
+
+
+async def top_posts(hours: int, limit: int) -> List[dict]:
+    """最近 hours 小时内阅读量最高的公开文章"""
+    since = current_hour() - hours + 1
+    conn = get_connection()
+    _, rows = await conn.execute_query(
+        "SELECT v.post_id, SUM(v.views) AS total FROM post_views_hourly v"
+        " JOIN posts p ON p.id = v.post_id"
+        + (" WHERE v.hour >= $1 AND NOT p.is_locked" if is_postgres() else " WHERE v.hour >= ? AND p.is_locked = 0")
+        + " GROUP BY v.post_id ORDER BY total DESC"
+        + (" LIMIT $2" if is_postgres() else " LIMIT ?"),
+        [since, limit],
+    )
+    titles = dict(await PostModel.filter(id__in=[row[0] for row in rows]).values_list("id", "title"))
+    return [{"id": row[0], "title": titles.get(row[0]), "views": int(row[1])} for row in rows]
+
+
+async def views_over_time(hours: int, bucket_hours: int, post_id: Optional[int] = None) -> List[dict]:
+    """
+    最近 hours 小时的阅读量，按 bucket_hours 小时分组（1 为按小时，24 为按天），没有阅读的时段为 0
+    """
+    now = current_hour()
+    # 分组与 UTC 整点/整天对齐
+    first = (now - hours + 1) // bucket_hours * bucket_hours
+    params: list = [bucket_hours, first]
+    if is_postgres():
+        sql = ("SELECT hour / $1 AS bucket, SUM(views) FROM post_views_hourly WHERE hour >= $2"
+               + (" AND post_id = $3" if post_id is not None else ""))
+    else:
+        sql = ("SELECT hour / ? AS bucket, SUM(views) FROM post_views_hourly WHERE hour >= ?"
+               + (" AND post_id = ?" if post_id is not None else ""))
+    if post_id is not None:
+        params.append(post_id)
+    _, rows = await get_connection().execute_query(sql + " GROUP BY bucket ORDER BY bucket", params)
+
+    counts = {int(row[0]): int(row[1]) for row in rows}
+    return [
+        {"time": hour_to_datetime(bucket * bucket_hours).isoformat(), "views": counts.get(bucket, 0)}
+        for bucket in range(first // bucket_hours, now // bucket_hours + 1)
+    ]
+
+
+view_recorder = ViewRecorder(buffer_size=settings.VIEW_BUFFER_SIZE, flush_interval=settings.VIEW_FLUSH_INTERVAL)
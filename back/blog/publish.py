@@ -0,0 +1,315 @@
+# 公开接口静态化
+#
+# 把前端读取的公开接口响应预先写成 JSON 文件（DATA_DIR/public 下，目录结构与接口路径一致），
+# nginx 直接返回文件，不经过 Python；文件不存在或带有其它查询参数时才转发给后端。
+# 文件内容由接口函数本身生成，与接口返回完全一致。
+#
+#   /api/posts/?page=&size=&category=   -> api/posts/list/{分类或 _all}/{size}/{page}.json
+#                                          （带 cursor 的游标翻页不使用静态文件，由后端响应）
+#   /api/posts/{id}                     -> api/posts/{id}.json
+#   /api/posts/archive | archive/summary | categories | facets | all -> api/posts/{name}.json
+#   /api/pages/                         -> api/pages/index.json
+#   /api/pages/{title}                  -> api/pages/{title}.json
+#   /api/meta                           -> api/meta.json
+#
+# admin 修改文章时立即重新生成该文章详情、归档和分类；文章原分类和现分类的列表分页较多，
+# 记为待生成，由后台任务在 STATIC_LIST_DELAY 秒后统一生成（连续修改只生成一次，不阻塞 admin 请求），
+# 点赞数写入后同样重新生成文章所在分类的列表。修改页面时只重新生成页面相关文件。
+import asyncio
+import fcntl
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+from urllib.parse import quote
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from blog.api import page as page_api
+from blog.api import post as post_api
+from blog.models import PageModel, PostModel
+from blog.schemas import PublicPageInfoResponse
+from config import settings
+from core.utils import data_path
+
+# 全部文章列表（不按分类过滤）的目录名
+ALL_POSTS = "_all"
+# 文章索引文件（api/posts 下）及生成它的接口函数
+INDEX_FILES = {
+    ("archive.json",): "get_posts_archive",
+    ("archive", "summary.json"): "get_posts_archive_summary",
+    ("categories.json",): "get_all_categories",
+    ("facets.json",): "get_posts_facets",
+    ("all.json",): "get_all_posts",
+}
+
+
+def _dumps(value) -> bytes:
+    # 与 FastAPI JSONResponse 的序列化方式一致
+    return json.dumps(
+        jsonable_encoder(value), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class StaticPublisher:
+    """生成并增量更新静态 JSON 文件"""
+
+    def __init__(self, directory: str = "public", list_sizes: Iterable[int] = (10,), list_delay: float = 2):
+        self.directory = directory
+        self.list_sizes = tuple(list_sizes)
+        self.list_delay = list_delay
+        self._lock = asyncio.Lock()
+        # 待重新生成列表的分类（None 为全部文章）
+        self._dirty_lists: Set[Optional[str]] = set()
+        self._list_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.STATIC_PUBLISH
+
+    def _path(self, *parts: str) -> Path:
+        return data_path(self.directory, "api", *parts)
+
+    def _write(self, path: Path, body: bytes):
+        """先写临时文件再原子替换，nginx 不会读到写了一半的文件"""
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def _remove(self, path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    # ---------- 跨 worker 互斥 ----------
+
+    async def _acquire(self) -> int:
+        fd = os.open(data_path(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                await asyncio.sleep(0.05)
+
+    def _release(self, fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    # ---------- 文章分类记录（判断修改前的分类） ----------
+
+    def _state_path(self) -> Path:
+        # 放在 nginx 目录之外
+        return data_path(f"{self.directory}.state")
+
+    def _load_categories(self) -> Dict[str, Optional[str]]:
+        try:
+            with open(self._state_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_categories(self, categories: Dict[str, Optional[str]]):
+        self._write(self._state_path(), json.dumps(categories, ensure_ascii=False).encode("utf-8"))
+
+    # ---------- 生成 ----------
+
+    async def _publish_list(self, category: Optional[str]):
+        """重新生成一个分类（None 为全部）各个 size 的全部分页"""
+        name = quote(category, safe="") if category else ALL_POSTS
+        filters = {"is_locked": False}
+        if category:
+            filters["category"] = category
+        total = await PostModel.filter(**filters).count()
+
+        for size in self.list_sizes:
+            pages = max(math.ceil(total / size), 1)
+            for page in range(1, pages + 1):
+                data = await post_api.get_public_posts(page=page, size=size, category=category, tag=None, cursor=None, facets=False)
+                self._write(self._path("posts", "list", name, str(size), f"{page}.json"), _dumps(data))
+            # 删除多出来的分页
+            directory = self._path("posts", "list", name, str(size), "1.json").parent
+            for path in directory.glob("*.json"):
+                if path.stem.isdigit() and int(path.stem) > pages:
+                    self._remove(path)
+
+    async def _publish_post_detail(self, post_id: int):
+        path = self._path("posts", f"{post_id}.json")
+        post = await PostModel.get_or_none(id=post_id, is_locked=False)
+        if post is None:
+            self._remove(path)
+        else:
+            self._write(path, _dumps(await post_api.post_detail(post, None)))
+
+    async def _publish_post_indexes(self):
+        """归档、分类、分类/标签统计、标题列表"""
+        for name, route in INDEX_FILES.items():
+            self._write(self._path("posts", *name), _dumps(await getattr(post_api, route)()))
+
+    async def _publish_pages(self):
+        pages = await PageModel.filter(is_active=True)
+        self._write(
+            self._path("pages", "index.json"),
+            _dumps([PublicPageInfoResponse.model_validate(page) for page in pages]),
+        )
+        published: Set[str] = set()
+        for page in pages:
+            if not page.title or "/" in page.title or page.title == "index":
+                continue
+            try:
+                data = await page_api.get_public_page(title=page.title, format=None)
+            except HTTPException:
+                continue
+            self._write(self._path("pages", f"{page.title}.json"), _dumps(data))
+            published.add(f"{page.title}.json")
+        for path in self._path("pages", "index.json").parent.glob("*.json"):
+            if path.name != "index.json" and path.name not in published:
+                self._remove(path)
+
+    async def _publish_meta(self):
+        from core.api import get_website_meta, MetaResponse
+        path = self._path("meta.json")
+        try:
+            meta = await get_website_meta()
+        except HTTPException:
+            self._remove(path)
+            return
+        self._write(path, _dumps(MetaResponse.model_validate(meta)))
+
+    async def _run(self, job):
+        if not self.enabled:
+            return
+        async with self._lock:
+            fd = await self._acquire()
+            try:
+                await job()
+            except Exception as e:
+                print(f"生成静态文件失败: {e}")
+            finally:
+                self._release(fd)
+
+    async def _publish_all_posts(self):
+        """全部文章详情、列表和索引"""
+        rows = await PostModel.filter(is_locked=False).values_list("id", "category")
+        categories = {str(post_id): category for post_id, category in rows}
+        for path in self._path("posts", "1.json").parent.glob("*.json"):
+            if path.stem.isdigit() and path.stem not in categories:
+                self._remove(path)
+        for post_id, _ in rows:
+            await self._publish_post_detail(post_id)
+        names = {ALL_POSTS} | {quote(c, safe="") for c in categories.values() if c}
+        for directory in self._path("posts", "list", ALL_POSTS).parent.iterdir():
+            if directory.is_dir() and directory.name not in names:
+                shutil.rmtree(directory, ignore_errors=True)
+        for category in {None, *categories.values()}:
+            await self._publish_list(category)
+        await self._publish_post_indexes()
+        self._save_categories(categories)
+
+    async def publish_all(self):
+        """全量生成（数据导入之后）"""
+        async def job():
+            await self._publish_all_posts()
+            await self._publish_pages()
+            await self._publish_meta()
+        await self._run(job)
+
+    async def ensure(self):
+        """
+        启动时逐项检查，缺少的文件才生成（首次启动、上次生成中断、文件被删除等）
+        多个 worker 依次拿到锁，只有第一个真正生成
+        """
+        async def job():
+            lists = [self._path("posts", "list", ALL_POSTS, str(size), "1.json") for size in self.list_sizes]
+            if not self._state_path().exists() or not all(path.exists() for path in lists):
+                await self._publish_all_posts()
+            elif not all(self._path("posts", *name).exists() for name in INDEX_FILES):
+                await self._publish_post_indexes()
+            if not self._path("pages", "index.json").exists():
+                await self._publish_pages()
+            if not self._path("meta.json").exists():
+                await self._publish_meta()
+        await self._run(job)
+
+    async def publish_post(self, post_id: int):
+        """文章创建/修改/删除之后：详情、修改前后所属分类的列表、全部列表、归档和分类"""
+        async def job():
+            categories = self._load_categories()
+            affected = {None}
+            if str(post_id) in categories:
+                affected.add(categories.pop(str(post_id)))
+            row = await PostModel.filter(id=post_id, is_locked=False).values_list("category", flat=True)
+            if row:
+                categories[str(post_id)] = row[0]
+                affected.add(row[0])
+
+            await self._publish_post_detail(post_id)
+            await self._publish_post_indexes()
+            self._save_categories(categories)
+            self._schedule_lists(affected)
+        await self._run(job)
+
+    async def publish_post_likes(self, post_ids: Iterable[int]):
+        """点赞数写入之后：文章详情，以及所在分类和全部文章的列表（列表中带有点赞数）"""
+        async def job():
+            categories = self._load_categories()
+            affected = {None}
+            for post_id in post_ids:
+                await self._publish_post_detail(post_id)
+                if str(post_id) in categories:
+                    affected.add(categories[str(post_id)])
+            self._schedule_lists(affected)
+        await self._run(job)
+
+    # ---------- 列表（后台合并生成） ----------
+
+    def _schedule_lists(self, categories: Iterable[Optional[str]]):
+        self._dirty_lists.update(categories)
+        if self._list_task is None or self._list_task.done():
+            self._list_task = asyncio.create_task(self._run_lists())
+
+    async def _run_lists(self):
+        while True:
+            await asyncio.sleep(self.list_delay)
+            # shield：worker 退出取消任务时不中断正在进行的生成，close 会等它完成
+            await asyncio.shield(self.flush_lists())
+            # 生成期间又有新的修改时继续
+            if not self._dirty_lists:
+                self._list_task = None
+                return
+
+    async def flush_lists(self):
+        """生成全部待生成的列表"""
+        dirty, self._dirty_lists = self._dirty_lists, set()
+        if not dirty:
+            return
+
+        async def job():
+            for category in dirty:
+                await self._publish_list(category)
+        await self._run(job)
+
+    async def close(self):
+        """worker 退出时生成还没有生成的列表"""
+        if self._list_task is not None and not self._list_task.done():
+            self._list_task.cancel()
+            try:
+                await self._list_task
+            except asyncio.CancelledError:
+                pass
+        self._list_task = None
+        await self.flush_lists()
+
+    async def publish_pages(self):
+        await self._run(self._publish_pages)
+
+    async def publish_meta(self):
+        await self._run(self._publish_meta)
+
+
+static_publisher = StaticPublisher(list_sizes=settings.STATIC_LIST_SIZES, list_delay=settings.STATIC_LIST_DELAY)
@@ -0,0 +1,159 @@
+# 独立访客数（近似）
+#
+# 不保存访客的 IP / User-Agent：每次阅读只把访客指纹（likes.client_fingerprint 的 64 位哈希）
+# 加入 HyperLogLog 草图（core/hll.py，每个 1536 字节），草图按 (文章, UTC 日期) 和 (文章, all) 保存在
+# reader_sketches 表中，post_id 为 0 的行是全站。
+#
+# 阅读事件和阅读量一起由 ViewRecorder 批量写入：本批事件先在内存中合并成草图，再与数据库中的草图
+# 逐寄存器取最大值后写回。读-合并-写在文件锁（同一台机器的 worker 之间）和事务内完成，
+# PostgreSQL 上再用 SELECT ... FOR UPDATE 锁住这些行（多台机器之间）。
+# 草图合并是幂等的，某一批写入失败只会少算这一批的访客，不会重复计数。
+#
+# 查询一段时间的独立访客数时合并这段时间每天的草图再估计，内存占用与访客数无关。
+# 合并在事件循环中用纯 Python 完成，按天查询最多 MAX_DAYS 天（更长的时间用全部时间的草图）。
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tortoise.transactions import in_transaction
+
+from core.db import get_connection, is_postgres
+from core.hll import HyperLogLog
+from core.utils import data_path
+
+# 全站草图的 post_id
+SITE = 0
+# 全部时间的 bucket
+ALL = "all"
+# 按天查询的最大天数
+MAX_DAYS = 365
+
+
+def hour_to_day(hour: int) -> str:
+    """小时（UTC 时间戳 // 3600）所在的 UTC 日期"""
+    return datetime.fromtimestamp(hour * 3600, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+@asynccontextmanager
+async def _file_lock():
+    """同一台机器上合并草图的锁（非阻塞轮询，不阻塞事件循环）"""
+    fd = os.open(data_path("locks", "reader_sketches.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(0.05)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class ReaderSketches:
+    """reader_sketches 表的读写"""
+
+    def build(self, events: Iterable[Tuple[int, int, int]]) -> Dict[Tuple[int, str], HyperLogLog]:
+        """把 (文章 id, 小时, 访客指纹) 事件合并成 {(post_id, bucket): 草图}"""
+        sketches: Dict[Tuple[int, str], HyperLogLog] = {}
+        days: Dict[int, str] = {}
+        for post_id, hour, fingerprint in events:
+            day = days.get(hour)
+            if day is None:
+                day = days[hour] = hour_to_day(hour)
+            for key in ((post_id, day), (post_id, ALL), (SITE, day), (SITE, ALL)):
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = HyperLogLog()
+                sketch.add_hash(fingerprint)
+        return sketches
+
+    async def merge(self, events: Iterable[Tuple[int, int, int]]):
+        """把一批阅读事件合并进数据库中的草图"""
+        sketches = self.build(events)
+        if not sketches:
+            return
+
+        by_bucket: Dict[str, Dict[int, HyperLogLog]] = {}
+        for (post_id, bucket), sketch in sketches.items():
+            by_bucket.setdefault(bucket, {})[post_id] = sketch
+
+        async with _file_lock():
+            async with in_transaction() as conn:
+                for bucket, group in by_bucket.items():
+                    post_ids = list(group)
+                    if is_postgres():
+                        # 先补齐不存在的行，再锁住要合并的行
+                        empty = HyperLogLog().to_bytes()
+                        await conn.execute_many(
+                            "INSERT INTO reader_sketches (post_id, bucket, sketch) VALUES ($1, $2, $3)"
+                            " ON CONFLICT (post_id, bucket) DO NOTHING",
+                            [[post_id, bucket, empty] for post_id in post_ids],
+                        )
+                        _, rows = await conn.execute_query(
+                            "SELECT post_id, sketch FROM reader_sketches"
+                            " WHERE bucket = $1 AND post_id = ANY($2::int[]) FOR UPDATE",
+                            [bucket, post_ids],
+                        )
+                        sql = ("INSERT INTO reader_sketches (post_id, bucket, sketch) VALUES ($1, $2, $3)"
+                               " ON CONFLICT (post_id, bucket) DO UPDATE SET sketch = EXCLUDED.sketch")
+                    else:
+                        _, rows = await conn.execute_query(
+                            "SELECT post_id, sketch FROM reader_sketches WHERE bucket = ? AND post_id IN ("
+                            + ", ".join("?" * len(post_ids)) + ")",
+                            [bucket, *post_ids],
+                        )
+                        sql = ("INSERT INTO reader_sketches (post_id, bucket, sketch) VALUES (?, ?, ?)"
+                               " ON CONFLICT (post_id, bucket) DO UPDATE SET sketch = EXCLUDED.sketch")
+
+                    for post_id, blob in rows:
+                        group[post_id].merge(HyperLogLog.from_bytes(bytes(blob)))
+                    await conn.execute_many(
+                        sql, [[post_id, bucket, sketch.to_bytes()] for post_id, sketch in group.items()]
+                    )
+
+    async def _load(self, post_id: int, buckets: List[str]) -> List[Tuple[str, bytes]]:
+        if is_postgres():
+            sql = "SELECT bucket, sketch FROM reader_sketches WHERE post_id = $1 AND bucket = ANY($2::varchar[])"
+            params: list = [post_id, buckets]
+        else:
+            sql = ("SELECT bucket, sketch FROM reader_sketches WHERE post_id = ? AND bucket IN ("
+                   + ", ".join("?" * len(buckets)) + ")")
+            params = [post_id, *buckets]
+        _, rows = await get_connection().execute_query(sql, params)
+        return [(row[0], bytes(row[1])) for row in rows]
+
+    def _recent_days(self, days: int) -> List[str]:
+        today = datetime.now(timezone.utc).date()
+        return [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+
+    async def readers(self, post_id: int = SITE, days: Optional[int] = None) -> int:
+        """
+        最近 days 天（含今天，UTC）的独立访客数，不传 days 为全部时间
+        post_id 为 0 时为全站
+        """
+        buckets = [ALL] if days is None else self._recent_days(days)
+        total = HyperLogLog()
+        for _, blob in await self._load(post_id, buckets):
+            total.merge(HyperLogLog.from_bytes(blob))
+        return total.count()
+
+    async def daily(self, days: int, post_id: int = SITE) -> List[dict]:
+        """最近 days 天每天的独立访客数，没有访客的日期为 0"""
+        buckets = self._recent_days(days)
+        counts = {bucket: HyperLogLog.from_bytes(blob).count() for bucket, blob in await self._load(post_id, buckets)}
+        return [{"date": bucket, "readers": counts.get(bucket, 0)} for bucket in buckets]
+
+    async def remove_post(self, post_id: int):
+        """删除文章的草图（全站草图中的访客无法单独去掉，保留）"""
+        conn = get_connection()
+        await conn.execute_query(
+            "DELETE FROM reader_sketches WHERE post_id = " + ("$1" if is_postgres() else "?"), [post_id]
+        )
+
+
+reader_sketches = ReaderSketches()
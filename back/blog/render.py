@@ -0,0 +1,74 @@
+# 文章/页面派生内容
+#
+# 写入时生成并保存到 post_renders / page_renders 表（纯文本、HTML、目录），
+# 读取接口（RSS、format=html 的详情接口、检索摘要）直接使用保存的结果，
+# 不再在每次请求时处理原始 markdown。
+import re
+
+from blog.models import PageModel, PageRenderModel, PostModel, PostRenderModel
+from blog.renderer import render_async
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~).*$", re.MULTILINE)
+_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_HTML_RE = re.compile(r"<[^>]+>")
+_LINE_PREFIX_RE = re.compile(r"^\s*(#{1,6}\s+|>+\s?|[-*+]\s+|\d+\.\s+|\|)", re.MULTILINE)
+_MARK_RE = re.compile(r"(\*\*|__|~~|`+|\*|\|)")
+_RULE_RE = re.compile(r"^\s*([-*_=]\s*){3,}$", re.MULTILINE)
+_TABLE_RULE_RE = re.compile(r"^\s*\|?(\s*:?-{3,}:?\s*\|?)+\s*$", re.MULTILINE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def markdown_to_text(md_text: str) -> str:
+    """去除 markdown 标记，返回单行纯文本（保留代码块内容）"""
+    if not md_text:
+        return ""
+
+    text = _FENCE_RE.sub(" ", md_text)
+    text = _IMAGE_RE.sub(r"\1", text)
+    text = _LINK_RE.sub(r"\1", text)
+    text = _HTML_RE.sub(" ", text)
+    text = _RULE_RE.sub(" ", text)
+    text = _TABLE_RULE_RE.sub(" ", text)
+    text = _LINE_PREFIX_RE.sub("", text)
+    text = _MARK_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+async def update_post_render(post: PostModel):
+    """生成并保存单篇文章的派生内容"""
+    html, toc = await render_async(post.content)
+    await PostRenderModel.update_or_create(
+        defaults={"plain": markdown_to_text(post.content), "html": html, "toc": toc},
+        post_id=post.id,
+    )
+
+
+async def update_page_render(page: PageModel):
+    """生成并保存单个页面的派生内容"""
+    html, toc = await render_async(page.content)
+    await PageRenderModel.update_or_create(
+        defaults={"html": html, "toc": toc},
+        page_id=page.id,
+    )
+
+
+async def _backfill(model, render_model, key: str, update, refresh: bool, batch_size: int):
+    rendered = set() if refresh else set(await render_model.all().values_list(key, flat=True))
+    ids = [
+        obj_id for obj_id in await model.all().values_list("id", flat=True)
+        if obj_id not in rendered
+    ]
+    for i in range(0, len(ids), batch_size):
+        for obj in await model.filter(id__in=ids[i:i + batch_size]):
+            await update(obj)
+
+
+async def backfill_renders(refresh: bool = False, batch_size: int = 100):
+    """
+    为还没有派生内容的文章和页面补齐（启动时调用，已有的不会重复生成）
+    refresh 为 True 时全部重新生成（数据导入之后）
+    """
+    await _backfill(PostModel, PostRenderModel, "post_id", update_post_render, refresh, batch_size)
+    await _backfill(PageModel, PageRenderModel, "page_id", update_page_render, refresh, batch_size)
+
@@ -0,0 +1,172 @@
+# Markdown 渲染引擎
+#
+# - 每个进程只创建一个预先配置好的渲染器，文档之间调用 reset() 复用，
+#   不再每次渲染都重新实例化 Markdown 和加载全部扩展
+# - 后端可插拔：默认 Python-Markdown（extra 扩展：脚注、属性列表、定义列表、缩写等）；
+#   markdown-it-py（CommonMark 实现，更快）不支持缩写，已有文章渲染结果会变化，
+#   需要通过 MARKDOWN_BACKEND=markdown-it 显式启用
+# - 超过 MARKDOWN_POOL_THRESHOLD 字符的文档放到进程池中渲染，
+#   避免一篇长文阻塞同一 worker 上的其它请求
+# - 渲染结果按 后端 + 内容哈希 保存在共享磁盘缓存中，相同内容（数据导入后重新生成等）不重复渲染
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from core.diskcache import disk_cache
+from core.pool import run_in_process
+
+# (html, 目录)
+RenderResult = Tuple[str, List[Dict]]
+
+_SLUG_RE = re.compile(r"[^\w\- ]")
+
+# 渲染选项变化时递增，磁盘缓存中旧选项的渲染结果不再命中
+RENDER_VERSION = 2
+
+
+class MarkdownBackend:
+    """Python-Markdown 后端"""
+
+    name = "markdown"
+
+    EXTENSIONS = [
+        'markdown.extensions.extra',      # 包含表格、缩写等
+        'markdown.extensions.codehilite', # 代码高亮
+        'markdown.extensions.toc',        # 目录生成
+        'markdown.extensions.smarty',     # 智能标点
+        'markdown.extensions.nl2br',      # 换行转 <br>
+        'markdown.extensions.sane_lists', # 更合理的列表
+        'markdown.extensions.fenced_code', # 围栏代码块
+    ]
+
+    # 键必须与 EXTENSIONS 中的名称一致，否则配置不生效
+    EXTENSION_CONFIGS = {
+        'markdown.extensions.codehilite': {
+            'css_class': 'hljs',
+            'use_pygments': False,  # 使用 hljs 而不是 pygments
+            'guess_lang': True,
+        },
+        'toc': {
+            'permalink': True,
+        }
+    }
+
+    def __init__(self):
+        import markdown
+        self._md = markdown.Markdown(
+            extensions=self.EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS
+        )
+
+    def render(self, text: str) -> RenderResult:
+        self._md.reset()
+        html = self._md.convert(text)
+        return html, self._md.toc_tokens
+
+
+class MarkdownItBackend:
+    """
+    markdown-it-py 后端（CommonMark + 表格/删除线/智能标点/换行）
+    安装了 mdit-py-plugins 时再启用脚注、定义列表和属性
+    代码块输出 <pre><code class="language-xxx">，与 Python-Markdown 后端一样由前端的 highlight.js 高亮
+    """
+
+    name = "markdown-it"
+
+    def __init__(self):
+        from markdown_it import MarkdownIt
+        self._md = MarkdownIt(
+            "commonmark",
+            {"html": True, "breaks": True, "typographer": True},
+        ).enable(["table", "strikethrough", "replacements", "smartquotes"])
+        try:
+            from mdit_py_plugins.attrs import attrs_plugin
+            from mdit_py_plugins.deflist import deflist_plugin
+            from mdit_py_plugins.footnote import footnote_plugin
+        except ImportError:
+            pass
+        else:
+            self._md.use(footnote_plugin).use(deflist_plugin).use(attrs_plugin)
+
+    def render(self, text: str) -> RenderResult:
+        env = {}
+        tokens = self._md.parse(text, env)
+
+        # 为标题生成 id，并构造与 Python-Markdown toc_tokens 相同结构的目录
+        toc, stack, used = [], [], set()
+        for i, token in enumerate(tokens):
+            if token.type != "heading_open":
+                continue
+            # 与 Python-Markdown 的 toc_tokens 一致，使用渲染后的纯文本而不是原始 markdown
+            name = "".join(
+                child.content for child in tokens[i + 1].children or ()
+                if child.type in ("text", "code_inline")
+            )
+            slug = base = _SLUG_RE.sub("", name).strip().lower().replace(" ", "-") or "section"
+            n = 0
+            while slug in used:
+                n += 1
+                slug = f"{base}_{n}"
+            used.add(slug)
+            token.attrSet("id", slug)
+
+            item = {"level": int(token.tag[1]), "id": slug, "name": name, "children": []}
+            while stack and stack[-1]["level"] >= item["level"]:
+                stack.pop()
+            (stack[-1]["children"] if stack else toc).append(item)
+            stack.append(item)
+
+        html = self._md.renderer.render(tokens, self._md.options, env)
+        return html, toc
+
+
+BACKENDS = {
+    MarkdownItBackend.name: MarkdownItBackend,
+    MarkdownBackend.name: MarkdownBackend,
+}
+
+_renderer = None
+
+
+def create_backend(name: str = "auto"):
+    """按名称创建后端，auto 时使用 Python-Markdown（与已保存的渲染结果一致）"""
+    if name == "auto":
+        name = MarkdownBackend.name
+    return BACKENDS[name]()
+
+
+def get_renderer():
+    """当前进程的渲染器（惰性创建，之后一直复用）"""
+    global _renderer
+    if _renderer is None:
+        _renderer = create_backend(settings.MARKDOWN_BACKEND)
+    return _renderer
+
+
+def render(text: str) -> RenderResult:
+    """同步渲染（当前进程）"""
+    if not text:
+        return "", []
+    return get_renderer().render(text)
+
+
+async def render_async(text: Optional[str]) -> RenderResult:
+    """渲染 markdown，长文档放到进程池中执行"""
+    if not text:
+        return "", []
+
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    key = f"render:{get_renderer().name}:{RENDER_VERSION}:{digest}"
+    cached = disk_cache.get(key)
+    if cached is not None:
+        html, toc = json.loads(cached)
+        return html, toc
+
+    if len(text) > settings.MARKDOWN_POOL_THRESHOLD:
+        html, toc = await run_in_process(render, text)
+    else:
+        html, toc = render(text)
+    disk_cache.set(key, json.dumps([html, toc], ensure_ascii=False).encode("utf-8"))
+    return html, toc
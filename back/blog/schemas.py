@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 # 基础模型
@@ -44,6 +44,11 @@ class PostResponse(PostBase):
     class Config:
         from_attributes = True
 
+# 详情响应模型（format=html 时附带写入时渲染好的 HTML 和目录，列表中不包含这两个字段）
+class PostDetailResponse(PostResponse):
+    html: Optional[str] = None
+    toc: Optional[List[dict]] = None
+
 # 列表响应模型
 class PostListResponse(BaseModel):
     posts: List[PostResponse]
@@ -51,6 +56,37 @@ class PostListResponse(BaseModel):
     total_page: int
     current_page: int
     size: int
+    # 下一页的游标（没有下一页时为空）
+    next_cursor: Optional[str] = None
+    # 当前筛选条件下各分类、标签的公开文章数（facets=true 时返回）
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+
+# 分类/标签统计
+class FacetCount(BaseModel):
+    name: str
+    public: int
+    locked: int
+
+class FacetsResponse(BaseModel):
+    # post（文章）/ note（笔记）
+    kinds: List[FacetCount]
+    categories: List[FacetCount]
+    tags: List[FacetCount]
+
+# 搜索结果（content 为纯文本摘要，关键词已高亮）
+class SearchHit(BaseModel):
+    id: int
+    title: Optional[str] = None
+    category: Optional[str] = None
+    content: str
+
+# 搜索响应模型
+class SearchResponse(BaseModel):
+    posts: List[SearchHit]
+    total: int
+    total_page: int
+    current_page: int
+    size: int
 
 # 基础模型
 class PageBase(BaseModel):
@@ -114,6 +150,11 @@ class PublicPageDetailResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# 公开页面详情（format=html 时附带 HTML 和目录）
+class PublicPageHtmlResponse(PublicPageDetailResponse):
+    html: Optional[str] = None
+    toc: Optional[List[dict]] = None
+
 # 列表响应模型
 class PageListResponse(BaseModel):
     pages: List[PageResponse]
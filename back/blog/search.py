@@ -0,0 +1,179 @@
+# 文章全文检索
+#
+# - sqlite:   FTS5 虚拟表 posts_fts（rowid 即文章 id）
+# - postgres: posts_search 表 + tsvector GIN 索引
+#
+# 中文不依赖外部词典，统一采用二元切分（bigram）后以空格拼接写入索引，
+# 两种数据库都只需要按空格分词即可。
+import re
+from typing import List, Tuple
+
+from blog.models import PostModel
+from core.db import get_connection, is_postgres
+
+# 中日韩字符范围
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+# 连续的中日韩字符 或 其它单词字符
+_TOKEN_RE = re.compile(rf"([{_CJK}]+)|([^\W{_CJK}]+)")
+
+# 标题在排序中的权重（相对正文）
+TITLE_WEIGHT = 10.0
+
+
+def bigram_tokens(text: str) -> List[str]:
+    """
+    文档切分：英文按单词，中文按二元切分
+    中文连续串的最后一个字额外作为单字输出，保证任意单字都能被前缀查询命中
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text.lower()):
+        if word:
+            tokens.append(word)
+            continue
+        if len(cjk) > 1:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        tokens.append(cjk[-1])
+    return tokens
+
+
+def query_terms(keyword: str) -> List[Tuple[str, bool]]:
+    """
+    查询切分，返回 (词, 是否前缀匹配)
+    英文单词和单个汉字使用前缀匹配，中文串使用二元精确匹配（AND）
+    """
+    terms = []
+    for cjk, word in _TOKEN_RE.findall(keyword.lower()):
+        if word:
+            terms.append((word, True))
+        elif len(cjk) == 1:
+            terms.append((cjk, True))
+        else:
+            terms.extend((cjk[i:i + 2], False) for i in range(len(cjk) - 1))
+    # 去重并保持顺序
+    return list(dict.fromkeys(terms))
+
+
+class SearchIndex:
+    """文章全文检索索引"""
+
+    async def setup(self):
+        """索引为空时从文章表回填（索引结构由迁移创建）"""
+        conn = get_connection()
+        table = "posts_search" if is_postgres() else "posts_fts"
+        _, rows = await conn.execute_query(f"SELECT COUNT(*) FROM {table}")
+
+        if rows[0][0] == 0 and await PostModel.all().exists():
+            await self.rebuild()
+
+    async def index_post(self, post: PostModel):
+        """写入或更新单篇文章的索引"""
+        await self._upsert(post.id, post.title or "", post.content or "")
+
+    async def remove_post(self, post_id: int):
+        """删除单篇文章的索引"""
+        conn = get_connection()
+        if is_postgres():
+            await conn.execute_query("DELETE FROM posts_search WHERE post_id = $1", [post_id])
+        else:
+            await conn.execute_query("DELETE FROM posts_fts WHERE rowid = ?", [post_id])
+
+    async def rebuild(self, batch_size: int = 200):
+        """全量重建索引（分批读取，避免一次加载全部正文）"""
+        conn = get_connection()
+        if is_postgres():
+            await conn.execute_query("DELETE FROM posts_search")
+        else:
+            await conn.execute_query("DELETE FROM posts_fts")
+
+        last_id = 0
+        while True:
+            rows = await PostModel.filter(id__gt=last_id)\
+                .order_by("id")\
+                .limit(batch_size)\
+                .values_list("id", "title", "content")
+            if not rows:
+                break
+            for post_id, title, content in rows:
+                await self._upsert(post_id, title or "", content or "")
+            last_id = rows[-1][0]
+
+    def _match_expr(self, keyword: str) -> str:
+        """构造查询表达式，所有词之间为 AND 关系"""
+        terms = query_terms(keyword)
+        if is_postgres():
+            return " & ".join(
+                f"'{term}'" + (":*" if prefix else "") for term, prefix in terms
+            )
+        return " AND ".join(
+            f'"{term}"' + ("*" if prefix else "") for term, prefix in terms
+        )
+
+    async def search(self, keyword: str, limit: int = 50, offset: int = 0) -> List[int]:
+        """按相关度返回匹配的公开文章 id 列表"""
+        expr = self._match_expr(keyword)
+        if not expr:
+            return []
+
+        conn = get_connection()
+        if is_postgres():
+            _, rows = await conn.execute_query(
+                "SELECT s.post_id FROM posts_search s"
+                " JOIN posts p ON p.id = s.post_id, to_tsquery('simple', $1) q"
+                " WHERE s.tsv @@ q AND NOT p.is_locked"
+                " ORDER BY ts_rank(s.tsv, q) DESC LIMIT $2 OFFSET $3",
+                [expr, limit, offset],
+            )
+        else:
+            # bm25 数值越小越相关
+            _, rows = await conn.execute_query(
+                "SELECT posts_fts.rowid FROM posts_fts"
+                " JOIN posts ON posts.id = posts_fts.rowid"
+                " WHERE posts_fts MATCH ? AND posts.is_locked = 0"
+                f" ORDER BY bm25(posts_fts, {TITLE_WEIGHT}, 1.0) LIMIT ? OFFSET ?",
+                [expr, limit, offset],
+            )
+        return [row[0] for row in rows]
+
+    async def count(self, keyword: str) -> int:
+        """匹配的公开文章总数"""
+        expr = self._match_expr(keyword)
+        if not expr:
+            return 0
+
+        conn = get_connection()
+        if is_postgres():
+            _, rows = await conn.execute_query(
+                "SELECT COUNT(*) FROM posts_search s JOIN posts p ON p.id = s.post_id"
+                " WHERE s.tsv @@ to_tsquery('simple', $1) AND NOT p.is_locked",
+                [expr],
+            )
+        else:
+            _, rows = await conn.execute_query(
+                "SELECT COUNT(*) FROM posts_fts JOIN posts ON posts.id = posts_fts.rowid"
+                " WHERE posts_fts MATCH ? AND posts.is_locked = 0",
+                [expr],
+            )
+        return rows[0][0]
+
+    async def _upsert(self, post_id: int, title: str, content: str):
+        conn = get_connection()
+        title_text = " ".join(bigram_tokens(title))
+        body_text = " ".join(bigram_tokens(content))
+        if is_postgres():
+            await conn.execute_query(
+                "INSERT INTO posts_search (post_id, tsv) VALUES ($1,"
+                " setweight(to_tsvector('simple', $2), 'A') || setweight(to_tsvector('simple', $3), 'B'))"
+                " ON CONFLICT (post_id) DO UPDATE SET tsv = EXCLUDED.tsv",
+                [post_id, title_text, body_text],
+            )
+        else:
+            await conn.execute_query(
+                "INSERT OR REPLACE INTO posts_fts (rowid, title, body) VALUES (?, ?, ?)",
+                [post_id, title_text, body_text],
+            )
+
+
+search_index = SearchIndex()
@@ -0,0 +1,253 @@
+# 站点地图
+#
+# 由公开文章和启用页面的 (id, title, updated_at) 投影生成，结果保存在 DATA_DIR/sitemap 下：
+# 文章按 id 区间分片（每片 SITEMAP_CHUNK 个 id），页面单独一片，每片文件只保存 <url> 片段。
+# 内容变更时把受影响的分片记为待重写，由后台任务在 SITEMAP_DELAY 秒后统一重写（连续修改只重写一次），
+# 请求时直接拼接文件，不访问数据库。写文件和等待文件锁在线程中进行，不阻塞事件循环。
+# 总 URL 数不超过 SITEMAP_LIMIT 时 /sitemap.xml 是单个 urlset，超过后变为 sitemap index（每个分片一个子 sitemap）。
+import asyncio
+import fcntl
+import json
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+from blog.models import PageModel, PostModel
+from config import settings
+from core.utils import data_path
+
+# 协议规定单个 sitemap 文件最多 50000 个 URL
+SITEMAP_LIMIT = 50000
+# 每个分片的 id 区间大小（修改一篇文章只重写这么多 URL）
+SITEMAP_CHUNK = 1000
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+PAGES_CHUNK = "pages"
+
+_READ_SIZE = 64 * 1024
+
+
+def _lastmod(dt: Optional[datetime]) -> str:
+    if dt is None:
+        return ""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def _url(loc: str, lastmod: str) -> str:
+    loc = loc.replace("&", "&amp;")
+    if lastmod:
+        return f"<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod></url>\n"
+    return f"<url><loc>{loc}</loc></url>\n"
+
+
+class SitemapStore:
+    """分片文件 + manifest（分片 URL 数、最后修改时间、版本号、分片大小）"""
+
+    def __init__(self, directory: str = "sitemap", delay: float = 2):
+        self.directory = directory
+        self.delay = delay
+        self._manifest: Optional[dict] = None
+        self._manifest_signature: Tuple[int, int] = (0, 0)
+        # 待重写的分片名
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def _path(self, name: str):
+        return data_path(self.directory, name)
+
+    @property
+    def base_url(self) -> str:
+        # 与 Feed 使用同一个站点地址
+        from blog.api.rss import BLOG_CONFIG
+        return BLOG_CONFIG["link"]
+
+    # ---------- manifest ----------
+
+    def manifest(self) -> dict:
+        """当前 manifest（文件修改后才重新读取）"""
+        path = self._path("manifest.json")
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return {"epoch": 0, "version": 0, "modified_at": 0.0, "chunks": {}}
+        # 写入是原子替换，inode 变化即文件已更新
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        if self._manifest is None or signature != self._manifest_signature:
+            with open(path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._manifest_signature = signature
+        return self._manifest
+
+    def _commit(self, chunks: Dict[str, Tuple[bytes, int, str]], replace_all: bool = False):
+        """
+        写入分片文件并更新 manifest（文件锁内读改写，多个 worker 同时写入不会丢失更新）
+        chunks: {分片名: (url 片段, URL 数, 最后修改时间)}
+        """
+        lock_fd = os.open(self._path(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            manifest = dict(self.manifest())
+            manifest["chunks"] = {} if replace_all else dict(manifest["chunks"])
+            for name, (body, count, lastmod) in chunks.items():
+                if count:
+                    self._write(f"{name}.part", body)
+                    manifest["chunks"][name] = {"count": count, "lastmod": lastmod}
+                else:
+                    manifest["chunks"].pop(name, None)
+            manifest["epoch"] = manifest["epoch"] or secrets.randbits(48) | 1
+            manifest["chunk_size"] = SITEMAP_CHUNK
+            manifest["version"] += 1
+            manifest["modified_at"] = time.time()
+            self._write("manifest.json", json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def _write(self, name: str, body: bytes):
+        """先写临时文件再原子替换，读取方不会看到写了一半的文件"""
+        path = self._path(name)
+        tmp = path.with_name(f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    # ---------- 生成 ----------
+
+    async def _post_chunk(self, index: int) -> Tuple[bytes, int, str]:
+        rows = await PostModel.filter(
+            is_locked=False, id__gte=index * SITEMAP_CHUNK, id__lt=(index + 1) * SITEMAP_CHUNK
+        ).order_by("id").values_list("id", "updated_at")
+        base = self.base_url
+        body = "".join(_url(f"{base}/post/{post_id}", _lastmod(updated_at)) for post_id, updated_at in rows)
+        lastmod = max((_lastmod(updated_at) for _, updated_at in rows), default="")
+        return body.encode("utf-8"), len(rows), lastmod
+
+    async def _pages_chunk(self) -> Tuple[bytes, int, str]:
+        rows = await PageModel.filter(is_active=True).order_by("-order")\
+            .values_list("title", "updated_at")
+        base = self.base_url
+        urls = [_url(base + "/", "")]
+        urls += [
+            _url(f"{base}/{quote(title)}", _lastmod(updated_at))
+            for title, updated_at in rows if title
+        ]
+        lastmod = max((_lastmod(updated_at) for _, updated_at in rows), default="")
+        return "".join(urls).encode("utf-8"), len(urls), lastmod
+
+    async def build(self):
+        """全量生成（首次启动、数据导入之后）"""
+        async with self._lock:
+            # 全量生成包含了此前待重写的分片
+            self._dirty.clear()
+            chunks = {PAGES_CHUNK: await self._pages_chunk()}
+            max_id = await PostModel.filter(is_locked=False).order_by("-id").limit(1).values_list("id", flat=True)
+            if max_id:
+                for index in range(max_id[0] // SITEMAP_CHUNK + 1):
+                    chunks[f"posts-{index}"] = await self._post_chunk(index)
+            await asyncio.to_thread(self._commit, chunks, True)
+
+    async def ensure(self):
+        """还没有生成过、分片大小变化或有分片文件缺失时全量生成"""
+        manifest = self.manifest()
+        if not manifest["version"] or manifest.get("chunk_size") != SITEMAP_CHUNK or any(
+            not self._path(f"{name}.part").exists() for name in manifest["chunks"]
+        ):
+            await self.build()
+
+    async def update_post(self, post_id: int):
+        """文章所在的分片记为待重写"""
+        self._schedule([f"posts-{post_id // SITEMAP_CHUNK}"])
+
+    async def update_pages(self):
+        self._schedule([PAGES_CHUNK])
+
+    # ---------- 后台合并重写 ----------
+
+    def _schedule(self, names: Iterable[str]):
+        self._dirty.update(names)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.delay)
+            # shield：worker 退出取消任务时不中断正在进行的重写，close 会等它完成
+            await asyncio.shield(self.flush())
+            # 重写期间又有新的修改时继续
+            if not self._dirty:
+                self._task = None
+                return
+
+    async def flush(self):
+        """重写全部待重写的分片"""
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return
+            chunks = {}
+            try:
+                for name in dirty:
+                    if name == PAGES_CHUNK:
+                        chunks[name] = await self._pages_chunk()
+                    else:
+                        chunks[name] = await self._post_chunk(int(name.split("-")[1]))
+                await asyncio.to_thread(self._commit, chunks)
+            except Exception as e:
+                print(f"更新站点地图失败: {e}")
+
+    async def close(self):
+        """worker 退出时重写还没有重写的分片"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+
+    # ---------- 输出 ----------
+
+    def total(self) -> int:
+        return sum(chunk["count"] for chunk in self.manifest()["chunks"].values())
+
+    def chunk_names(self) -> List[str]:
+        chunks = self.manifest()["chunks"]
+        return [PAGES_CHUNK] * (PAGES_CHUNK in chunks) + sorted(
+            (name for name in chunks if name != PAGES_CHUNK),
+            key=lambda name: int(name.split("-")[1]),
+        )
+
+    def iter_urlset(self, names: List[str]) -> Iterator[bytes]:
+        """拼接分片文件输出 urlset（分块读取）"""
+        yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'.encode("utf-8")
+        for name in names:
+            try:
+                with open(self._path(f"{name}.part"), "rb") as f:
+                    while block := f.read(_READ_SIZE):
+                        yield block
+            except FileNotFoundError:
+                continue
+        yield b"</urlset>\n"
+
+    def index_xml(self) -> bytes:
+        """sitemap index，每个分片一个子 sitemap"""
+        chunks = self.manifest()["chunks"]
+        parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">']
+        for name in self.chunk_names():
+            parts.append("<sitemap>")
+            parts.append(f"<loc>{self.base_url}/sitemap-{name}.xml</loc>")
+            if chunks[name]["lastmod"]:
+                parts.append(f"<lastmod>{chunks[name]['lastmod']}</lastmod>")
+            parts.append("</sitemap>")
+        parts.append("</sitemapindex>\n")
+        return "\n".join(parts).encode("utf-8")
+
+
+sitemap_store = SitemapStore(delay=settings.SITEMAP_DELAY)
@@ -0,0 +1,127 @@
+# 博客统计计数
+#
+# blog_stats 表只有一行（id = 1）：文章数、笔记数、评论数、点赞数、第一篇文章时间和建站时间。
+# admin 写文章、提交评论、点赞时，在写入的同一个事务中按增量更新（UPDATE ... SET x = x + n），
+# 统计接口只需要按主键读一行。数据导入后或计数有偏差时用 rebuild 重新统计。
+from datetime import datetime
+from typing import Optional
+
+from tortoise.transactions import in_transaction
+
+from blog.models import CommentModel, PostModel
+from core.db import get_connection, is_postgres
+from core.meta import MetaModel
+
+NOTE_CATEGORY = "笔记"
+
+
+def _kind(category: Optional[str]) -> str:
+    return "notes" if category == NOTE_CATEGORY else "posts"
+
+
+def _parse_time(value) -> Optional[datetime]:
+    """sqlite 返回字符串，PostgreSQL 返回 datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class BlogStats:
+    """blog_stats 表的维护和读取"""
+
+    async def setup(self):
+        """统计行不存在时全量统计（表由迁移创建）"""
+        _, rows = await get_connection().execute_query("SELECT COUNT(*) FROM blog_stats")
+        if rows[0][0] == 0:
+            await self.rebuild()
+
+    async def apply(self, posts: int = 0, notes: int = 0, comments: int = 0, likes: int = 0,
+                    first_post: bool = False):
+        """
+        按增量更新计数，在调用方的事务中执行
+        first_post 为 True 时同时重新取第一篇文章的时间（文章创建/删除后）
+        """
+        first_post_sql = ", first_post_at = (SELECT MIN(created_at) FROM posts)" if first_post else ""
+        if is_postgres():
+            sql = ("UPDATE blog_stats SET posts = posts + $1, notes = notes + $2,"
+                   " comments = comments + $3, likes = likes + $4" + first_post_sql + " WHERE id = 1")
+        else:
+            sql = ("UPDATE blog_stats SET posts = posts + ?, notes = notes + ?,"
+                   " comments = comments + ?, likes = likes + ?" + first_post_sql + " WHERE id = 1")
+        await get_connection().execute_query(sql, [posts, notes, comments, likes])
+
+    async def post_created(self, post: PostModel):
+        await self.apply(**{_kind(post.category): 1}, first_post=True)
+
+    async def post_changed(self, old_category: Optional[str], post: PostModel):
+        """文章更新后（分类可能在文章和笔记之间变化）"""
+        old_kind, new_kind = _kind(old_category), _kind(post.category)
+        if old_kind != new_kind:
+            await self.apply(**{old_kind: -1, new_kind: 1})
+
+    async def post_deleted(self, post: PostModel):
+        """
+        文章删除前调用（评论随文章级联删除，一并减去）
+        删除之后再调用 refresh_first_post 更新第一篇文章的时间
+        """
+        comments = await CommentModel.filter(post_id=post.id).count()
+        await self.apply(**{_kind(post.category): -1}, comments=-comments, likes=-(post.like or 0))
+
+    async def refresh_first_post(self):
+        await self.apply(first_post=True)
+
+    async def rebuild(self):
+        """全量重新统计"""
+        async with in_transaction() as conn:
+            _, rows = await conn.execute_query(
+                "SELECT COUNT(*),"
+                f" COALESCE(SUM(CASE WHEN category = '{NOTE_CATEGORY}' THEN 1 ELSE 0 END), 0),"
+                ' COALESCE(SUM("like"), 0), MIN(created_at) FROM posts'
+            )
+            total, notes, likes, first_post_at = rows[0]
+            _, rows = await conn.execute_query("SELECT COUNT(*) FROM comments")
+            comments = rows[0][0]
+            site_created_at = await MetaModel.all().order_by("created_at").limit(1)\
+                .values_list("created_at", flat=True)
+
+            values = [total - notes, notes, comments, likes, first_post_at,
+                      site_created_at[0] if site_created_at else None]
+            if is_postgres():
+                sql = ("INSERT INTO blog_stats (id, posts, notes, comments, likes, first_post_at, site_created_at)"
+                       " VALUES (1, $1, $2, $3, $4, $5, $6)")
+            else:
+                sql = ("INSERT INTO blog_stats (id, posts, notes, comments, likes, first_post_at, site_created_at)"
+                       " VALUES (1, ?, ?, ?, ?, ?, ?)")
+            await conn.execute_query(
+                sql + " ON CONFLICT (id) DO UPDATE SET posts = EXCLUDED.posts, notes = EXCLUDED.notes,"
+                " comments = EXCLUDED.comments, likes = EXCLUDED.likes,"
+                " first_post_at = EXCLUDED.first_post_at, site_created_at = EXCLUDED.site_created_at",
+                values,
+            )
+
+    async def get(self) -> dict:
+        """按主键读取统计"""
+        _, rows = await get_connection().execute_query(
+            "SELECT posts, notes, comments, likes, first_post_at, site_created_at FROM blog_stats WHERE id = 1"
+        )
+        if not rows:
+            await self.rebuild()
+            return await self.get()
+
+        posts, notes, comments, likes, first_post_at, site_created_at = rows[0]
+        if site_created_at is None and await MetaModel.all().exists():
+            # 全新数据库在初始化 meta 之前统计，建站时间在这里补上
+            await self.rebuild()
+            return await self.get()
+
+        return {
+            "posts": posts,
+            "notes": notes,
+            "comments": comments,
+            "likes": likes,
+            "first_post_at": _parse_time(first_post_at),
+            "site_created_at": _parse_time(site_created_at),
+        }
+
+
+blog_stats = BlogStats()
@@ -0,0 +1,90 @@
+# 搜索输入提示
+#
+# 每个 worker 在内存中维护一个按小写文本排序的数组，前缀查询用 bisect 定位，
+# 不访问数据库。posts 主题版本号变化后，下一次查询时才重新加载（惰性重建）。
+# 重建时同时保存公开文章 id -> 点赞数，点赞、阅读接口用它判断文章是否存在且公开，不必逐次查询。
+import asyncio
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from blog.models import PostModel
+from core.bus import invalidation_bus
+
+_TAG_SPLIT_RE = re.compile(r"[,，;；\s]+")
+
+
+class SuggestIndex:
+    """标题/标签/分类的前缀索引"""
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._entries: List[Dict] = []
+        # 公开文章 id -> 点赞数（重建时的值）
+        self._likes: Dict[int, int] = {}
+        self._generation = -1
+        self._lock = asyncio.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return self._generation != invalidation_bus.version("posts")
+
+    async def rebuild(self):
+        """从公开文章加载标题、标签、分类和点赞数"""
+        generation = invalidation_bus.version("posts")
+        rows = await PostModel.filter(is_locked=False).values_list("id", "title", "tag", "category", "like")
+
+        items: Dict[Tuple[str, str], Dict] = {}
+        likes: Dict[int, int] = {}
+        for post_id, title, tag, category, like in rows:
+            likes[post_id] = like or 0
+            if title:
+                items[("title", title)] = {"text": title, "type": "title", "id": post_id}
+            for name in _TAG_SPLIT_RE.split(tag or ""):
+                if name:
+                    items.setdefault(("tag", name), {"text": name, "type": "tag"})
+            if category:
+                items.setdefault(("category", category), {"text": category, "type": "category"})
+
+        pairs = sorted(
+            ((entry["text"].lower(), entry) for entry in items.values()),
+            key=lambda pair: (pair[0], pair[1]["type"])
+        )
+        self._keys = [key for key, _ in pairs]
+        self._entries = [entry for _, entry in pairs]
+        self._likes = likes
+        self._generation = generation
+
+    async def ensure(self):
+        """posts 主题有变化时重建"""
+        if self.stale:
+            async with self._lock:
+                if self.stale:
+                    await self.rebuild()
+
+    async def public_likes(self, post_id: int) -> Optional[int]:
+        """公开文章的点赞数（最近一次重建时的值），文章不存在或私密时返回 None"""
+        await self.ensure()
+        return self._likes.get(post_id)
+
+    async def is_public(self, post_id: int) -> bool:
+        await self.ensure()
+        return post_id in self._likes
+
+    async def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """返回以 prefix 开头（不区分大小写）的候选项"""
+        await self.ensure()
+
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        result = []
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and len(result) < limit and self._keys[i].startswith(prefix):
+            result.append(self._entries[i])
+            i += 1
+        return result
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,127 @@
+# worker 启动预热
+#
+# gunicorn 的 max_requests 让 worker 不断重启，新 worker 的进程内缓存是空的。
+# 启动后在后台把首页列表、Feed、归档、分类、热力图和前 N 篇文章详情请求一遍：
+# 请求直接在进程内走完整的 ASGI 应用（中间件、路由），响应缓存、Feed 缓存、
+# 旧响应兜底等都会像真实请求一样被填充；已有共享磁盘缓存时只是读取。
+# 并发数和总时间都有上限，超时后放弃剩余请求；/ready 在预热完成或超时之后才返回 200。
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from blog.models import PostModel
+from config import settings
+
+# 固定预热的接口（与前端首屏请求一致）
+WARMUP_PATHS = [
+    ("/api/posts/", b"page=1"),
+    ("/api/posts/categories", b""),
+    ("/api/posts/facets", b""),
+    ("/api/posts/archive/summary", b""),
+    ("/api/pages/", b""),
+    ("/api/meta", b""),
+    ("/api/heatmap/type-distribution", b"days=60"),
+    ("/api/rss.xml", b""),
+    ("/api/atom.xml", b""),
+    ("/api/feed.json", b""),
+]
+
+
+class WarmUp:
+    """预热任务与就绪状态"""
+
+    def __init__(self, timeout: float = 10, top_posts: int = 20, concurrency: int = 4):
+        self.timeout = timeout
+        self.top_posts = top_posts
+        self.concurrency = concurrency
+        self.ready = False
+        self.timed_out = False
+        self.results: Dict[str, int] = {}
+        self.elapsed: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _request(self, app, path: str, query_string: bytes) -> int:
+        """进程内发起一个 GET 请求，返回状态码（响应体丢弃）"""
+        status = 0
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("utf-8"),
+            "root_path": "",
+            "query_string": query_string,
+            "headers": [(b"host", b"localhost"), (b"user-agent", b"warmup")],
+            "client": ("127.0.0.1", 0),
+            "server": ("127.0.0.1", 0),
+        }
+        await app(scope, receive, send)
+        return status
+
+    async def _targets(self) -> List[tuple]:
+        ids = await PostModel.filter(is_locked=False).order_by("-is_top", "-created_at")\
+            .limit(self.top_posts).values_list("id", flat=True)
+        return WARMUP_PATHS + [(f"/api/posts/{post_id}", b"") for post_id in ids]
+
+    async def _run(self, app):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(path: str, query_string: bytes):
+            async with semaphore:
+                try:
+                    self.results[path] = await self._request(app, path, query_string)
+                except Exception as e:
+                    self.results[path] = 0
+                    print(f"预热 {path} 失败: {e}")
+
+        await asyncio.gather(*(fetch(path, query) for path, query in await self._targets()))
+
+    async def _run_with_timeout(self, app):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._run(app), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            print(f"预热超时（{self.timeout} 秒），已完成 {len(self.results)} 个请求")
+        except Exception as e:
+            print(f"预热失败: {e}")
+        finally:
+            self.elapsed = time.monotonic() - started
+            self.ready = True
+
+    def start(self, app):
+        """在后台开始预热（lifespan 中调用）"""
+        if self.timeout <= 0:
+            self.ready = True
+            return
+        self._task = asyncio.create_task(self._run_with_timeout(app))
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "timed_out": self.timed_out,
+            "elapsed": self.elapsed,
+            "warmed": len(self.results),
+        }
+
+
+warmup = WarmUp(timeout=settings.WARMUP_TIMEOUT, top_posts=settings.WARMUP_TOP_POSTS)
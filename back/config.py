@@ -27,6 +27,48 @@ class Settings(BaseSettings):
     # STATIC file
     STATIC_DIR: str
 
+    # 运行时数据目录（检索索引等，worker 之间共享），相对路径基于 back 目录
+    DATA_DIR: str = "data"
+
+    # 每个 worker 的进程池大小（索引重建、长文档渲染）
+    PROCESS_POOL_WORKERS: int = 1
+
+    # Markdown 渲染后端：auto / markdown-it / markdown
+    MARKDOWN_BACKEND: str = "auto"
+    # 超过该字符数的文档放到进程池中渲染
+    MARKDOWN_POOL_THRESHOLD: int = 100_000
+
+    # 公开接口响应缓存（每个 worker）：最大条目数、过期秒数
+    RESPONSE_CACHE_SIZE: int = 256
+    RESPONSE_CACHE_TTL: int = 60
+
+    # 共享磁盘缓存（DATA_DIR/cache.sqlite3）大小上限，单位 MB
+    DISK_CACHE_SIZE_MB: int = 256
+
+    # 公开接口静态化（DATA_DIR/public，由 nginx 直接返回）
+    STATIC_PUBLISH: bool = True
+    # 预生成的文章列表每页数量（与前端请求的 size 一致）
+    STATIC_LIST_SIZES: List[int] = [10, 15, 20]
+    # 文章修改、点赞后延迟多少秒在后台重新生成列表（期间的修改合并为一次）
+    STATIC_LIST_DELAY: float = 2
+    # 文章、页面修改后延迟多少秒在后台重写站点地图分片（期间的修改合并为一次）
+    SITEMAP_DELAY: float = 2
+
+    # worker 启动预热：最长秒数（0 为不预热）、预热的文章详情数
+    WARMUP_TIMEOUT: float = 10
+    WARMUP_TOP_POSTS: int = 20
+
+    # 点赞数批量写入数据库的间隔秒数；同一访客重复点赞的判定时间（秒）
+    LIKE_FLUSH_INTERVAL: float = 5
+    LIKE_DEDUPE_TTL: int = 86400
+
+    # 阅读事件缓冲区容量（每个 worker，满了丢弃最旧的事件）、批量写入数据库的间隔秒数
+    VIEW_BUFFER_SIZE: int = 10000
+    VIEW_FLUSH_INTERVAL: float = 10
+
+    # worker 启动时执行数据库迁移（关闭后需在部署时运行 python manage.py migrate）
+    MIGRATE_ON_STARTUP: bool = True
+
     # 数据库连接URL
     DATABASE_URL: str = "sqlite://./db.sqlite3"
 
@@ -5,6 +5,7 @@ from datetime import datetime
 import secrets
 
 from core.meta import MetaModel
+from core.bus import invalidation_bus
 from core.security import pwd_condes ,api_key_auth # 请替换为您的实际密码工具模块
 
 router = APIRouter(prefix="/meta", tags=["Meta"])
@@ -31,7 +32,6 @@ class MetaResponse(BaseModel):
     nickname: Optional[str] = None
     des: Optional[str] = None
     avatar: Optional[str] = None
-    last_login: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -52,6 +52,12 @@ class APIKeyResponse(BaseModel):
     success: bool
     api_key: str
 
+async def publish_meta():
+    """meta 变更：发布失效主题并更新静态 JSON"""
+    from blog.publish import static_publisher
+    await invalidation_bus.publish("meta")
+    await static_publisher.publish_meta()
+
 # 生成安全的 API Key
 def generate_api_key():
     return secrets.token_urlsafe(32)
@@ -84,6 +90,7 @@ async def update_website_meta(
     
     # 智能更新 - 只更新提供的字段
     await MetaModel.filter(id=current_meta.id).update(**update_dict)
+    await publish_meta()
     
     # 获取更新后的数据
     updated_meta = await MetaModel.get(id=current_meta.id)
@@ -114,6 +121,7 @@ async def login(login_data: LoginRequest, request: Request):
         last_login=datetime.now(),
         ip=client_ip
     )
+    # 最后登录时间只在登录响应中返回，公开的 meta 不变，不需要重新生成
     
     # 重新获取更新后的数据
     updated_meta = await MetaModel.get(id=meta.id)
@@ -0,0 +1,212 @@
+# 跨 worker 缓存失效总线（不依赖 redis）
+#
+# 数据变更时按主题发布，例如 post:{id}、posts、feed、archive、meta、pages、activity。
+# - 同一台机器：DATA_DIR 下的 mmap 版本号表，每个主题按哈希映射到一个槽位
+#   （计数器 + 最后修改时间），发布时在文件锁内自增；读取只是内存访问，可以在每个请求中轮询。
+#   槽位冲突只会造成多余的失效，不会漏掉。
+# - 多台机器（PostgreSQL）：发布时同时 NOTIFY，各 worker 用单独的 asyncpg 连接 LISTEN，
+#   收到其它机器的通知后自增本机版本号表，本机其它 worker 通过轮询即可看到。
+#   监听连接由后台任务维护：连接断开（终止回调）或定期检查失败时重新连接，
+#   重新连接后断开期间的通知可能已经错过，本机全部主题失效一次。
+#
+# 文件布局：epoch（文件创建时随机生成）| 槽位数 | 槽位 * (计数器, 时间戳)
+# epoch 保证数据目录被清空重建后，新旧版本号不会被当成同一个（ETag 不会误判）。
+import asyncio
+import fcntl
+import mmap
+import os
+import secrets
+import struct
+import time
+import zlib
+from typing import Iterable, Optional
+
+from core.utils import data_path
+
+_HEADER = struct.Struct("<QQ")
+_SLOT = struct.Struct("<Qd")
+
+NOTIFY_CHANNEL = "blog_invalidate"
+# 发布全部主题（数据导入等）
+ALL_TOPICS = "*"
+# 监听连接的检查间隔、最长重连间隔（秒）
+LISTEN_CHECK_INTERVAL = 30
+LISTEN_RETRY_MAX = 60
+
+
+class InvalidationBus:
+    """按主题的版本号表 + PostgreSQL LISTEN/NOTIFY"""
+
+    def __init__(self, name: str = "topics", slots: int = 1024):
+        self.name = name
+        self.slots = slots
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._listener = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    # ---------- 本机版本号表 ----------
+
+    def _map(self) -> mmap.mmap:
+        if self._mm is None:
+            size = _HEADER.size + _SLOT.size * self.slots
+            fd = os.open(data_path(f"{self.name}.gen"), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                    now = time.time()
+                    os.pwrite(
+                        fd,
+                        _HEADER.pack(secrets.randbits(63) | 1, self.slots) + _SLOT.pack(0, now) * self.slots,
+                        0,
+                    )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._fd = fd
+            self._mm = mmap.mmap(fd, size)
+        return self._mm
+
+    def _slot(self, topic: str) -> int:
+        return zlib.crc32(topic.encode("utf-8")) % self.slots
+
+    def _offset(self, slot: int) -> int:
+        return _HEADER.size + _SLOT.size * slot
+
+    @property
+    def epoch(self) -> int:
+        return _HEADER.unpack_from(self._map(), 0)[0]
+
+    def version(self, topic: str) -> int:
+        """主题当前版本号"""
+        return _SLOT.unpack_from(self._map(), self._offset(self._slot(topic)))[0]
+
+    def versions(self, topics: Iterable[str]) -> tuple:
+        mm = self._map()
+        return tuple(_SLOT.unpack_from(mm, self._offset(self._slot(topic)))[0] for topic in topics)
+
+    def modified_at(self, *topics: str) -> float:
+        """主题最后一次变更的时间戳（多个主题取最晚的）"""
+        mm = self._map()
+        return max(_SLOT.unpack_from(mm, self._offset(self._slot(topic)))[1] for topic in topics)
+
+    def token(self, *topics: str) -> str:
+        """包含 epoch 的版本标识，可直接用作 ETag 的一部分"""
+        return f"{self.epoch:x}-" + ".".join(str(v) for v in self.versions(topics))
+
+    def _bump(self, slots: Iterable[int]):
+        mm = self._map()
+        now = time.time()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            for slot in set(slots):
+                offset = self._offset(slot)
+                value, _ = _SLOT.unpack_from(mm, offset)
+                _SLOT.pack_into(mm, offset, value + 1, now)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _bump_topics(self, topics: Iterable[str]):
+        if ALL_TOPICS in topics:
+            self._bump(range(self.slots))
+        else:
+            self._bump(self._slot(topic) for topic in topics)
+
+    # ---------- 发布 / 订阅 ----------
+
+    async def publish(self, *topics: str):
+        """发布变更：本机立即生效，PostgreSQL 下同时通知其它机器"""
+        self._bump_topics(topics)
+        from core.db import get_connection, is_postgres
+        try:
+            if is_postgres():
+                await get_connection().execute_query(
+                    "SELECT pg_notify($1, $2)",
+                    [NOTIFY_CHANNEL, f"{self.epoch:x}|" + ",".join(topics)],
+                )
+        except Exception as e:
+            print(f"发送失效通知失败: {e}")
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        epoch, _, topics = payload.partition("|")
+        # 本机发布的变更已经写入版本号表
+        if epoch == f"{self.epoch:x}":
+            return
+        self._bump_topics(topics.split(","))
+
+    async def start(self):
+        """PostgreSQL 下开始监听其它机器的变更通知（后台保持连接）"""
+        from core.db import is_postgres
+        if not is_postgres() or self._watcher is not None:
+            return
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def _connect(self):
+        """建立监听连接，返回 (连接, 连接断开时设置的事件)"""
+        import asyncpg
+        from core.db import get_tortoise_config
+        credentials = get_tortoise_config()["connections"]["default"]["credentials"]
+        conn = await asyncpg.connect(
+            host=credentials["host"],
+            port=credentials["port"],
+            user=credentials["user"],
+            password=credentials["password"],
+            database=credentials["database"],
+        )
+        lost = asyncio.Event()
+        conn.add_termination_listener(lambda _: lost.set())
+        await conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        return conn, lost
+
+    async def _alive(self) -> bool:
+        try:
+            await asyncio.wait_for(self._listener.fetchval("SELECT 1"), timeout=10)
+            return True
+        except Exception:
+            return False
+
+    async def _watch(self):
+        delay = 1
+        connected = False
+        while True:
+            try:
+                self._listener, lost = await self._connect()
+            except Exception as e:
+                print(f"监听失效通知失败: {e}，{delay} 秒后重试")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LISTEN_RETRY_MAX)
+                continue
+            if connected:
+                # 断开期间可能错过了其它机器的通知
+                self._bump_topics((ALL_TOPICS,))
+                print("失效通知监听已重新连接")
+            connected = True
+            delay = 1
+
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), timeout=LISTEN_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    if not await self._alive():
+                        break
+            print("失效通知监听连接已断开，重新连接")
+            self._listener.terminate()
+            self._listener = None
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        if self._listener is not None:
+            try:
+                await asyncio.wait_for(self._listener.close(), timeout=5)
+            except Exception:
+                self._listener.terminate()
+            self._listener = None
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,174 @@
+# 公开接口响应缓存
+#
+# 每个 worker 一份内存缓存（LRU + TTL），按 路径 + 查询字符串 保存序列化后的响应体。
+# 每个路径依赖若干失效主题（core.bus），缓存项记录写入时这些主题的版本号，
+# 任一 worker 发布相关主题后，所有 worker 上依赖它的缓存项在下一次读取时即失效，其余缓存不受影响。
+# TTL 只兜底不经过失效总线的变化（如天数统计随时间变化）。
+# 内存未命中时再查共享的磁盘缓存（core.diskcache），新启动的 worker 不必从空缓存开始。
+# 路径可以带参数（/api/posts/{id:int}），主题中的同名参数用请求路径中的值替换（post:{id}），
+# 单篇文章的缓存只随该文章的主题失效。
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+from core.bus import InvalidationBus, invalidation_bus
+from core.diskcache import DiskCache, disk_cache
+
+# (状态码, 响应头, 响应体)
+CachedResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+# 这些响应头每次请求重新生成，不缓存
+_SKIP_HEADERS = {b"content-length", b"date", b"server", b"set-cookie"}
+
+_PARAM_RE = re.compile(r"\{(\w+)(:int)?\}")
+
+
+def _compile(template: str) -> re.Pattern:
+    """/api/posts/{id:int} -> ^/api/posts/(?P<id>\\d+)$"""
+    pattern, last = "", 0
+    for match in _PARAM_RE.finditer(template):
+        pattern += re.escape(template[last:match.start()])
+        pattern += f"(?P<{match.group(1)}>" + ("\\d+" if match.group(2) else "[^/]+") + ")"
+        last = match.end()
+    return re.compile("^" + pattern + re.escape(template[last:]) + "$")
+
+
+def _pack(value: CachedResponse) -> bytes:
+    status, headers, body = value
+    meta = json.dumps([status, [[name.decode("latin-1"), v.decode("latin-1")] for name, v in headers]])
+    return meta.encode("latin-1") + b"\n" + body
+
+
+def _unpack(data: bytes) -> CachedResponse:
+    meta, _, body = data.partition(b"\n")
+    status, headers = json.loads(meta)
+    return status, [(name.encode("latin-1"), v.encode("latin-1")) for name, v in headers], body
+
+
+class ResponseCache:
+    """LRU + TTL 缓存，缓存项随依赖主题的版本号失效"""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float = 60,
+        bus: InvalidationBus = invalidation_bus,
+        disk: Optional[DiskCache] = disk_cache,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.bus = bus
+        self.disk = disk
+        self._entries: "OrderedDict[str, Tuple[float, tuple, CachedResponse]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_version(self, versions: tuple) -> str:
+        return f"{self.bus.epoch:x}-" + ".".join(map(str, versions))
+
+    def get(self, key: str, topics: Sequence[str]) -> Optional[CachedResponse]:
+        versions = self.bus.versions(topics)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] >= time.monotonic() and entry[1] == versions:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+        if entry is not None:
+            del self._entries[key]
+
+        if self.disk is not None:
+            data = self.disk.get(f"response:{key}", self._disk_version(versions))
+            if data is not None:
+                value = _unpack(data)
+                self._store(key, value, versions)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: CachedResponse, versions: tuple):
+        """versions 为开始生成响应时的主题版本号，生成期间有变更时缓存项会在下次读取时失效"""
+        self._store(key, value, versions)
+        if self.disk is not None:
+            self.disk.set(f"response:{key}", _pack(value), self._disk_version(versions), ttl=self.ttl)
+
+    def _store(self, key: str, value: CachedResponse, versions: tuple):
+        self._entries[key] = (time.monotonic() + self.ttl, versions, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI 中间件：缓存指定路径的 GET 请求的 200 响应
+    命中时直接返回缓存的响应体，不进入路由和数据库
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: Dict[str, Sequence[str]]):
+        self.app = app
+        self.cache = cache
+        # 路径 -> 依赖的失效主题；带参数的路径按顺序匹配
+        self.paths = {path: tuple(topics) for path, topics in paths.items() if "{" not in path}
+        self.patterns = [(_compile(path), tuple(topics)) for path, topics in paths.items() if "{" in path]
+
+    def _topics(self, path: str) -> Optional[Tuple[str, ...]]:
+        topics = self.paths.get(path)
+        if topics is not None:
+            return topics
+        for pattern, templates in self.patterns:
+            match = pattern.match(path)
+            if match:
+                return tuple(topic.format(**match.groupdict()) for topic in templates)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        topics = self._topics(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if topics is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = scope["path"] + "?" + "&".join(sorted(scope["query_string"].decode("latin-1").split("&")))
+        cached = self.cache.get(key, topics)
+        if cached is not None:
+            status, headers, body = cached
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": headers + [(b"content-length", str(len(body)).encode()), (b"x-cache", b"HIT")],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        versions = self.cache.bus.versions(topics)
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-cache", b"MISS")]
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and start["status"] == 200:
+                    headers = [
+                        (name, value) for name, value in start.get("headers", [])
+                        if name.lower() not in _SKIP_HEADERS
+                    ]
+                    self.cache.set(key, (200, headers, b"".join(chunks)), versions)
+            await send(message)
+
+        await self.app(scope, receive, capture)
+
+
+# 公开 GET 接口的响应缓存（每个 worker 一份）
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
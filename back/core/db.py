@@ -1,6 +1,6 @@
 # core/db.py
 import os
-from tortoise import Tortoise
+from tortoise import Tortoise, connections
 from core.security import hash_password
 from config import settings
 from core.meta import MetaModel
@@ -65,6 +65,14 @@ def auto_load_modules():
         ]
     }
 
+def get_connection(name: str = "default"):
+    """获取底层数据库连接，用于执行原生 SQL"""
+    return connections.get(name)
+
+def is_postgres(name: str = "default") -> bool:
+    """当前连接是否为 PostgreSQL（否则为 sqlite）"""
+    return get_connection(name).capabilities.dialect == "postgres"
+
 async def init_db():
     """
     初始化数据库连接 - 使用事务确保只初始化一次
@@ -74,24 +82,49 @@ async def init_db():
     tortoise_config = get_tortoise_config()
     await Tortoise.init(config=tortoise_config)
 
-    # 生成数据库表结构（这个可以安全多次执行）
-    await Tortoise.generate_schemas()
-
-    # 使用数据库事务确保数据初始化只执行一次
-    try:
-        async with in_transaction("default"):
-            # 检查是否已有数据
-            existing_meta = await MetaModel.all().first()
-
-            if existing_meta:
-                return
-
-            await meta_data()
-            await preset_blogdata()
-
-    except Exception as e:
-        # 如果发生异常（如其他worker已经完成初始化），静默处理
-        print(f"数据初始化可能已被其他进程完成: {e}")
+    # 数据库迁移（加锁，只有一个进程执行；关闭时只检查，由 manage.py migrate 在部署时执行）
+    from core.migrate import migrate, pending_migrations, startup_lock
+    if settings.MIGRATE_ON_STARTUP:
+        await migrate()
+    else:
+        pending = await pending_migrations()
+        if pending:
+            # 下面的回填依赖迁移创建的表，不能继续启动
+            raise RuntimeError(
+                f"有 {len(pending)} 个数据库迁移未执行（{', '.join(f'{m.version:04d}_{m.name}' for m in pending)}），"
+                "请先运行 python manage.py migrate"
+            )
+
+    from blog.activity import activity_store
+    from blog.publish import static_publisher
+    from blog.render import backfill_renders
+    from blog.search import search_index
+    from blog.sitemap import sitemap_store
+    from blog.stats import blog_stats
+
+    # 一次性回填与迁移使用同一把锁，只有一个 worker 执行
+    async with startup_lock():
+        # 初始数据（站点信息、预置页面）最先写入，下面的派生数据和静态文件要包含它们
+        try:
+            async with in_transaction("default"):
+                if not await MetaModel.all().exists():
+                    await meta_data()
+                    await preset_blogdata()
+        except Exception as e:
+            print(f"写入初始数据失败: {e}")
+
+        # 补齐文章/页面派生内容（纯文本、HTML 等）
+        await backfill_renders()
+        # 全文检索索引为空时回填
+        await search_index.setup()
+        # 每日活跃度汇总为空时回填
+        await activity_store.setup()
+        # 博客统计计数不存在时全量统计
+        await blog_stats.setup()
+        # 站点地图缺少分片时生成（之后随内容变更增量更新）
+        await sitemap_store.ensure()
+        # 公开接口静态 JSON 缺少的文件逐项生成
+        await static_publisher.ensure()
 
 
 
@@ -0,0 +1,176 @@
+# 磁盘缓存（所有 worker 共享）
+#
+# gunicorn 的 max_requests 会让 worker 不断重启，进程内缓存每次都从空开始。
+# 这里用 DATA_DIR 下的一个 SQLite 文件保存渲染结果、Feed 文档、接口响应等，
+# 新启动的 worker 直接读取已有结果。
+# - 每条记录带版本标识（失效主题的 token 等），版本不一致视为未命中
+# - 写入是单条 INSERT OR REPLACE 事务，读取方不会看到写了一半的值
+# - 总大小超过上限时按最近访问时间淘汰（LRU），访问时间按 ACCESS_RESOLUTION 秒粗粒度更新，
+#   避免每次读取都产生写操作
+# - 读写直接在事件循环中执行，等待锁的时间限制在 BUSY_TIMEOUT_MS 毫秒内：
+#   其它 worker 正在写入时，读取视为未命中、写入直接跳过（缓存值可以重新计算），不会阻塞整个 worker
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional, Set
+
+from config import settings
+from core.utils import data_path
+
+ACCESS_RESOLUTION = 60
+# 每写入多少次检查一次总大小
+EVICT_CHECK_INTERVAL = 32
+# 淘汰到上限的比例
+EVICT_TARGET = 0.9
+# 读写等待锁的最长时间（建表等初始化仍使用 5 秒）
+BUSY_TIMEOUT_MS = 20
+
+
+def _is_busy(e: sqlite3.Error) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e))
+
+
+class DiskCache:
+    """SQLite 键值缓存，按大小上限 LRU 淘汰"""
+
+    def __init__(self, name: str = "cache.sqlite3", max_bytes: int = 256 * 1024 * 1024):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        # 因锁竞争未命中 / 跳过的次数
+        self.contended = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # preload_app 下主进程可能已经打开过连接，fork 之后不能继续使用
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(data_path(self.name)), timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, version TEXT NOT NULL, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, expires REAL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str, version: str = "") -> Optional[bytes]:
+        """读取缓存值，不存在、版本不一致或已过期时返回 None"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT version, value, expires, accessed FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[0] != version or (row[2] is not None and row[2] < now):
+                    return None
+                if now - row[3] > ACCESS_RESOLUTION:
+                    try:
+                        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                    except sqlite3.Error as e:
+                        # 访问时间只影响淘汰顺序，更新不了下次再更新
+                        if not _is_busy(e):
+                            raise
+                return row[1]
+        except sqlite3.Error as e:
+            if _is_busy(e):
+                self.contended += 1
+            else:
+                print(f"读取磁盘缓存失败: {e}")
+            return None
+
+    def set(self, key: str, value: bytes, version: str = "", ttl: Optional[float] = None):
+        """写入缓存值（覆盖同 key 的旧值）"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, version, value, size, expires, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, version, value, len(key) + len(value), now + ttl if ttl else None, now),
+                )
+                self._writes += 1
+                if self._writes % EVICT_CHECK_INTERVAL == 0:
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            if _is_busy(e):
+                self.contended += 1
+            else:
+                print(f"写入磁盘缓存失败: {e}")
+
+    def claim(self, keys: Iterable[str], ttl: float, timeout: float = 5) -> Optional[Set[str]]:
+        """
+        在一个事务中写入尚不存在（或已过期）的标记，返回本次写入成功的 key（其它 worker 已写入的不在其中）
+        使用单独的连接、最多等待 timeout 秒，会阻塞调用线程，只在后台任务中通过 asyncio.to_thread 调用；
+        等待超时等错误时返回 None，由调用方稍后重试
+        """
+        keys = list(keys)
+        with self._lock:
+            # 确保表已经创建
+            self._connect()
+        now = time.time()
+        claimed = set()
+        conn = None
+        try:
+            conn = sqlite3.connect(str(data_path(self.name)), timeout=timeout, isolation_level=None)
+            conn.execute("BEGIN IMMEDIATE")
+            for key in keys:
+                conn.execute("DELETE FROM entries WHERE key = ? AND expires IS NOT NULL AND expires < ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO entries (key, version, value, size, expires, accessed) "
+                    "VALUES (?, '', x'31', ?, ?, ?)",
+                    (key, len(key) + 1, now + ttl, now),
+                )
+                if cursor.rowcount:
+                    claimed.add(key)
+            conn.execute("COMMIT")
+            return claimed
+        except sqlite3.Error as e:
+            print(f"写入磁盘缓存标记失败: {e}")
+            return None
+        finally:
+            # 未提交的事务在关闭连接时回滚
+            if conn is not None:
+                conn.close()
+
+    def delete(self, key: str):
+        try:
+            with self._lock:
+                self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"删除磁盘缓存失败: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """删除过期记录，总大小仍超过上限时从最久未访问的开始删除"""
+        conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TARGET)
+        freed = 0
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+# 全局磁盘缓存
+disk_cache = DiskCache(max_bytes=settings.DISK_CACHE_SIZE_MB * 1024 * 1024)
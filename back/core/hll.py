@@ -0,0 +1,77 @@
+# HyperLogLog 基数估计
+#
+# 2^11 = 2048 个寄存器，每个 6 位，序列化后固定 1536 字节；标准误差约 1.04 / sqrt(2048) ≈ 2.3%。
+# 输入为 64 位哈希值：高 11 位选择寄存器，其余 53 位前导零个数 + 1 作为寄存器的候选值。
+# 两个草图合并是逐个寄存器取最大值，与合并顺序、重复合并无关，可以在 worker 之间随意合并。
+import hashlib
+import math
+from typing import Optional
+
+P = 11
+M = 1 << P
+SKETCH_BYTES = M * 6 // 8
+_REST_BITS = 64 - P
+_REST_MASK = (1 << _REST_BITS) - 1
+_ALPHA = 0.7213 / (1 + 1.079 / M)
+# 2^-r
+_POW = [2.0 ** -r for r in range(64)]
+
+
+def hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog 草图"""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(M)
+
+    def add_hash(self, value: int):
+        """加入一个 64 位哈希值"""
+        index = value >> _REST_BITS
+        rank = _REST_BITS - (value & _REST_MASK).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, item: bytes):
+        self.add_hash(hash64(item))
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """估计不同元素的个数"""
+        registers = self.registers
+        estimate = _ALPHA * M * M / sum(_POW[r] for r in registers)
+        zeros = registers.count(0)
+        # 小基数时用线性计数修正
+        if zeros and estimate <= 2.5 * M:
+            estimate = M * math.log(M / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """4 个 6 位寄存器打包为 3 个字节"""
+        registers = self.registers
+        out = bytearray(SKETCH_BYTES)
+        for i in range(0, M, 4):
+            packed = registers[i] << 18 | registers[i + 1] << 12 | registers[i + 2] << 6 | registers[i + 3]
+            j = i // 4 * 3
+            out[j:j + 3] = packed.to_bytes(3, "big")
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        if len(data) != SKETCH_BYTES:
+            raise ValueError(f"草图长度应为 {SKETCH_BYTES} 字节")
+        registers = bytearray(M)
+        for j in range(0, SKETCH_BYTES, 3):
+            packed = int.from_bytes(data[j:j + 3], "big")
+            i = j // 3 * 4
+            registers[i] = packed >> 18
+            registers[i + 1] = packed >> 12 & 0x3F
+            registers[i + 2] = packed >> 6 & 0x3F
+            registers[i + 3] = packed & 0x3F
+        return cls(registers)
@@ -0,0 +1,49 @@
+# HTTP 条件请求工具（ETag / Last-Modified / 304）
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def http_date(timestamp: float) -> str:
+    """时间戳转换为 HTTP 日期格式"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified(request: Request, etag: Optional[str], last_modified: Optional[float]) -> bool:
+    """
+    判断客户端缓存是否仍然有效
+    有 If-None-Match 时只比较 ETag，否则比较 If-Modified-Since（精确到秒）
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # 弱比较：忽略 W/ 前缀
+        return "*" in candidates or etag.removeprefix("W/") in [c.removeprefix("W/") for c in candidates]
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+
+    return False
+
+
+def validator_headers(etag: Optional[str], last_modified: Optional[float], cache_control: Optional[str] = None) -> dict:
+    """组装缓存相关响应头（Cache-Control 一般由 core.policy 按路由统一设置）"""
+    headers = {"Cache-Control": cache_control} if cache_control else {}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    """304 响应（不带响应体，保留校验头）"""
+    return Response(status_code=304, headers=headers)
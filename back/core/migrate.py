@@ -0,0 +1,225 @@
+# 数据库迁移
+#
+# 表结构和索引按版本号顺序迁移，已执行的版本记录在 schema_migrations 表中。
+# 第 1 个版本用模型生成全部表（已存在的表跳过，兼容迁移之前建好的库），之后的版本是原生 SQL，
+# 按数据库类型（sqlite / postgres）分别给出。
+#
+# 执行时先取得 DATA_DIR/locks/migrate.lock 文件锁（同一台机器的 worker 之间互斥），
+# PostgreSQL 上再在事务内取得 advisory lock（多台机器之间互斥），迁移在同一个事务中完成。
+# 只有第一个拿到锁的进程会真正执行，其它进程拿到锁后发现没有待执行的版本直接返回。
+#
+# 新增迁移：在 MIGRATIONS 末尾追加，版本号递增，已发布的版本不要修改。
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from tortoise.transactions import in_transaction
+from tortoise.utils import generate_schema_for_client
+
+from core.db import get_connection, is_postgres
+from core.utils import data_path
+
+# PostgreSQL advisory lock 的键（任意固定值）
+MIGRATE_LOCK_KEY = 0x626C6F67
+
+MIGRATIONS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    " version INT PRIMARY KEY,"
+    " name VARCHAR(128) NOT NULL,"
+    " applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sqlite: Tuple[str, ...] = ()
+    postgres: Tuple[str, ...] = ()
+    # 在 SQL 之前执行的函数，参数为数据库连接
+    run: Optional[Callable[..., Awaitable[None]]] = None
+
+
+async def _create_models(conn):
+    """按模型建表（已存在的跳过）"""
+    await generate_schema_for_client(conn, safe=True)
+
+
+# 文章列表、分类/标签筛选、归档和热力图、评论列表的索引
+# 列表按 (is_top, created_at, id) 倒序排列，索引包含排序列，分页时不需要额外排序
+_LIST_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_posts_list ON posts (is_locked, is_top, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_category ON posts (category, is_locked, is_top, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_tag ON posts (tag, is_locked, is_top, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_archive ON posts (is_locked, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_created ON posts (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_comments_post ON comments (post_id, is_approved, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_comments_approved ON comments (is_approved, created_at)",
+)
+
+# 每日活跃度汇总（blog/activity.py），日期为 YYYY-MM-DD
+_DAILY_ACTIVITY = (
+    "CREATE TABLE IF NOT EXISTS daily_activity ("
+    " date VARCHAR(10) PRIMARY KEY,"
+    " posts INT NOT NULL DEFAULT 0,"
+    " notes INT NOT NULL DEFAULT 0,"
+    " comments INT NOT NULL DEFAULT 0,"
+    " heat REAL NOT NULL DEFAULT 0)",
+)
+
+# 博客统计计数（blog/stats.py），只有 id = 1 一行
+_BLOG_STATS = (
+    "CREATE TABLE IF NOT EXISTS blog_stats ("
+    " id INT PRIMARY KEY,"
+    " posts INT NOT NULL DEFAULT 0,"
+    " notes INT NOT NULL DEFAULT 0,"
+    " comments INT NOT NULL DEFAULT 0,"
+    " likes BIGINT NOT NULL DEFAULT 0,"
+    " first_post_at {timestamp} NULL,"
+    " site_created_at {timestamp} NULL)"
+)
+
+# 文章每小时阅读量（blog/pageviews.py），hour 为 UTC 时间戳 // 3600
+_POST_VIEWS_HOURLY = (
+    "CREATE TABLE IF NOT EXISTS post_views_hourly ("
+    " post_id INT NOT NULL REFERENCES posts(id) ON DELETE CASCADE,"
+    " hour INT NOT NULL,"
+    " views INT NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (post_id, hour))",
+    "CREATE INDEX IF NOT EXISTS idx_post_views_hour ON post_views_hourly (hour, post_id, views)",
+)
+
+# 独立访客的 HyperLogLog 草图：bucket 为 UTC 日期（YYYY-MM-DD）或 all（全部时间），
+# post_id 为 0 表示全站。没有外键（全站行），文章删除时由 hooks.post_deleted 清理
+_READER_SKETCHES = (
+    "CREATE TABLE IF NOT EXISTS reader_sketches ("
+    " post_id INT NOT NULL,"
+    " bucket VARCHAR(10) NOT NULL,"
+    " sketch {blob} NOT NULL,"
+    " PRIMARY KEY (post_id, bucket))",
+)
+
+# 全文检索索引（blog/search.py），之前由 SearchIndex.setup 在启动时创建，已存在时跳过
+_SEARCH_SQLITE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, body, tokenize='unicode61')",
+)
+_SEARCH_POSTGRES = (
+    "CREATE TABLE IF NOT EXISTS posts_search ("
+    " post_id INT PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,"
+    " tsv TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS posts_search_tsv_idx ON posts_search USING GIN (tsv)",
+)
+
+# 代码块改回由前端 highlight.js 高亮（不再用 pygments 内联样式），清空已保存的渲染结果，
+# 启动时由 backfill_renders 按当前选项重新生成
+_RERENDER = (
+    "DELETE FROM post_renders",
+    "DELETE FROM page_renders",
+)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial", run=_create_models),
+    Migration(2, "list_and_comment_indexes", sqlite=_LIST_INDEXES, postgres=_LIST_INDEXES),
+    Migration(3, "daily_activity", sqlite=_DAILY_ACTIVITY, postgres=_DAILY_ACTIVITY),
+    Migration(
+        4, "blog_stats",
+        sqlite=(_BLOG_STATS.format(timestamp="TIMESTAMP"),),
+        postgres=(_BLOG_STATS.format(timestamp="TIMESTAMPTZ"),),
+    ),
+    Migration(5, "post_views_hourly", sqlite=_POST_VIEWS_HOURLY, postgres=_POST_VIEWS_HOURLY),
+    Migration(
+        6, "reader_sketches",
+        sqlite=tuple(sql.format(blob="BLOB") for sql in _READER_SKETCHES),
+        postgres=tuple(sql.format(blob="BYTEA") for sql in _READER_SKETCHES),
+    ),
+    Migration(7, "search_index", sqlite=_SEARCH_SQLITE, postgres=_SEARCH_POSTGRES),
+    Migration(8, "rerender_without_pygments", sqlite=_RERENDER, postgres=_RERENDER),
+]
+
+
+@asynccontextmanager
+async def _file_lock():
+    """同一台机器上的迁移锁（非阻塞轮询，不阻塞事件循环）"""
+    fd = os.open(data_path("locks", "migrate.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(0.05)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+@asynccontextmanager
+async def _locked_connection():
+    """取得迁移锁后返回执行迁移使用的连接"""
+    async with _file_lock():
+        if is_postgres():
+            # 事务结束时自动释放 advisory lock，DDL 随事务一起提交或回滚
+            async with in_transaction() as conn:
+                await conn.execute_query("SELECT pg_advisory_xact_lock($1)", [MIGRATE_LOCK_KEY])
+                await conn.execute_script(MIGRATIONS_TABLE)
+                yield conn
+        else:
+            # sqlite 的 executescript 会提交当前事务，这里不包事务，由文件锁保证只执行一次
+            conn = get_connection()
+            await conn.execute_script(MIGRATIONS_TABLE)
+            yield conn
+
+
+@asynccontextmanager
+async def startup_lock():
+    """
+    worker 启动时的一次性工作（派生数据回填等）使用与迁移相同的锁，只有一个进程执行，
+    其它进程等它完成后发现已经回填过直接跳过。PostgreSQL 上这些工作在持有 advisory lock 的事务中执行
+    """
+    async with _locked_connection():
+        yield
+
+
+async def _applied_versions(conn) -> List[int]:
+    _, rows = await conn.execute_query("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in rows]
+
+
+async def pending_migrations() -> List[Migration]:
+    """尚未执行的迁移"""
+    conn = get_connection()
+    await conn.execute_script(MIGRATIONS_TABLE)
+    applied = set(await _applied_versions(conn))
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+async def migration_status() -> List[Tuple[int, str, bool]]:
+    """(版本号, 名称, 是否已执行)"""
+    pending = {migration.version for migration in await pending_migrations()}
+    return [(migration.version, migration.name, migration.version not in pending) for migration in MIGRATIONS]
+
+
+async def migrate() -> List[Migration]:
+    """执行全部未执行的迁移，返回本次执行的迁移"""
+    async with _locked_connection() as conn:
+        applied = set(await _applied_versions(conn))
+        pending = [migration for migration in MIGRATIONS if migration.version not in applied]
+        postgres = is_postgres()
+
+        for migration in pending:
+            if migration.run is not None:
+                await migration.run(conn)
+            for statement in (migration.postgres if postgres else migration.sqlite):
+                await conn.execute_script(statement)
+            await conn.execute_query(
+                "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)" if postgres
+                else "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                [migration.version, migration.name],
+            )
+            print(f"数据库迁移 {migration.version:04d}_{migration.name} 已执行")
+
+        return pending
@@ -0,0 +1,163 @@
+# 按路由声明的 HTTP 缓存策略
+#
+# 每个公开路由在一处声明 Cache-Control（max-age、s-maxage、stale-while-revalidate、
+# stale-if-error）和 Vary，由中间件统一写入响应头，路由函数不再各自设置。
+#
+# 声明了 stale_if_error 的路由，中间件会把最近一次成功的响应体保存到共享磁盘缓存：
+# 数据库故障导致接口返回 5xx / 抛出异常，或者超过 timeout 秒还没有返回时，
+# 在 stale_if_error 秒内直接返回保存的响应（X-Cache: STALE），而不是 500。
+import asyncio
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from core.diskcache import DiskCache, disk_cache
+
+_PARAM_RE = re.compile(r"\{[^}]+\}")
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    max_age: int = 0
+    s_maxage: Optional[int] = None
+    stale_while_revalidate: Optional[int] = None
+    stale_if_error: Optional[int] = None
+    vary: Tuple[str, ...] = ()
+    # 超过该秒数未返回且有可用的旧响应时，直接返回旧响应
+    timeout: Optional[float] = None
+
+    @property
+    def cache_control(self) -> str:
+        parts = ["public", f"max-age={self.max_age}"]
+        if self.s_maxage is not None:
+            parts.append(f"s-maxage={self.s_maxage}")
+        if self.stale_while_revalidate is not None:
+            parts.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        if self.stale_if_error is not None:
+            parts.append(f"stale-if-error={self.stale_if_error}")
+        return ", ".join(parts)
+
+
+def _compile(template: str) -> re.Pattern:
+    """/api/pages/{title} -> ^/api/pages/[^/]+$，{id:int} 只匹配数字"""
+    parts = _PARAM_RE.split(template)
+    params = ["\\d+" if param.endswith(":int}") else "[^/]+" for param in _PARAM_RE.findall(template)]
+    pattern = re.escape(parts[0]) + "".join(param + re.escape(part) for param, part in zip(params, parts[1:]))
+    return re.compile("^" + pattern + "$")
+
+
+class CachePolicyMiddleware:
+    """ASGI 中间件：写入缓存策略响应头，必要时返回旧响应"""
+
+    def __init__(self, app, policies: Dict[str, CachePolicy], store: DiskCache = disk_cache):
+        self.app = app
+        self.store = store
+        self.exact = {path: policy for path, policy in policies.items() if "{" not in path}
+        self.patterns = [(_compile(path), policy) for path, policy in policies.items() if "{" in path]
+        # 每个 worker 记录已保存响应体的 (校验值, 保存时间)，内容没变时不重复写磁盘
+        self._saved: Dict[str, Tuple[int, float]] = {}
+
+    def match(self, path: str) -> Optional[CachePolicy]:
+        policy = self.exact.get(path)
+        if policy is not None:
+            return policy
+        for pattern, policy in self.patterns:
+            if pattern.match(path):
+                return policy
+        return None
+
+    def _headers(self, headers: List[Tuple[bytes, bytes]], policy: CachePolicy) -> List[Tuple[bytes, bytes]]:
+        headers = [(name, value) for name, value in headers if name.lower() != b"cache-control"]
+        headers.append((b"cache-control", policy.cache_control.encode()))
+        if policy.vary:
+            headers.append((b"vary", ", ".join(policy.vary).encode()))
+        return headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        policy = self.match(scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        if policy.stale_if_error is None:
+            async def send_with_policy(message):
+                if message["type"] == "http.response.start":
+                    message = dict(message)
+                    message["headers"] = self._headers(list(message.get("headers", [])), policy)
+                await send(message)
+
+            await self.app(scope, receive, send_with_policy)
+            return
+
+        await self._call_with_fallback(scope, receive, send, policy)
+
+    async def _call_with_fallback(self, scope, receive, send, policy: CachePolicy):
+        """缓冲完整响应；失败或超时时改为返回保存的旧响应"""
+        key = "stale:" + scope["path"] + "?" + "&".join(sorted(scope["query_string"].decode("latin-1").split("&")))
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        async def run():
+            await self.app(scope, receive, capture)
+            status = start.get("status", 500)
+            body = b"".join(chunks)
+            if status == 200 and scope["method"] == "GET":
+                self._save(key, start.get("headers", []), body, policy)
+            return status, list(start.get("headers", [])), body
+
+        task = asyncio.ensure_future(run())
+        try:
+            if policy.timeout is not None:
+                done, _ = await asyncio.wait({task}, timeout=policy.timeout)
+                if not done and await self._send_stale(key, send, policy):
+                    # 原请求继续在后台完成，成功后刷新保存的响应
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                    return
+            status, headers, body = await task
+        except Exception:
+            if await self._send_stale(key, send, policy):
+                return
+            raise
+
+        if status >= 500 and await self._send_stale(key, send, policy):
+            return
+
+        await send({"type": "http.response.start", "status": status, "headers": self._headers(headers, policy)})
+        await send({"type": "http.response.body", "body": body})
+
+    def _save(self, key: str, headers: List[Tuple[bytes, bytes]], body: bytes, policy: CachePolicy):
+        checksum = zlib.crc32(body)
+        now = time.monotonic()
+        saved = self._saved.get(key)
+        # 内容相同且保存时间不到有效期的一半时跳过
+        if saved and saved[0] == checksum and now - saved[1] < policy.stale_if_error / 2:
+            return
+        if len(self._saved) > 10000:
+            self._saved.clear()
+        self._saved[key] = (checksum, now)
+        content_type = next((value for name, value in headers if name.lower() == b"content-type"), b"")
+        self.store.set(key, content_type + b"\n" + body, ttl=policy.stale_if_error)
+
+    async def _send_stale(self, key: str, send, policy: CachePolicy) -> bool:
+        data = self.store.get(key)
+        if data is None:
+            return False
+        content_type, _, body = data.partition(b"\n")
+        headers = self._headers([(b"content-type", content_type)], policy) + [
+            (b"content-length", str(len(body)).encode()),
+            (b"x-cache", b"STALE"),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return True
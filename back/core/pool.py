@@ -0,0 +1,33 @@
+# 进程池
+#
+# CPU 密集的任务（索引重建、大文档渲染等）放到子进程中执行，
+# 避免阻塞 worker 的事件循环。每个 worker 按需创建一个进程池，共用。
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from config import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """获取（必要时创建）当前 worker 的进程池"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.PROCESS_POOL_WORKERS)
+    return _pool
+
+
+async def run_in_process(func: Callable[..., Any], *args) -> Any:
+    """在进程池中执行函数（函数和参数必须可以 pickle）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_process_pool():
+    """关闭进程池（worker 退出时调用）"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
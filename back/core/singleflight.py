@@ -0,0 +1,106 @@
+# 请求合并（single-flight）
+#
+# 缓存失效后同一时刻的多个相同请求只执行一次计算，其余请求等待并共享结果：
+# - 同一 worker 内：按 key 记录进行中的调用（独立的任务），后到的请求直接等待同一个任务
+# - 跨 worker（shared=True）：执行前再取得 DATA_DIR/locks 下按 key 的文件锁，
+#   计算函数在锁内先检查共享缓存，其它 worker 已经算好时直接使用
+# 每个 key 记录调用次数、实际执行次数、被合并的次数和等待跨 worker 锁的时间。
+import asyncio
+import fcntl
+import json
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core.diskcache import disk_cache
+from core.utils import data_path
+
+
+class SingleFlight:
+    """按 key 合并并发调用"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _stat(self, key: str) -> Dict[str, float]:
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = self._stats[key] = {"calls": 0, "executions": 0, "coalesced": 0, "lock_wait_ms": 0.0}
+        return stat
+
+    @asynccontextmanager
+    async def _shared_lock(self, key: str, stat: Dict[str, float]):
+        """跨 worker 的文件锁（非阻塞轮询，不阻塞事件循环）"""
+        fd = os.open(data_path("locks", f"{zlib.crc32(key.encode('utf-8')):08x}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.02)
+            stat["lock_wait_ms"] += (time.monotonic() - started) * 1000
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], shared: bool = False, name: Optional[str] = None) -> Any:
+        """
+        执行 fn() 并返回结果；相同 key 的调用正在进行时等待它的结果
+        shared 为 True 时同时在 worker 之间互斥，fn 应先检查共享缓存
+        name 为统计使用的名称（key 中带有版本号时用于归并统计），默认为 key
+        """
+        stat = self._stat(name or key)
+        stat["calls"] += 1
+
+        task = self._calls.get(key)
+        if task is not None:
+            stat["coalesced"] += 1
+        else:
+            stat["executions"] += 1
+            # 在独立的任务中执行，调用者（包括第一个）都只是等待它：
+            # 某个调用者被取消（客户端断开、wait_for 超时）不会取消计算，也不影响其它等待者
+            task = asyncio.ensure_future(self._execute(key, fn, shared, stat))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    async def _execute(self, key: str, fn: Callable[[], Awaitable[Any]], shared: bool, stat: Dict[str, float]) -> Any:
+        if shared:
+            async with self._shared_lock(key, stat):
+                return await fn()
+        return await fn()
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用者都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {key: dict(stat) for key, stat in self._stats.items()}
+
+
+single_flight = SingleFlight()
+
+
+async def shared_call(key: str, version: str, fn: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+    """
+    跨 worker 合并计算，结果（可 JSON 序列化）按 version 保存在共享磁盘缓存中
+    version 一般为相关失效主题的 token
+    """
+    async def load_or_compute():
+        cached = disk_cache.get(f"flight:{key}", version)
+        if cached is not None:
+            return json.loads(cached)
+        result = await fn()
+        disk_cache.set(f"flight:{key}", json.dumps(result, ensure_ascii=False).encode("utf-8"), version, ttl=ttl)
+        return result
+
+    return await single_flight.do(f"{key}:{version}", load_or_compute, shared=True, name=key)
@@ -2,6 +2,8 @@ import json
 from pathlib import Path
 from typing import Union, Any, Optional
 
+from config import settings
+
 # 明确定义类型别名
 JsonData = Union[dict, list]
 FilePath = Union[str, Path]
@@ -39,4 +41,13 @@ def to_txt(content: str, file_path: FilePath, encoding: str = 'utf-8') -> bool:
             f.write(content)
         return True
     except (IOError, TypeError):
-        return False
\ No newline at end of file
+        return False
+
+def data_path(*parts: str) -> Path:
+    """返回运行时数据目录下的路径（目录不存在时自动创建）"""
+    base = Path(settings.DATA_DIR)
+    if not base.is_absolute():
+        base = Path(__file__).parent.parent / base
+    path = base.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
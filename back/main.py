@@ -17,13 +17,25 @@ from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 
 from config import settings
 from core.security import is_admin
 from core.db import close_db, init_db
+from core.pool import shutdown_process_pool
+from core.bus import invalidation_bus
+from core.cache import ResponseCacheMiddleware, response_cache
+from core.diskcache import disk_cache
+from core.policy import CachePolicy, CachePolicyMiddleware
+from blog.bm25 import bm25_engine
+from blog.likes import like_counter
+from blog.pageviews import view_recorder
+from blog.publish import static_publisher
+from blog.sitemap import sitemap_store
+from blog.warmup import warmup
 
 # 常规路由
-from blog.api import post, other, comments, page, rss
+from blog.api import post, other, comments, page, rss, sitemap, pageviews
 from blog.admin import files as files_admin
 from blog.admin import page as page_admin
 from blog.admin import post as post_admin
@@ -37,15 +49,39 @@ async def lifespan(app: FastAPI):
 
     负责：
     - 数据库初始化
+    - 缓存失效通知监听
+    - BM25 索引增量刷新（后台进行）
+    - 缓存预热（后台进行）
+    - 退出时写入累加的点赞数和阅读事件
     - 资源清理
     """
     # 初始化数据库
     await init_db()
 
+    # 监听其它机器的缓存失效通知（PostgreSQL）
+    await invalidation_bus.start()
+
+    # 后台检查并增量刷新 BM25 索引
+    bm25_engine.schedule_refresh()
+
+    # 后台预热缓存，完成或超时后 /ready 才返回 200
+    warmup.start(app)
+
     try:
         yield
     finally:
         # 清理资源
+        await warmup.close()
+        # 写入尚未写入数据库的点赞数、阅读事件
+        await like_counter.close()
+        await view_recorder.close()
+        # 点赞数写入后还会安排列表生成，放在它们之后
+        await static_publisher.close()
+        await sitemap_store.close()
+        await bm25_engine.close()
+        await invalidation_bus.close()
+        shutdown_process_pool()
+        disk_cache.close()
         await close_db()
 
 # 初始化FastAPI应用
@@ -60,6 +96,74 @@ app = FastAPI(
     openapi_url="/openapi.json" if settings.DEBUG else None
 )
 
+# 公开接口响应缓存（在 CORS 中间件内层，CORS 头按每个请求生成）
+app.add_middleware(
+    ResponseCacheMiddleware,
+    cache=response_cache,
+    paths={
+        "/api/posts/": ["posts"],
+        "/api/posts/categories": ["posts"],
+        "/api/posts/facets": ["posts"],
+        "/api/posts/all": ["posts"],
+        "/api/posts/archive": ["archive"],
+        "/api/posts/archive/summary": ["archive"],
+        "/api/posts/archive/list": ["archive"],
+        # 文章详情只随该文章失效（修改、删除、点赞）
+        "/api/posts/{id:int}": ["post:{id}"],
+        "/api/pages/": ["pages"],
+        "/api/pages/all": ["pages"],
+        "/api/meta": ["meta"],
+        "/api/heatmap/type-distribution": ["activity"],
+        "/api/views/top": ["views"],
+        "/api/views/timeline": ["views"],
+        "/api/views/readers": ["views"],
+    },
+)
+
+# 公开接口的 HTTP 缓存策略
+# 列表/详情类接口：浏览器缓存 1 分钟，nginx 等共享缓存 5 分钟；
+# 数据库故障或 3 秒内没有返回时，一天内返回最近一次成功的响应
+LIST_POLICY = CachePolicy(max_age=60, s_maxage=300, stale_while_revalidate=600, stale_if_error=86400, timeout=3)
+# 检索结果变化快，缓存时间短
+SEARCH_POLICY = CachePolicy(max_age=30, stale_if_error=3600, timeout=3)
+# Feed 带 ETag，阅读器每次都重新验证；归档页流式输出，不做旧响应兜底
+FEED_POLICY = CachePolicy(max_age=0, s_maxage=60)
+SITEMAP_POLICY = CachePolicy(max_age=3600)
+
+app.add_middleware(
+    CachePolicyMiddleware,
+    policies={
+        "/api/posts/": LIST_POLICY,
+        "/api/posts/categories": LIST_POLICY,
+        "/api/posts/facets": LIST_POLICY,
+        "/api/posts/all": LIST_POLICY,
+        "/api/posts/archive": LIST_POLICY,
+        "/api/posts/archive/summary": LIST_POLICY,
+        "/api/posts/archive/list": LIST_POLICY,
+        "/api/posts/search": SEARCH_POLICY,
+        "/api/posts/suggest": SEARCH_POLICY,
+        "/api/posts/title/{title}": LIST_POLICY,
+        "/api/posts/{id:int}": LIST_POLICY,
+        "/api/pages/": LIST_POLICY,
+        "/api/pages/all": LIST_POLICY,
+        "/api/pages/{title}": LIST_POLICY,
+        "/api/meta": LIST_POLICY,
+        "/api/heatmap/type-distribution": LIST_POLICY,
+        "/api/views/top": LIST_POLICY,
+        "/api/views/timeline": LIST_POLICY,
+        "/api/views/readers": LIST_POLICY,
+        "/api/comments/post/{post_id:int}": CachePolicy(max_age=0, stale_if_error=3600, timeout=3),
+        "/api/rss.xml": FEED_POLICY,
+        "/api/rss/{category}.xml": FEED_POLICY,
+        "/api/atom.xml": FEED_POLICY,
+        "/api/atom/{category}.xml": FEED_POLICY,
+        "/api/feed.json": FEED_POLICY,
+        "/api/feed/{category}.json": FEED_POLICY,
+        "/api/sitemap.xml": SITEMAP_POLICY,
+        "/api/sitemap-{name}.xml": SITEMAP_POLICY,
+    },
+)
+
 # 配置CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -81,6 +185,8 @@ app.include_router(post.router, prefix=prefix)
 app.include_router(comments.router, prefix=prefix)
 app.include_router(meta_router, prefix=prefix)
 app.include_router(rss.router, prefix=prefix)
+app.include_router(sitemap.router, prefix=prefix)
+app.include_router(pageviews.router, prefix=prefix)
 
 # 注册路由 - 管理员路由
 app.include_router(post_admin.router, prefix=prefix, dependencies=[Depends(is_admin)])
@@ -105,6 +211,16 @@ async def health_check():
     """
     return settings.__dict__
 
+@app.get("/ready", tags=["健康检查"])
+async def readiness_check():
+    """就绪检查端点
+    缓存预热完成（或超时）之前返回 503，负载均衡器据此决定是否转发流量
+    """
+    status = warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 # # 移除开发服务器的启动代码
 # # 生产环境使用 Gunicorn 启动
 
@@ -0,0 +1,87 @@
+"""
+命令行管理工具
+
+    python manage.py migrate    执行未执行的数据库迁移
+    python manage.py status     查看数据库迁移状态
+    python manage.py explain    检查热点查询是否使用了索引（有未使用的返回非 0）
+    python manage.py backfill-activity  重建每日活跃度汇总（热力图）
+    python manage.py rebuild-stats      重新统计博客计数（文章、笔记、评论、点赞）
+"""
+import argparse
+import asyncio
+import sys
+
+from tortoise import Tortoise
+
+from core.db import get_tortoise_config
+
+
+async def cmd_migrate(args) -> int:
+    from core.migrate import migrate
+    applied = await migrate()
+    if not applied:
+        print("没有需要执行的迁移")
+    return 0
+
+
+async def cmd_status(args) -> int:
+    from core.migrate import migration_status
+    for version, name, applied in await migration_status():
+        print(f"[{'x' if applied else ' '}] {version:04d}_{name}")
+    return 0
+
+
+async def cmd_explain(args) -> int:
+    from blog.explain import explain_hot_queries
+    failed = 0
+    for result in await explain_hot_queries():
+        if not result["ok"]:
+            failed += 1
+        print(f"{'OK  ' if result['ok'] else 'FAIL'} {result['name']} -> {result['index']}")
+        if args.verbose or not result["ok"]:
+            for line in result["plan"]:
+                print(f"       {line}")
+    return 1 if failed else 0
+
+
+async def cmd_backfill_activity(args) -> int:
+    from blog.activity import activity_store
+    days = await activity_store.rebuild()
+    print(f"已重建 {days} 天的活跃度汇总")
+    return 0
+
+
+async def cmd_rebuild_stats(args) -> int:
+    from blog.stats import blog_stats
+    await blog_stats.rebuild()
+    print(await blog_stats.get())
+    return 0
+
+
+COMMANDS = {
+    "migrate": cmd_migrate,
+    "status": cmd_status,
+    "explain": cmd_explain,
+    "backfill-activity": cmd_backfill_activity,
+    "rebuild-stats": cmd_rebuild_stats,
+}
+
+
+async def main(args) -> int:
+    await Tortoise.init(config=get_tortoise_config())
+    try:
+        return await COMMANDS[args.command](args)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="博客管理命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="执行数据库迁移")
+    subparsers.add_parser("status", help="查看迁移状态")
+    explain = subparsers.add_parser("explain", help="检查热点查询的执行计划")
+    explain.add_argument("-v", "--verbose", action="store_true", help="输出全部执行计划")
+    subparsers.add_parser("backfill-activity", help="重建每日活跃度汇总")
+    subparsers.add_parser("rebuild-stats", help="重新统计博客计数")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,44 @@
+# 测试公共配置
+#
+# 在导入应用模块之前设置必需的环境变量：使用 sqlite（DEBUG）、临时数据目录、关闭静态化。
+# 需要数据库的测试使用 db 夹具：内存 sqlite 数据库 + 执行全部迁移，
+# 夹具返回 run(协程)，在同一个事件循环中执行（不依赖 pytest-asyncio）。
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="blog-test-"))
+os.environ.setdefault("STATIC_PUBLISH", "false")
+for name in (
+    "ALLOWED_HOSTS", "STATIC_DIR", "SECRET_KEY", "ALGORITHM", "FRONTEND_URL", "CLIENT",
+    "WEBSITE_NAME", "WEBSITE_URL", "ROOT_NAME", "ROOT_NICKNAME", "ROOT_EMAIL", "ROOT_PASSWORD",
+    "ROOT_DES", "ROOT_AVATAR", "ROOT_API_KEY", "ROOT_KEY",
+):
+    os.environ.setdefault(name, "test")
+
+
+@pytest.fixture
+def db():
+    from tortoise import Tortoise
+
+    from core.bus import ALL_TOPICS, invalidation_bus
+    from core.migrate import migrate
+
+    loop = asyncio.new_event_loop()
+    run = loop.run_until_complete
+    run(Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["core.meta", "blog.models"]}))
+    run(migrate())
+    # 每个测试是一个新的数据库，按版本号缓存的内容（计数、搜索提示等）全部失效
+    run(invalidation_bus.publish(ALL_TOPICS))
+    try:
+        yield run
+    finally:
+        run(Tortoise.close_connections())
+        loop.close()
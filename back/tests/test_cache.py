@@ -0,0 +1,116 @@
+import asyncio
+import uuid
+
+import pytest
+
+from core.bus import InvalidationBus
+from core.cache import ResponseCache
+
+
+@pytest.fixture
+def bus():
+    # 每个测试单独的版本号表
+    return InvalidationBus(name=f"test-{uuid.uuid4().hex}")
+
+
+def _bump(bus: InvalidationBus, *topics: str):
+    asyncio.run(bus.publish(*topics))
+
+
+def test_cache_hit_until_topic_published(bus):
+    cache = ResponseCache(max_size=8, ttl=60, bus=bus, disk=None)
+    value = (200, [], b"[]")
+    cache.set("/api/posts/?", value, bus.versions(["posts"]))
+    assert cache.get("/api/posts/?", ["posts"]) == value
+
+    # 无关主题不影响
+    _bump(bus, "pages")
+    assert cache.get("/api/posts/?", ["posts"]) == value
+
+    _bump(bus, "posts")
+    assert cache.get("/api/posts/?", ["posts"]) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_cache_set_with_versions_from_before_a_write(bus):
+    cache = ResponseCache(max_size=8, ttl=60, bus=bus, disk=None)
+    versions = bus.versions(["posts"])
+    # 生成响应期间发生了写入：缓存项下次读取时失效
+    _bump(bus, "posts")
+    cache.set("/api/posts/?", (200, [], b"[]"), versions)
+    assert cache.get("/api/posts/?", ["posts"]) is None
+
+
+def test_cache_evicts_least_recently_used(bus):
+    cache = ResponseCache(max_size=2, ttl=60, bus=bus, disk=None)
+    versions = bus.versions(["posts"])
+    for key in ("a", "b"):
+        cache.set(key, (200, [], key.encode()), versions)
+    cache.get("a", ["posts"])
+    cache.set("c", (200, [], b"c"), versions)
+    assert cache.get("b", ["posts"]) is None
+    assert cache.get("a", ["posts"]) is not None
+
+
+class _App:
+    """返回固定响应并记录调用次数的 ASGI 应用"""
+
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({"type": "http.response.start", "status": self.status, "headers": []})
+        await send({"type": "http.response.body", "body": scope["path"].encode()})
+
+
+def _get(middleware, path: str) -> dict:
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b""}
+    asyncio.run(middleware(scope, None, send))
+    return dict(messages[0]["headers"])
+
+
+def _middleware(bus, app):
+    from core.cache import ResponseCacheMiddleware
+
+    cache = ResponseCache(max_size=8, ttl=60, bus=bus, disk=None)
+    return ResponseCacheMiddleware(app, cache, {
+        "/api/posts/": ["posts"],
+        "/api/posts/{id:int}": ["post:{id}"],
+    })
+
+
+def test_post_detail_evicted_only_by_its_own_topic(bus):
+    app = _App()
+    middleware = _middleware(bus, app)
+
+    assert _get(middleware, "/api/posts/1")[b"x-cache"] == b"MISS"
+    assert _get(middleware, "/api/posts/1")[b"x-cache"] == b"HIT"
+    assert _get(middleware, "/api/posts/2")[b"x-cache"] == b"MISS"
+
+    # 其它文章、文章列表的变更不影响这篇文章的缓存
+    _bump(bus, "post:2", "posts")
+    assert _get(middleware, "/api/posts/1")[b"x-cache"] == b"HIT"
+    assert _get(middleware, "/api/posts/2")[b"x-cache"] == b"MISS"
+
+    _bump(bus, "post:1")
+    assert _get(middleware, "/api/posts/1")[b"x-cache"] == b"MISS"
+    assert app.calls == 4
+
+
+def test_unmatched_paths_and_errors_are_not_cached(bus):
+    app = _App(status=404)
+    middleware = _middleware(bus, app)
+
+    _get(middleware, "/api/posts/1")
+    _get(middleware, "/api/posts/1")
+    # 只缓存 200；路径参数不是整数时不匹配
+    _get(middleware, "/api/posts/abc")
+    assert b"x-cache" not in _get(middleware, "/api/posts/abc")
+    assert app.calls == 4
@@ -0,0 +1,54 @@
+import math
+
+import pytest
+
+from core.hll import M, SKETCH_BYTES, HyperLogLog
+
+# 标准误差 1.04 / sqrt(M) ≈ 2.3%，按 3 倍标准误差检查
+ERROR_BOUND = 3 * 1.04 / math.sqrt(M)
+
+
+def _sketch(start: int, stop: int) -> HyperLogLog:
+    sketch = HyperLogLog()
+    for i in range(start, stop):
+        sketch.add(f"visitor-{i}".encode())
+    return sketch
+
+
+def test_empty():
+    assert HyperLogLog().count() == 0
+
+
+@pytest.mark.parametrize("n", [1, 10, 100, 1000, 10_000, 100_000])
+def test_error_bound(n):
+    estimate = _sketch(0, n).count()
+    assert abs(estimate - n) <= max(1, n * ERROR_BOUND)
+
+
+def test_duplicates_not_counted():
+    sketch = _sketch(0, 1000)
+    registers = bytes(sketch.registers)
+    for i in range(1000):
+        sketch.add(f"visitor-{i}".encode())
+    assert bytes(sketch.registers) == registers
+
+
+def test_merge_is_union():
+    a, b = _sketch(0, 6000), _sketch(4000, 10_000)
+    merged = HyperLogLog(bytearray(a.registers))
+    merged.merge(b)
+    assert abs(merged.count() - 10_000) <= 10_000 * ERROR_BOUND
+    # 与分别加入全部元素的草图完全相同，合并顺序、重复合并不影响结果
+    assert bytes(merged.registers) == bytes(_sketch(0, 10_000).registers)
+    merged.merge(a)
+    b.merge(a)
+    assert bytes(merged.registers) == bytes(b.registers)
+
+
+def test_bytes_round_trip():
+    sketch = _sketch(0, 5000)
+    data = sketch.to_bytes()
+    assert len(data) == SKETCH_BYTES
+    assert bytes(HyperLogLog.from_bytes(data).registers) == bytes(sketch.registers)
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(data[:-1])
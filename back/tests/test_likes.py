@@ -0,0 +1,102 @@
+import secrets
+
+from blog.likes import LikeCounter
+from blog.models import PostModel
+from core.bus import invalidation_bus
+from core.diskcache import disk_cache
+
+
+def _fingerprint() -> int:
+    # 去重标记保存在共享磁盘缓存中，每个测试使用新的访客
+    return secrets.randbits(64)
+
+
+async def _likes(post_id: int) -> int:
+    return (await PostModel.get(id=post_id)).like
+
+
+def test_repeated_like_counted_once(db):
+    async def main():
+        post = await PostModel.create(title="a", content="x")
+        counter = LikeCounter(flush_interval=3600, dedupe_ttl=60)
+        visitor = _fingerprint()
+        results = [await counter.like(post.id, visitor), await counter.like(post.id, visitor)]
+        results.append(await counter.like(post.id, _fingerprint()))
+        await counter.close()
+        return results, await _likes(post.id)
+
+    results, likes = db(main())
+    assert results == [(True, 1), (False, 1), (True, 2)]
+    assert likes == 2
+
+
+def test_missing_and_locked_posts_rejected(db):
+    async def main():
+        post = await PostModel.create(title="a", content="x", is_locked=True)
+        counter = LikeCounter(flush_interval=3600, dedupe_ttl=60)
+        return await counter.like(post.id, _fingerprint()), await counter.like(post.id + 1, _fingerprint())
+
+    assert db(main()) == (None, None)
+
+
+def test_flush_dedupes_across_workers(db):
+    async def main():
+        post = await PostModel.create(title="a", content="x")
+        workers = [LikeCounter(flush_interval=3600, dedupe_ttl=60) for _ in range(2)]
+        visitor = _fingerprint()
+        for counter in workers:
+            # 每个 worker 只知道自己的记录
+            assert (await counter.like(post.id, visitor))[0]
+        for counter in workers:
+            await counter.close()
+        return await _likes(post.id)
+
+    assert db(main()) == 1
+
+
+def test_flush_publishes_posts(db):
+    async def main():
+        post = await PostModel.create(title="a", content="x")
+        counter = LikeCounter(flush_interval=3600, dedupe_ttl=60)
+        await counter.like(post.id, _fingerprint())
+        before = invalidation_bus.versions(["posts", f"post:{post.id}"])
+        await counter.flush()
+        after = invalidation_bus.versions(["posts", f"post:{post.id}"])
+        # 重新读取投影后返回数据库中的点赞数
+        result = await counter.like(post.id, _fingerprint())
+        await counter.close()
+        return before, after, result
+
+    before, after, result = db(main())
+    assert all(new > old for old, new in zip(before, after))
+    assert result == (True, 2)
+
+
+def test_flush_skips_posts_locked_in_the_meantime(db):
+    async def main():
+        post = await PostModel.create(title="a", content="x")
+        counter = LikeCounter(flush_interval=3600, dedupe_ttl=60)
+        await counter.like(post.id, _fingerprint())
+        await PostModel.filter(id=post.id).update(is_locked=True)
+        await counter.close()
+        return await _likes(post.id)
+
+    assert db(main()) == 0
+
+
+def test_busy_cache_defers_instead_of_counting(db, monkeypatch):
+    async def main():
+        post = await PostModel.create(title="a", content="x")
+        counter = LikeCounter(flush_interval=3600, dedupe_ttl=60)
+        await counter.like(post.id, _fingerprint())
+
+        claim = disk_cache.claim
+        monkeypatch.setattr(disk_cache, "claim", lambda keys, ttl: None)
+        await counter.flush()
+        deferred = await _likes(post.id)
+
+        monkeypatch.setattr(disk_cache, "claim", claim)
+        await counter.close()
+        return deferred, await _likes(post.id)
+
+    assert db(main()) == (0, 1)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from blog.listing import LIST_ORDERING, after_cursor, count_posts, decode_cursor, encode_cursor
+from blog.models import PostModel
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    post = SimpleNamespace(is_top=True, created_at=created_at, id=42)
+    cursor = encode_cursor(post)
+    # 可以直接放进查询字符串
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (True, created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "W10", "WyJ4Il0"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_pages_cover_the_list_once(db):
+    async def main():
+        start = datetime(2024, 1, 1)
+        for i in range(23):
+            # 有相同的创建时间，由 id 决定顺序
+            await PostModel.create(
+                title=f"post-{i}", content="x",
+                created_at=start + timedelta(days=i // 3),
+                is_top=i in (4, 17),
+                is_locked=i == 10,
+            )
+
+        expected = await PostModel.filter(is_locked=False).order_by(*LIST_ORDERING).values_list("id", flat=True)
+        pages, cursor = [], None
+        while True:
+            query = PostModel.filter(is_locked=False)
+            if cursor:
+                query = query.filter(after_cursor(cursor))
+            page = await query.order_by(*LIST_ORDERING).limit(5)
+            if not page:
+                break
+            pages.append([post.id for post in page])
+            cursor = encode_cursor(page[-1])
+        return expected, pages
+
+    expected, pages = db(main())
+    assert len(expected) == 22
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 2]
+    assert [post_id for page in pages for post_id in page] == list(expected)
+
+
+def test_count_cached_until_posts_change(db):
+    from core.bus import invalidation_bus
+
+    async def main():
+        await PostModel.create(title="a", content="x", category="笔记")
+        first = await count_posts({"category": "笔记", "is_locked": False})
+        await PostModel.create(title="b", content="x", category="笔记")
+        cached = await count_posts({"category": "笔记", "is_locked": False})
+        await invalidation_bus.publish("posts")
+        return first, cached, await count_posts({"category": "笔记", "is_locked": False})
+
+    assert db(main()) == (1, 1, 2)
@@ -0,0 +1,55 @@
+import asyncio
+
+from core.migrate import MIGRATIONS, migrate, migration_status
+
+TABLES = {
+    "posts", "post_renders", "pages", "page_renders", "comments", "meta", "schema_migrations",
+    "daily_activity", "blog_stats", "post_views_hourly", "reader_sketches", "posts_fts",
+}
+
+
+async def _tables():
+    from core.db import get_connection
+    _, rows = await get_connection().execute_query("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in rows}
+
+
+def test_versions_are_sequential():
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+    assert len({migration.name for migration in MIGRATIONS}) == len(MIGRATIONS)
+    # 原生 SQL 的版本两种数据库都要给出
+    for migration in MIGRATIONS[1:]:
+        assert migration.sqlite and migration.postgres, migration.name
+
+
+def test_all_versions_applied(db):
+    status = db(migration_status())
+    assert [(version, applied) for version, _, applied in status] == [
+        (migration.version, True) for migration in MIGRATIONS
+    ]
+    assert TABLES <= db(_tables())
+
+
+def test_migrate_is_idempotent(db):
+    assert db(migrate()) == []
+    assert db(migrate()) == []
+
+
+def test_migrate_existing_schema():
+    """迁移之前用 generate_schemas 建好的库：第 1 个版本跳过已存在的表，其余版本正常执行"""
+    from tortoise import Tortoise
+
+    async def main():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["core.meta", "blog.models"]})
+        try:
+            await Tortoise.generate_schemas(safe=True)
+            applied = [migration.version for migration in await migrate()]
+            return applied, await migrate(), await _tables()
+        finally:
+            await Tortoise.close_connections()
+
+    applied, again, tables = asyncio.run(main())
+    assert applied == [migration.version for migration in MIGRATIONS]
+    assert again == []
+    assert TABLES <= tables
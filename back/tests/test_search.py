@@ -0,0 +1,136 @@
+import pytest
+
+from blog.models import PostModel
+from blog.search import bigram_tokens, query_terms, search_index
+
+
+async def _posts():
+    await PostModel.create(title="全文检索入门", content="介绍倒排索引和分词")
+    await PostModel.create(title="随笔", content="今天学习了全文检索的排序")
+    await PostModel.create(title="Python notes", content="searching with python generators")
+    await PostModel.create(title="私密草稿", content="全文检索的私密笔记", is_locked=True)
+    await search_index.rebuild()
+
+
+def test_bigram_tokens():
+    assert bigram_tokens("全文检索") == ["全文", "文检", "检索", "索"]
+    assert bigram_tokens("Hello 世界") == ["hello", "世界", "界"]
+    assert query_terms("检索 py") == [("检索", False), ("py", True)]
+
+
+def test_search_returns_public_posts_by_relevance(db):
+    async def main():
+        await _posts()
+        return await search_index.search("全文检索"), await search_index.count("全文检索")
+
+    ids, total = db(main())
+    assert total == 2
+    # 标题命中排在正文命中之前，私密文章不出现
+    titles = [db(PostModel.get(id=post_id)).title for post_id in ids]
+    assert titles == ["全文检索入门", "随笔"]
+
+
+def test_search_prefix_and_pagination(db):
+    async def main():
+        await _posts()
+        return (
+            await search_index.search("pyth"),
+            await search_index.search("全文检索", limit=1, offset=1),
+            await search_index.count("不存在的词"),
+        )
+
+    prefix, second_page, missing = db(main())
+    assert len(prefix) == 1
+    assert len(second_page) == 1
+    assert missing == 0
+
+
+def test_index_follows_post_changes(db):
+    async def main():
+        await _posts()
+        post = await PostModel.get(title="随笔")
+        post.content = "换成别的内容"
+        await post.save()
+        await search_index.index_post(post)
+        first = await search_index.count("全文检索")
+        await search_index.remove_post((await PostModel.get(title="全文检索入门")).id)
+        return first, await search_index.count("全文检索")
+
+    assert db(main()) == (1, 0)
+
+
+async def _bm25_engine(tmp_path):
+    """用当前全部文章建立 BM25 索引（直接在本进程中执行）"""
+    from blog.bm25 import BM25Engine, build_index
+
+    engine = BM25Engine(str(tmp_path / "bm25.idx"))
+    rows = await PostModel.all().values_list("id", "updated_at", "title", "tag", "category", "content")
+    build_index(
+        engine.path,
+        {post_id: updated_at.timestamp() for post_id, updated_at, *_ in rows},
+        [(post_id, updated_at.timestamp(), title, tag, category, content)
+         for post_id, updated_at, title, tag, category, content in rows],
+    )
+    return engine
+
+
+def test_bm25_search(db, tmp_path):
+    async def main():
+        await _posts()
+        engine = await _bm25_engine(tmp_path)
+        return engine, [post_id for post_id, _ in engine.search("全文检索", limit=None)]
+
+    engine, ids = db(main())
+    assert engine.ready
+    # 索引中包含所有文章，公开过滤由接口完成
+    assert len(ids) == 3
+    assert engine.search("全文检索 不存在") == []
+
+
+def test_bm25_route_counts_only_public_hits(db, tmp_path, monkeypatch):
+    from blog.api import post as post_api
+
+    async def main():
+        await _posts()
+        monkeypatch.setattr(post_api, "bm25_engine", await _bm25_engine(tmp_path))
+        # 索引建立之后设为私密的文章不计入
+        await PostModel.filter(title="随笔").update(is_locked=True)
+        return await post_api.search_posts(q="全文检索", page=1, size=10, engine="bm25")
+
+    result = db(main())
+    assert result.total == 1
+    assert [hit.title for hit in result.posts] == ["全文检索入门"]
+
+
+def test_search_route_pages_and_snippets(db):
+    from blog.api import post as post_api
+    from blog.render import update_post_render
+
+    async def main():
+        await _posts()
+        for post in await PostModel.all():
+            await update_post_render(post)
+        first = await post_api.search_posts(q="全文检索", page=1, size=1, engine="db")
+        second = await post_api.search_posts(q="全文检索", page=2, size=1, engine="db")
+        return first, second
+
+    first, second = db(main())
+    assert (first.total, first.total_page, second.current_page) == (2, 2, 2)
+    assert [hit.title for hit in first.posts + second.posts] == ["全文检索入门", "随笔"]
+    # 摘要取自预先生成的纯文本，关键词高亮
+    assert "全文检索</span>" in second.posts[0].content
+
+
+def test_search_route_reports_outage(db, monkeypatch):
+    from fastapi import HTTPException
+
+    from blog.api import post as post_api
+
+    async def broken(keyword):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(search_index, "count", broken)
+    with pytest.raises(HTTPException) as error:
+        db(post_api.search_posts(q="全文检索", page=1, size=10, engine="db"))
+    # 故障返回 500，而不是看起来像“没有结果”的空列表
+    assert error.value.status_code == 500